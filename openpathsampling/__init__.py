@@ -15,13 +15,18 @@ from ensemble import (
     OptionalEnsemble, join_ensembles
 )
 
+from ensemble_set import EnsembleSet
+from ensemble_profiler import EnsembleProfiler, EnsembleProfile
+
+from verdict_cache import VerdictCache, ensemble_verdict
+
 from snapshot import Snapshot, Configuration, Momentum
 
-from trajectory import Trajectory
+from trajectory import Trajectory, ConcatenatedTrajectory
 from sample import Sample, SampleSet
 
 from collectivevariable import CV_Function, CV_MDTraj_Function, CV_MSMB_Featurizer, \
-    CV_Volume, CollectiveVariable
+    CV_Volume, CollectiveVariable, CV_Coordinates_Function, CVInputs, CVGroup
 
 from pathmover import (
     RandomChoiceMover, PathMover, ConditionalSequentialMover,
@@ -35,7 +40,8 @@ from pathmover import (
     FirstSubtrajectorySelectMover, MultipleSetMinusMover,
     OneWayShootingMover, RandomSubtrajectorySelectMover, SubPathMover,
     EnsembleFilterMover, SelectionMover, FirstAllowedMover,
-    LastAllowedMover, OneWayExtendMover, SubtrajectorySelectMover
+    LastAllowedMover, OneWayExtendMover, SubtrajectorySelectMover,
+    ConcurrentEngineMover
 )
 
 from shooting import ShootingPointSelector, UniformSelector, \
@@ -43,10 +49,20 @@ from shooting import ShootingPointSelector, UniformSelector, \
 
 from dynamics_engine import DynamicsEngine
 
+from engine_timing import GenerationTiming
+
+from engine_pool import EnginePool
+
+from engine_server import RemoteEngine
+
+from frame_buffer import FrameBuffer
+
 from openmm_engine import OpenMMEngine
 
 from volume import (Volume, VolumeCombination, VolumeFactory, VoronoiVolume, 
+    VoronoiCellAssignment,
     EmptyVolume, FullVolume, CVRangeVolume, CVRangeVolumePeriodic,
+    CVIntervalSetVolume, CVIntervalSetVolumePeriodic,
     IntersectionVolume, UnionVolume, SymmetricDifferenceVolume,
     RelativeComplementVolume, join_volumes
 )
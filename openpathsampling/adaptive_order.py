@@ -0,0 +1,125 @@
+"""
+Order of evaluation for unions and intersections, adapted to measured costs.
+"""
+
+import time
+
+
+def flatten_combination(combination, children):
+    """
+    The operands of nested binary combinations of the same type
+
+    `(a | b) | (c | d)` gives `[a, b, c, d]`, in order from left to right.
+
+    Parameters
+    ----------
+    combination : object
+        a binary union or intersection (of volumes or ensembles)
+    children : function(object) -> tuple
+        the two operands of a combination
+
+    Returns
+    -------
+    list
+        the operands that are not combinations of the same type
+    """
+    result = []
+    todo = [combination]
+    while todo:
+        node = todo.pop()
+        if type(node) is type(combination):
+            todo.extend(reversed(children(node)))
+        else:
+            result.append(node)
+    return result
+
+
+class AdaptiveOrder(object):
+    """
+    Evaluates the operands of an n-ary union or intersection in the order
+    that is expected to be cheapest.
+
+    A union is decided by the first operand that is True, an intersection
+    by the first one that is False. For each operand the mean time of an
+    evaluation and the rate at which it decides the result are measured.
+    Every `reorder_interval` evaluations the operands are sorted by mean
+    time divided by the probability to decide, which minimises the expected
+    cost if the operands are independent. Since only the order changes, the
+    result is the same as evaluating all operands.
+
+    Attributes
+    ----------
+    operands : list
+        the operands of the union or intersection
+    decisive : bool
+        True for unions and False for intersections
+    order : list of int
+        the order in which the operands are evaluated
+    n_evaluated : list of int
+        the number of evaluations of each operand
+    n_decisive : list of int
+        the number of evaluations of each operand that decided the result
+    times : list of float
+        the cumulative wall time of the evaluations of each operand
+    """
+
+    reorder_interval = 100
+
+    def __init__(self, operands, decisive):
+        self.operands = list(operands)
+        self.decisive = decisive
+        self.order = range(len(self.operands))
+        self.n_evaluated = [0] * len(self.operands)
+        self.n_decisive = [0] * len(self.operands)
+        self.times = [0.0] * len(self.operands)
+        self._n_since_reorder = 0
+
+    def evaluate(self, method, *args):
+        """
+        The union or intersection of `operand.method(*args)`
+
+        Parameters
+        ----------
+        method : str
+            the name of the method of the operands to call
+
+        Returns
+        -------
+        bool
+            the result of the union (or intersection)
+        """
+        decisive = self.decisive
+        result = not decisive
+        for i in self.order:
+            start = time.time()
+            value = bool(getattr(self.operands[i], method)(*args))
+            self.times[i] += time.time() - start
+            self.n_evaluated[i] += 1
+            if value is decisive:
+                self.n_decisive[i] += 1
+                result = decisive
+                break
+
+        self._n_since_reorder += 1
+        if self._n_since_reorder >= self.reorder_interval:
+            self.reorder()
+        return result
+
+    def expected_cost(self, i):
+        """
+        Mean time of operand `i` divided by its (smoothed) probability to
+        decide the result
+        """
+        n_evaluated = self.n_evaluated[i]
+        if n_evaluated == 0:
+            return 0.0
+        p_decisive = (self.n_decisive[i] + 1.0) / (n_evaluated + 2.0)
+        return self.times[i] / n_evaluated / p_decisive
+
+    def reorder(self):
+        """
+        Sort the operands by their expected cost
+        """
+        self.order = sorted(range(len(self.operands)),
+                            key=self.expected_cost)
+        self._n_since_reorder = 0
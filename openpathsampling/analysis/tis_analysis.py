@@ -451,6 +451,7 @@ class TISTransition(Transition):
         )
         mytrans.minus_ensemble = dct['minus_ensemble']
         mytrans.ensembles = dct['ensembles']
+        paths.EnsembleSet(mytrans.ensembles).register()
         return mytrans
 
     @property
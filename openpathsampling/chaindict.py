@@ -248,10 +248,7 @@ class Function(ChainDict):
             return [None] * len(items)
 
         if self.requires_lists:
-            results = self._eval(items)
-
-            if self.single_as_scalar and results.shape[-1] == 1:
-                results = results.reshape(results.shape[:-1])
+            results = self.scalarize(self._eval(items))
 
         else:
             results = [self._eval(obj) for obj in items]
@@ -260,6 +257,15 @@ class Function(ChainDict):
 
         return results
 
+    def scalarize(self, results):
+        """
+        Remove a last axis of length one from the results for a list of keys
+        if `single_as_scalar` is set
+        """
+        if self.single_as_scalar and results.shape[-1] == 1:
+            return results.reshape(results.shape[:-1])
+
+        return results
 
     def get_transformed_view(self, transform):
         def fnc(obj):
@@ -329,9 +335,21 @@ class LRUChainDict(CacheChainDict):
         super(LRUChainDict, self).__init__(LRUCache(size_limit))
 
 
+def _write_sorted(value_store, keys, values):
+    """
+    Write values to a value store in the order of their keys
+    """
+    order = sorted(range(len(keys)), key=keys.__getitem__)
+    value_store[[keys[pos] for pos in order]] = [values[pos] for pos in order]
+
+
 class StoredDict(ChainDict):
     """
     ChainDict that has a store attached and return existing values from the store
+
+    If the storage of the key store runs a writer thread (see
+    `NetCDFPlus.start_writer`) `sync` only queues the writes for it. Values
+    that are not in memory are read after the queued writes are done.
     """
     def __init__(self, key_store, value_store, main_cache, cache=None):
         """
@@ -366,12 +384,55 @@ class StoredDict(ChainDict):
         if self.max_save_buffer_size is not None and len(self.storable) > self.max_save_buffer_size:
             self.sync()
 
+    @property
+    def writer(self):
+        """
+        The AsyncWriter of the storage of the key store or None
+        """
+        storage = getattr(self.key_store, 'storage', None)
+        return getattr(storage, 'writer', None)
+
+    def _store(self, keys, values):
+        """
+        Write values to the value store, in the writer thread if there is one
+        """
+        writer = self.writer
+        if writer is None:
+            _write_sorted(self.value_store, keys, values)
+        else:
+            writer.put(_write_sorted, self.value_store, keys, values)
+
+    def flush(self):
+        """
+        Wait until the values queued for the writer thread are written
+        """
+        writer = self.writer
+        if writer is not None:
+            writer.flush()
+
+    def add_stored(self, keys, values):
+        """
+        Set values by the index of their keys in the key store
+
+        The values are written to the store with the next `sync`.
+
+        Parameters
+        ----------
+        keys : list of int
+            the indices in the key store
+        values : list
+            the values for these indices
+        """
+        for key, value in zip(keys, values):
+            self.cache[key] = value
+            self.storable.add(key)
+
     def sync(self):
         # Sync objects that had been saved and afterwards the CV was computed
         if len(self.storable) > 0:
-            keys = [idx for idx in sorted(list(self.storable)) if idx in self.cache]
+            keys = [idx for idx in self.storable if idx in self.cache]
             values = [self.cache[idx] for idx in keys]
-            self.value_store[keys] = values
+            self._store(keys, values)
             self.storable.clear()
 
         # Sync objects that first had a value computed and were later stored
@@ -384,13 +445,14 @@ class StoredDict(ChainDict):
             pairs = [(key, value) for key, value in zip(keys, values) if value is not None]
             keys, values = zip(*pairs)
 
-            self.value_store[list(keys)] = list(values)
+            self._store(list(keys), list(values))
             for key, value in pairs:
                 self.cache[key] = value
             self._last_n_objects = len(self.key_store)
 
 
     def cache_all(self):
+        self.flush()
         values = self.value_store[:]
         self.cache.clear()
         [self.cache.__setitem__(key, value) for key, value in enumerate(values)]
@@ -415,6 +477,7 @@ class StoredDict(ChainDict):
             return self.cache[key]
         else:
             # update cache with specific strategy
+            self.flush()
             self.cache[key] = self.value_store[key]
             return self.cache[key]
 
@@ -426,9 +489,10 @@ class StoredDict(ChainDict):
         if len(idxs) > 0:
             sorted_idxs = sorted(list(set(idxs)))
 
-            sorted_values = self.value_store[sorted_idxs]
+            self.flush()
+            loaded = dict(zip(sorted_idxs, self.value_store[sorted_idxs]))
             replace = [None if key is None else self.cache[key] if key in self.cache else
-            sorted_values[sorted_idxs.index(key)] for key in keys]
+            loaded[key] for key in keys]
         else:
             replace = [None if key is None else self.cache[key] if key in self.cache else None for key in keys]
 
@@ -471,9 +535,9 @@ class ReversibleStoredDict(StoredDict):
     def sync(self):
         # Sync objects that had been saved and afterwards the CV was computed
         if len(self.storable) > 0:
-            keys = [idx for idx in sorted(list(self.storable)) if idx in self.cache]
+            keys = [idx for idx in self.storable if idx in self.cache]
             values = [self.cache[idx] for idx in keys]
-            self.value_store[keys] = values
+            self._store(keys, values)
             self.storable.clear()
 
         # Sync objects that first had a value computed and were later stored
@@ -495,6 +559,240 @@ class ReversibleStoredDict(StoredDict):
 
                 self._last_n_objects = len(self.key_store)
 
-                self.value_store[list(keys)] = list(values)
+                self._store(list(keys), list(values))
                 for key, value in pairs:
                     self.cache[key] = value
+
+
+class DenseStoredDict(ReversibleStoredDict):
+    """
+    StoredDict that keeps the values in a numpy array indexed by the key
+
+    The keys of a store are dense integer indices, so instead of a dict the
+    values are kept in a growable array that mirrors the stored variable,
+    together with a mask of the indices that hold a value. Loading a list of
+    values is a single fancy-indexed read, `cache_all` reads the whole
+    variable at once and `sync` writes a contiguous block of values with one
+    slice. Only numeric variables without units with at most
+    `max_value_size` numbers per key are supported, see `supports`.
+    """
+
+    max_value_size = 64
+
+    def __init__(self, key_store, value_store, main_cache, reversible=True):
+        """
+        Parameters
+        ----------
+        key_store : storage.Store
+            the store that references usable keys
+        value_store : storage.Variable
+            the store that references the store variable to store the values by index
+        main_cache : dict-like
+            the cache of computed values by (not yet stored) object
+        reversible : bool
+            if True the values are also used for the reversed objects
+        """
+        super(DenseStoredDict, self).__init__(
+            key_store, value_store, main_cache, reversible=reversible)
+        self.cache = None
+
+        variable = value_store.variable
+        var_type = variable.var_type
+        # keep python types with full precision in memory as before
+        self._as_python = not var_type.startswith('numpy.')
+        if var_type == 'float':
+            self.dtype = np.dtype(np.float64)
+        elif var_type in ['int', 'long']:
+            self.dtype = np.dtype(np.int64)
+        else:
+            self.dtype = variable.dtype
+
+        self.value_shape = tuple(variable.shape[1:])
+        self.values = np.zeros((0,) + self.value_shape, dtype=self.dtype)
+        self.valid = np.zeros(0, dtype=bool)
+
+    @classmethod
+    def supports(cls, value_store):
+        """
+        Whether the values of a value store can be kept in a numpy array
+
+        Parameters
+        ----------
+        value_store : storage.Variable
+            the variable delegate of the stored values
+
+        Returns
+        -------
+        bool
+        """
+        variable = getattr(value_store, 'variable', None)
+        var_type = getattr(variable, 'var_type', None)
+        if var_type is None or hasattr(variable, 'unit_simtk'):
+            return False
+
+        if var_type not in ['float', 'int', 'long'] and \
+                not var_type.startswith('numpy.'):
+            return False
+
+        if not isinstance(variable.dtype, np.dtype):
+            # variable length
+            return False
+
+        return int(np.prod(variable.shape[1:])) <= cls.max_value_size
+
+    def _grow(self, size):
+        capacity = len(self.valid)
+        if size > capacity:
+            capacity = max(size, 2 * capacity)
+            values = np.zeros((capacity,) + self.value_shape, dtype=self.dtype)
+            values[:len(self.values)] = self.values
+            valid = np.zeros(capacity, dtype=bool)
+            valid[:len(self.valid)] = self.valid
+            self.values = values
+            self.valid = valid
+
+    def _is_valid(self, keys):
+        valid = np.zeros(len(keys), dtype=bool)
+        inside = keys < len(self.valid)
+        valid[inside] = self.valid[keys[inside]]
+        return valid
+
+    @staticmethod
+    def _masked_rows(raw):
+        mask = np.ma.getmaskarray(raw)
+        return mask.reshape(
+            mask.shape[0], int(np.prod(mask.shape[1:]))).any(axis=1)
+
+    def _set_values(self, keys, values):
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(keys) > 0:
+            self._grow(keys.max() + 1)
+            self.values[keys] = np.asarray(values, dtype=self.dtype)
+            self.valid[keys] = True
+
+    def _load(self, keys):
+        """
+        Read the values for the given keys that are not yet in memory
+        """
+        missing = np.unique(keys[~self._is_valid(keys)])
+        if len(missing) == 0:
+            return
+
+        self.flush()
+        variable = self.value_store.variable
+        with self.value_store.lock:
+            missing = missing[missing < len(variable)]
+            raw = variable[missing.tolist()] if len(missing) > 0 else None
+
+        if raw is not None:
+            found = ~self._masked_rows(raw)
+            self._set_values(missing[found], np.ma.getdata(raw)[found])
+
+    def _write(self, keys):
+        """
+        Write the values of the given sorted keys to the variable
+        """
+        keys = keys[self._is_valid(keys)]
+        if len(keys) == 0:
+            return
+
+        first, last = keys[0], keys[-1] + 1
+        if self.valid[first:last].all():
+            # unchanged values in between are simply written again
+            index = slice(first, last)
+            values = self.values[first:last].copy()
+        else:
+            index = keys.tolist()
+            values = self.values[keys]
+
+        variable = self.value_store.variable
+        writer = self.writer
+        if writer is None:
+            with self.value_store.lock:
+                variable[index] = values
+        else:
+            writer.put(variable.__setitem__, index, values)
+
+    def add_stored(self, keys, values):
+        self._set_values(keys, values)
+        self.storable.update(keys)
+
+    def _add_new(self, items, values):
+        keys = []
+        new_values = []
+        for item, value in zip(items, values):
+            key = self._get_key(item)
+            if key is not None:
+                keys.append(key)
+                new_values.append(value)
+                if self.reversible:
+                    # if reversible store also for reversed
+                    keys.append(key + 1 - 2 * (key % 2))
+                    new_values.append(value)
+
+        self._set_values(keys, new_values)
+        self.storable.update(keys)
+
+        if self.max_save_buffer_size is not None and len(self.storable) > self.max_save_buffer_size:
+            self.sync()
+
+    def sync(self):
+        # Sync objects that had been saved and afterwards the CV was computed
+        if len(self.storable) > 0:
+            self._write(np.array(sorted(self.storable), dtype=np.int64))
+            self.storable.clear()
+
+        # Sync objects that first had a value computed and were later stored
+        # For these we need to check the main_cache
+
+        if self._last_n_objects < len(self.key_store):
+            keys = range(self._last_n_objects, len(self.key_store))
+            objs = map(self.key_store.cache.get_silent, keys)
+            values = map(self.main_cache.get_silent, objs)
+
+            if self.reversible:
+                # double all pairs of values and remove Nones
+                values = map(lambda x : x[0] or x[1], zip(values[0::2], values[1::2]))
+                values = [val for val in values for _ in (0, 1)]
+
+            pairs = [(key, value) for key, value in zip(keys, values) if value is not None]
+            if len(pairs) > 0:
+                keys, values = zip(*pairs)
+
+                self._last_n_objects = len(self.key_store)
+
+                self._set_values(keys, values)
+                self._write(np.array(keys, dtype=np.int64))
+
+    def cache_all(self):
+        self.flush()
+        with self.value_store.lock:
+            raw = self.value_store.variable[:]
+        values = np.array(np.ma.getdata(raw), dtype=self.dtype)
+        valid = ~self._masked_rows(raw)
+
+        # values that are not yet synced are kept
+        keep = np.flatnonzero(self.valid)
+        kept_values = self.values[keep]
+
+        self.values = values
+        self.valid = valid
+        self._set_values(keep, kept_values)
+
+    def _get(self, item):
+        return self._get_list([item])[0]
+
+    def _get_list(self, items):
+        keys = np.array([-1 if key is None else key
+                         for key in map(self._get_key, items)], dtype=np.int64)
+
+        found = keys >= 0
+        self._load(keys[found])
+        found[found] = self._is_valid(keys[found])
+
+        values = self.values[keys[found]]
+        if self._as_python:
+            values = values.tolist()
+
+        it = iter(values)
+        return [it.next() if is_found else None for is_found in found]
@@ -8,13 +8,17 @@ import types
 import opcode
 import __builtin__
 import importlib
+import time
 
 import simtk.unit as u
 import numpy as np
 
 import openpathsampling as paths
 import chaindict as cd
-from openpathsampling.netcdfplus import StorableNamedObject, WeakLRUCache
+import cv_backfill
+from openpathsampling.netcdfplus import StorableNamedObject, WeakLRUCache, \
+    LoaderProxy
+from openpathsampling.engine_timing import GenerationTiming
 
 
 class CollectiveVariable(cd.Wrap, StorableNamedObject):
@@ -89,7 +93,7 @@ class CollectiveVariable(cd.Wrap, StorableNamedObject):
         self._cache_dict = cd.ReversibleCacheChainDict(WeakLRUCache(1000, weak_type='key'), reversible=cv_time_reversible)
 
         self._func_dict = cd.Function(
-            self._eval,
+            self._timed_eval,
             self.requires_lists,
             self.scalarize_numpy_singletons
         )
@@ -102,7 +106,13 @@ class CollectiveVariable(cd.Wrap, StorableNamedObject):
         super(CollectiveVariable, self).__init__(post=post)
 
     def set_cache_store(self, key_store, value_store):
-        self._store_dict = cd.ReversibleStoredDict(
+        if cd.DenseStoredDict.supports(value_store):
+            # scalar and small vector values are kept in a numpy array
+            store_dict_class = cd.DenseStoredDict
+        else:
+            store_dict_class = cd.ReversibleStoredDict
+
+        self._store_dict = store_dict_class(
             key_store,
             value_store,
             self._cache_dict.cache,
@@ -142,10 +152,34 @@ class CollectiveVariable(cd.Wrap, StorableNamedObject):
         else:
             return 'None'
 
+    # the kind of data the CV is computed from, if several CVs can share it
+    # (see `CVGroup`). CVs that set it implement `_eval_inputs`
+    shared_input = None
+
     def _eval(self, items):
         ### Default CVs don't do anything. Need to use subclass
         return items
 
+    def _eval_inputs(self, inputs):
+        """
+        Evaluate the CV from the `CVInputs` of a list of snapshots
+        """
+        return self._eval(inputs.items)
+
+    def _timed_eval(self, items):
+        # report to the timing of the trajectory being generated, if any
+        if GenerationTiming.current is None:
+            return self._eval(items)
+
+        start_time = time.time()
+        result = self._eval(items)
+        if self.requires_lists:
+            count = len(items)
+        else:
+            count = 1
+        GenerationTiming.add_current('cv', time.time() - start_time, count)
+        return result
+
     @staticmethod
     def function_requires_lists(c, template, **kwargs):
         """
@@ -321,6 +355,44 @@ class CollectiveVariable(cd.Wrap, StorableNamedObject):
         if hasattr(self, '_store_dict'):
             self._store_dict.cache_all()
 
+    def compute_all(self, storage, n_workers=None, chunk=1000, progress=True):
+        """
+        Compute and store the values of this CV for all snapshots in storage
+
+        The snapshots are read from the file in chunks with bulk reads of
+        the coordinates and velocities and evaluated in `n_workers` forked
+        worker processes. All access to the file happens in the calling
+        process. The values of each chunk are written to the storage and
+        the file is synced once the chunk is done, so if the computation is
+        interrupted calling `compute_all` again only computes the missing
+        values. This includes a worker process that dies, e.g. because it
+        runs out of memory; then a RuntimeError names the lost chunk.
+
+        Parameters
+        ----------
+        storage : Storage
+            the storage that contains the snapshots. The CV is saved in
+            the storage if it is not stored yet
+        n_workers : int or None
+            the number of worker processes. If None, one per CPU is used. If
+            `n_workers` is 1 (or there is only one chunk) everything is
+            computed in the calling process.
+        chunk : int
+            the number of snapshots evaluated at once by a worker
+        progress : bool or callable
+            if True the progress is printed after each chunk. A callable is
+            called with the number of computed and the total number of
+            snapshots instead.
+
+        Returns
+        -------
+        int
+            the number of (pairs of, for time reversible CVs) snapshots
+            that were computed
+        """
+        return cv_backfill.compute_all(self, storage, n_workers, chunk,
+                                       progress)
+
     _compare_keys = ['name', 'cv_return_shape']
 
     def __eq__(self, other):
@@ -551,8 +623,7 @@ class CV_Volume(CollectiveVariable):
     _compare_keys = ['name', 'volume']
 
     def _eval(self, items):
-        result = [bool(self.volume(item)) for item in items]
-        return result
+        return self.volume.evaluate_trajectory(items).tolist()
 
     def to_dict(self):
         return {
@@ -906,11 +977,138 @@ class CV_MDTraj_Function(CV_Function):
 
         self._topology = None
 
+    shared_input = 'md'
+
     def _eval(self, items):
-        trajectory = paths.Trajectory(items)
+        return self._eval_inputs(CVInputs(items))
+
+    def _eval_inputs(self, inputs):
+        return self.f(inputs.md(), **self.kwargs)
+
+
+class CV_Coordinates_Function(CV_Function):
+    """Make `CollectiveVariable` from `f` that takes an array of coordinates.
+
+    The function is called with a float32 numpy array of shape
+    (n_frames, n_atoms, n_spatial) using `f(coordinates, **kwargs)` or, if
+    `cv_requires_box_vectors` is set, `f(coordinates, box_vectors, **kwargs)`
+    with the box vectors of shape (n_frames, n_spatial, n_spatial). If
+    `atom_indices` is given only these atoms are passed, in this order.
+
+    The coordinates of snapshots that are stored in a file are read with a
+    single read per file (only of the selected atoms) without loading the
+    snapshots. The coordinates of snapshots in memory are stacked once.
+    Coordinates have no units, they are in the units of the storage or the
+    snapshot.
+
+    Examples
+    --------
+    >>> def distance(xyz, pairs):
+    >>>     return np.linalg.norm(xyz[:, pairs[:, 0]] - xyz[:, pairs[:, 1]], axis=2)
+    >>> cv = CV_Coordinates_Function('d', distance, atom_indices=[0, 5],
+    >>>                              pairs=np.array([[0, 1]]))
+    """
+
+    def __init__(self,
+                 name,
+                 f,
+                 atom_indices=None,
+                 cv_requires_box_vectors=False,
+                 cv_store_cache=True,
+                 cv_time_reversible=True,
+                 cv_wrap_numpy_array=True,
+                 cv_scalarize_numpy_singletons=True,
+                 **kwargs
+                 ):
+        """
+        Parameters
+        ----------
+        name : str
+        f
+        atom_indices : list of int or None
+            the atoms passed to `f`. If None all atoms are passed
+        cv_requires_box_vectors : bool
+            if True the box vectors are passed to `f` as second argument
+        cv_store_cache
+        cv_time_reversible
+        cv_wrap_numpy_array
+        cv_scalarize_numpy_singletons
+        kwargs : **kwargs
+            a dictionary of named arguments which should be given to `f`
+        """
+
+        super(CV_Coordinates_Function, self).__init__(
+            name,
+            f,
+            cv_store_cache=cv_store_cache,
+            cv_time_reversible=cv_time_reversible,
+            cv_requires_lists=True,
+            cv_wrap_numpy_array=cv_wrap_numpy_array,
+            cv_scalarize_numpy_singletons=cv_scalarize_numpy_singletons,
+            **kwargs
+        )
+
+        if atom_indices is not None:
+            atom_indices = list(atom_indices)
+        self.atom_indices = atom_indices
+        self.requires_box_vectors = cv_requires_box_vectors
+
+    shared_input = 'coordinates'
+
+    def coordinates(self, items):
+        """
+        The coordinates of the selected atoms of a list of snapshots
+
+        Parameters
+        ----------
+        items : list of Snapshot or LoaderProxy
+            the snapshots
+
+        Returns
+        -------
+        numpy.ndarray, shape=(n_frames, n_atoms, n_spatial)
+            the coordinates as float32
+        """
+        return CVInputs(items).coordinates(self.atom_indices)
+
+    def box_vectors(self, items):
+        """
+        The box vectors of a list of snapshots
+
+        Parameters
+        ----------
+        items : list of Snapshot or LoaderProxy
+            the snapshots
+
+        Returns
+        -------
+        numpy.ndarray, shape=(n_frames, n_spatial, n_spatial)
+            the box vectors as float32
+        """
+        return CVInputs(items).box_vectors()
+
+    def _eval(self, items):
+        return self._eval_inputs(CVInputs(items))
+
+    def _eval_inputs(self, inputs):
+        coordinates = inputs.coordinates(self.atom_indices)
+        if self.requires_box_vectors:
+            return self.f(coordinates, inputs.box_vectors(), **self.kwargs)
+        else:
+            return self.f(coordinates, **self.kwargs)
+
+    def to_dict(self):
+        dct = super(CV_Coordinates_Function, self).to_dict()
+        dct['atom_indices'] = self.atom_indices
+        dct['requires_box_vectors'] = self.requires_box_vectors
+        return dct
 
-        t = trajectory.md()
-        return self.f(t, **self.kwargs)
+    @classmethod
+    def from_dict(cls, dct):
+        obj = super(CV_Coordinates_Function, cls).from_dict(dct)
+        obj.atom_indices = dct['atom_indices']
+        obj.requires_box_vectors = dct['requires_box_vectors']
+        return obj
 
 
 class CV_MSMB_Featurizer(CV_Generator):
@@ -986,11 +1184,345 @@ class CV_MSMB_Featurizer(CV_Generator):
     _compare_keys = ['name']
     allowed_modules = ['msmbuilder']
 
+    shared_input = 'md'
+
     def _eval(self, items):
-        trajectory = paths.Trajectory(items)
+        return self._eval_inputs(CVInputs(items))
+
+    def _eval_inputs(self, inputs):
+        # run the featurizer on the mdtraj trajectory
+        return self._instance.partial_transform(inputs.md())
 
-        # create an MDtraj trajectory out of it
-        ptraj = trajectory.md()
 
-        # run the featurizer
-        return self._instance.partial_transform(ptraj)
\ No newline at end of file
+class CVInputs(object):
+    """
+    The data CVs are computed from for a list of snapshots
+
+    Each kind of data is computed on first use and then kept, so several
+    CVs evaluated on the same snapshots share the conversion.
+
+    Attributes
+    ----------
+    items : list of Snapshot or LoaderProxy
+        the snapshots
+    """
+
+    def __init__(self, items):
+        self.items = items
+        self._data = dict()
+
+    def _get(self, key, compute):
+        try:
+            return self._data[key]
+        except KeyError:
+            value = compute()
+            self._data[key] = value
+            return value
+
+    @staticmethod
+    def _gather(items, from_store, from_snapshot):
+        """
+        Stack the data of snapshots into one array
+
+        Parameters
+        ----------
+        items : list of Snapshot or LoaderProxy
+            the snapshots
+        from_store : function(SnapshotStore, list of int) -> numpy.ndarray
+            reads the data of stored snapshots by index
+        from_snapshot : function(Snapshot) -> numpy.ndarray
+            the data of a snapshot in memory
+        """
+        stored = dict()
+        in_memory = []
+        for pos, item in enumerate(items):
+            if type(item) is LoaderProxy and \
+                    hasattr(item._store, 'coordinates_as_numpy'):
+                stored.setdefault(item._store, []).append(pos)
+            else:
+                in_memory.append(pos)
+
+        blocks = [
+            (positions, from_store(store, [items[pos]._idx for pos in positions]))
+            for store, positions in stored.items()
+        ]
+
+        if len(in_memory) > 0:
+            blocks.append((in_memory, np.array(
+                [from_snapshot(items[pos]) for pos in in_memory],
+                dtype=np.float32
+            )))
+
+        result = np.empty((len(items),) + blocks[0][1].shape[1:],
+                          dtype=np.float32)
+        for positions, block in blocks:
+            result[positions] = block
+
+        return result
+
+    def md(self):
+        """
+        The snapshots as an mdtraj.Trajectory
+        """
+        return self._get('md', lambda: paths.Trajectory(self.items).md())
+
+    def coordinates(self, atom_indices=None):
+        """
+        The coordinates of the snapshots
+
+        Stored snapshots are read with a single read per file (only of the
+        selected atoms). If the coordinates of all atoms are known already
+        the selection is taken from these.
+
+        Parameters
+        ----------
+        atom_indices : list of int or None
+            the selected atoms. If None all atoms are returned
+
+        Returns
+        -------
+        numpy.ndarray, shape=(n_frames, n_atoms, n_spatial)
+            the coordinates as float32
+        """
+        all_atoms = ('coordinates', None)
+        if atom_indices is None:
+            key = all_atoms
+        else:
+            key = ('coordinates', tuple(atom_indices))
+            if key not in self._data and all_atoms in self._data:
+                self._data[key] = self._data[all_atoms][:, atom_indices]
+
+        def from_snapshot(snapshot):
+            xyz = np.asarray(snapshot.xyz)
+            if atom_indices is not None:
+                xyz = xyz[atom_indices]
+            return xyz
+
+        return self._get(key, lambda: self._gather(
+            self.items,
+            lambda store, idxs: store.coordinates_as_numpy(idxs, atom_indices),
+            from_snapshot
+        ))
+
+    def box_vectors(self):
+        """
+        The box vectors of the snapshots
+
+        Returns
+        -------
+        numpy.ndarray, shape=(n_frames, n_spatial, n_spatial)
+            the box vectors as float32
+        """
+        def from_snapshot(snapshot):
+            box_vectors = snapshot.box_vectors
+            if type(box_vectors) is u.Quantity:
+                box_vectors = box_vectors._value
+            return box_vectors
+
+        return self._get('box_vectors', lambda: self._gather(
+            self.items,
+            lambda store, idxs: store.box_vectors_as_numpy(idxs),
+            from_snapshot
+        ))
+
+
+class CVGroup(object):
+    """
+    Evaluates several CVs on the same snapshots
+
+    CVs that compute their values from the same kind of data (see
+    `CollectiveVariable.shared_input`), like the mdtraj trajectory of
+    `CV_MDTraj_Function` and `CV_MSMB_Featurizer` or the coordinates of
+    `CV_Coordinates_Function`, get the data from one `CVInputs` for the
+    snapshots that are not cached for any of them. The values are added
+    to the caches (and stores) of each CV as if the CV had computed them
+    itself. All other CVs are called as usual.
+
+    Examples
+    --------
+    >>> group = CVGroup([psi, phi, rmsd])
+    >>> psi_values, phi_values, rmsd_values = group(trajectory)
+
+    Attributes
+    ----------
+    cvs : list of CollectiveVariable
+        the CVs of the group
+    """
+
+    def __init__(self, cvs):
+        self.cvs = list(cvs)
+
+    def __len__(self):
+        return len(self.cvs)
+
+    def __iter__(self):
+        return iter(self.cvs)
+
+    @staticmethod
+    def _shares_input(cv):
+        return cv.shared_input is not None and cv.requires_lists
+
+    @property
+    def shares_inputs(self):
+        """
+        True if at least two CVs of the group compute their values from
+        the same kind of data
+        """
+        kinds = [cv.shared_input for cv in self.cvs if self._shares_input(cv)]
+        return len(kinds) > len(set(kinds))
+
+    @classmethod
+    def referenced_by(cls, objects):
+        """
+        The group of all CVs used by ensembles and volumes
+
+        Parameters
+        ----------
+        objects : list of Ensemble, Volume, CollectiveVariable or method
+            the objects to search. Of methods (like `ensemble.can_append`)
+            the object they are bound to is searched
+
+        Returns
+        -------
+        CVGroup
+            the CVs, in the order they were found
+        """
+        cvs = []
+        visited = set()
+        todo = list(reversed(list(objects)))
+        while todo:
+            obj = todo.pop()
+            if id(obj) in visited:
+                continue
+            visited.add(id(obj))
+
+            if isinstance(obj, CollectiveVariable):
+                cvs.append(obj)
+            elif isinstance(obj, (list, tuple)):
+                todo.extend(reversed(obj))
+            elif isinstance(obj, dict):
+                todo.extend(obj.values())
+            elif isinstance(obj, (paths.Ensemble, paths.Volume)):
+                todo.extend(
+                    value for key, value in sorted(vars(obj).items(),
+                                                   reverse=True))
+            elif getattr(obj, '__self__', None) is not None:
+                todo.append(obj.__self__)
+
+        return cls(cvs)
+
+    @staticmethod
+    def _chain(cv):
+        """
+        The ChainDicts that keep values of `cv`, in the order they are asked
+        """
+        chain = []
+        chain_dict = cv._single_dict.post
+        while chain_dict is not None and chain_dict is not cv._func_dict:
+            chain.append(chain_dict)
+            chain_dict = chain_dict.post
+        return chain
+
+    @staticmethod
+    def _known(chain, items):
+        """
+        The values of `items` known to the chain and the positions of the
+        items each ChainDict of the chain does not know
+        """
+        values = [None] * len(items)
+        missing = []
+        todo = range(len(items))
+        for chain_dict in chain:
+            missing.append(todo)
+            if len(todo) == 0:
+                continue
+            found = chain_dict._get_list([items[pos] for pos in todo])
+            for pos, value in zip(todo, found):
+                values[pos] = value
+            todo = [pos for pos in todo if values[pos] is None]
+
+        return values, missing, todo
+
+    @staticmethod
+    def _timed_eval_inputs(cv, inputs):
+        start_time = time.time()
+        result = cv._eval_inputs(inputs)
+        GenerationTiming.add_current('cv', time.time() - start_time,
+                                     len(inputs.items))
+        return result
+
+    def __call__(self, items):
+        """
+        The values of all CVs of the group
+
+        Parameters
+        ----------
+        items : Snapshot, Trajectory or list of Snapshot
+            the snapshots
+
+        Returns
+        -------
+        list
+            the value of each CV, as returned by `cv(items)`
+        """
+        original = items
+        single = type(items) is LoaderProxy or not hasattr(items, '__iter__')
+        if single:
+            items = [items]
+        elif hasattr(items, 'as_proxies'):
+            items = items.as_proxies()
+        else:
+            items = list(items)
+
+        results = [None] * len(self.cvs)
+
+        known = dict()
+        for idx, cv in enumerate(self.cvs):
+            if self._shares_input(cv):
+                chain = self._chain(cv)
+                known[idx] = (chain,) + self._known(chain, items)
+            else:
+                results[idx] = cv(original)
+
+        # the data is computed once for the snapshots that any CV misses
+        compute = sorted(set(
+            pos for chain, values, missing, todo in known.values()
+            for pos in todo
+        ))
+        inputs = CVInputs([items[pos] for pos in compute])
+        position = dict((pos, idx) for idx, pos in enumerate(compute))
+
+        kinds = dict()
+        for idx in known:
+            cv = self.cvs[idx]
+            if cv.shared_input == 'coordinates' and known[idx][3]:
+                kinds.setdefault(
+                    None if cv.atom_indices is None
+                    else tuple(cv.atom_indices), cv)
+        if len(kinds) > 1:
+            # read all atoms once instead of each selection
+            inputs.coordinates()
+
+        for idx, (chain, values, missing, todo) in known.items():
+            cv = self.cvs[idx]
+            if len(todo) > 0:
+                computed = cv._func_dict.scalarize(
+                    self._timed_eval_inputs(cv, inputs))
+                for pos in todo:
+                    values[pos] = computed[position[pos]]
+
+                # add the values like the chain does on the way back
+                for chain_dict, positions in reversed(zip(chain, missing)):
+                    if len(positions) > 0:
+                        chain_dict._add_new(
+                            [items[pos] for pos in positions],
+                            [values[pos] for pos in positions]
+                        )
+
+            if single:
+                values = values[0]
+            if cv.wrap_numpy_array:
+                values = np.array(values)
+            results[idx] = values
+
+        return results
@@ -0,0 +1,344 @@
+"""
+Compute the values of a collective variable for all snapshots in a storage.
+"""
+
+import logging
+import multiprocessing
+import time
+import traceback
+
+import numpy as np
+import simtk.unit as u
+
+import openpathsampling as paths
+from openpathsampling.engine_pool import _get_result
+
+logger = logging.getLogger(__name__)
+
+
+def _read_rows(variable, indices):
+    """
+    The rows `indices` of a netCDF variable and a mask of the rows that
+    are not set
+
+    The indices do not need to be sorted or unique. Negative indices (unset
+    references) give masked rows.
+    """
+    indices = np.asarray(indices)
+    present = indices >= 0
+    unique, inverse = np.unique(indices[present], return_inverse=True)
+
+    rows = np.zeros((len(indices),) + tuple(variable.shape[1:]),
+                    dtype=variable.dtype)
+    missing = ~present
+    if len(unique) > 0:
+        raw = variable[unique.tolist()]
+        mask = np.ma.getmaskarray(raw)
+        mask = mask.reshape(mask.shape[0], -1).any(axis=1)
+        rows[present] = np.ma.getdata(raw)[inverse]
+        missing[present] = mask[inverse]
+
+    return rows, missing
+
+
+def read_snapshot_block(storage, indices):
+    """
+    Read the data of stored snapshots with a few bulk reads
+
+    Parameters
+    ----------
+    storage : Storage
+        the storage that contains the snapshots
+    indices : list of int
+        the indices of the snapshots in `storage.snapshots`
+
+    Returns
+    -------
+    dict
+        the numpy arrays of the block. `coordinates` and `velocities` have
+        shape (n_frames, n_atoms, n_spatial), unset values are masked by the
+        corresponding `*_missing` arrays. The momentum reversal of each
+        snapshot is in `is_reversed`.
+    """
+    with storage.lock:
+        snapshots = storage.snapshots
+        configurations, missing_conf = _read_rows(
+            snapshots.vars['configuration'].variable, indices)
+        momenta, missing_mom = _read_rows(
+            snapshots.vars['momentum'].variable, indices)
+        configurations[missing_conf] = -1
+        momenta[missing_mom] = -1
+
+        is_reversed, _ = _read_rows(
+            snapshots.vars['momentum_reversed'].variable, indices)
+
+        block = {
+            'indices': np.asarray(indices),
+            'is_reversed': is_reversed.astype(bool)
+        }
+
+        # coordinates and velocities are read in one go each
+        for name, refs, reader in [
+            ('coordinates', configurations,
+             storage.configurations.coordinates_as_numpy),
+            ('velocities', momenta, storage.momenta.velocities_as_numpy)
+        ]:
+            present = refs >= 0
+            unique, inverse = np.unique(refs[present], return_inverse=True)
+            values = np.zeros(
+                (len(refs), storage.n_atoms, storage.n_spatial), dtype=np.float32)
+            if len(unique) > 0:
+                values[present] = reader(unique.tolist())[inverse]
+            block[name] = values
+            block[name + '_missing'] = ~present
+
+        for name, store, refs in [
+            ('box_vectors', storage.configurations, configurations),
+            ('potential_energy', storage.configurations, configurations),
+            ('kinetic_energy', storage.momenta, momenta)
+        ]:
+            values, missing = _read_rows(store.vars[name].variable, refs)
+            block[name] = values
+            block[name + '_missing'] = missing
+
+    return block
+
+
+def _block_units(storage):
+    """The simtk units of the variables used in a snapshot block"""
+    units = {}
+    for name, store in [
+        ('coordinates', storage.configurations),
+        ('box_vectors', storage.configurations),
+        ('potential_energy', storage.configurations),
+        ('velocities', storage.momenta),
+        ('kinetic_energy', storage.momenta)
+    ]:
+        units[name] = storage.units.get(store.prefix + '_' + name, None)
+
+    return units
+
+
+def snapshots_from_block(block, topology, units):
+    """
+    Build the snapshots of a block read by `read_snapshot_block`
+
+    Parameters
+    ----------
+    block : dict
+        the block of snapshot data
+    topology : Topology
+        the topology of the snapshots
+    units : dict of str : simtk.unit.Unit or None
+        the unit of each quantity in the block
+
+    Returns
+    -------
+    list of Snapshot
+        the (unstored) snapshots
+    """
+    def value(name, idx):
+        if block[name + '_missing'][idx]:
+            return None
+
+        val = block[name][idx]
+        if units.get(name) is not None:
+            val = u.Quantity(val, units[name])
+        return val
+
+    snapshots = []
+    for idx in range(len(block['indices'])):
+        snapshots.append(paths.Snapshot(
+            coordinates=value('coordinates', idx),
+            velocities=value('velocities', idx),
+            box_vectors=value('box_vectors', idx),
+            potential_energy=value('potential_energy', idx),
+            kinetic_energy=value('kinetic_energy', idx),
+            topology=topology,
+            is_reversed=bool(block['is_reversed'][idx])
+        ))
+
+    return snapshots
+
+
+def _evaluate_block(cv, block, topology, units):
+    snapshots = snapshots_from_block(block, topology, units)
+    # bypass the caches, which refer to the storage of the parent process
+    return list(cv._func_dict[snapshots])
+
+
+def _backfill_worker(cv, topology, units, tasks, results, slot, current):
+    """
+    Main loop of a worker process.
+
+    The worker is forked, so the CV and the topology are inherited and
+    never have to be pickled. Only the snapshot data and the CV values go
+    through the queues; the worker never touches the storage file. The
+    index of the chunk that is being computed is kept in `current[slot]`.
+    """
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        chunk_idx, block = task
+        current[slot] = chunk_idx
+        try:
+            values = _evaluate_block(cv, block, topology, units)
+            results.put((chunk_idx, values, None))
+        except Exception:
+            results.put((chunk_idx, None, traceback.format_exc()))
+        current[slot] = -1
+
+
+def missing_indices(cv, storage):
+    """
+    The indices of the snapshots in `storage` that have no stored value of
+    `cv`
+
+    For time reversible CVs only the first snapshot of each pair of
+    snapshot and reversed snapshot is returned.
+
+    Parameters
+    ----------
+    cv : CollectiveVariable
+        the CV, stored in `storage` with a cache
+    storage : Storage
+        the storage that contains the snapshots
+
+    Returns
+    -------
+    numpy.ndarray of int
+        the sorted snapshot indices
+    """
+    n_snapshots = len(storage.snapshots)
+    variable = storage.cvs.cache_var(cv).variable
+    with storage.lock:
+        raw = variable[:]
+
+    missing = np.ones(n_snapshots, dtype=bool)
+    if len(raw) > 0:
+        mask = np.ma.getmaskarray(raw)
+        mask = mask.reshape(mask.shape[0], -1).any(axis=1)
+        n_stored = min(len(mask), n_snapshots)
+        missing[:n_stored] = mask[:n_stored]
+
+    if cv.time_reversible:
+        # snapshots are stored in pairs with their reversed copy
+        pairs = missing[0::2].copy()
+        pairs[:len(missing[1::2])] |= missing[1::2]
+        return 2 * np.flatnonzero(pairs)
+
+    return np.flatnonzero(missing)
+
+
+def compute_all(cv, storage, n_workers=None, chunk=1000, progress=True):
+    """
+    Compute and store the values of a CV for all snapshots of a storage
+
+    See `CollectiveVariable.compute_all`
+    """
+    if cv not in storage.cvs.index:
+        storage.cvs.save(cv)
+
+    # make sure the values are stored in `storage`
+    storage.cvs.create_cache(cv)
+    store_dict = cv._store_dict
+
+    indices = missing_indices(cv, storage)
+    chunks = [indices[pos:pos + chunk]
+              for pos in range(0, len(indices), chunk)]
+
+    n_total = len(indices)
+    n_done = [0]
+    start_time = time.time()
+
+    def write(chunk_indices, values):
+        keys = chunk_indices.tolist()
+        if cv.time_reversible:
+            keys = keys + [key + 1 for key in keys]
+            values = list(values) + list(values)
+
+        store_dict.add_stored(keys, values)
+        store_dict.sync()
+        # flush to disk so an interrupted run can resume from here
+        storage.sync()
+
+        n_done[0] += len(chunk_indices)
+        elapsed = time.time() - start_time
+        logger.info("Computed CV '%s' for %d/%d snapshots in %.1f s",
+                    cv.name, n_done[0], n_total, elapsed)
+        if callable(progress):
+            progress(n_done[0], n_total)
+        elif progress:
+            paths.tools.refresh_output(
+                "Computing CV '%s': %d/%d snapshots (%.1f s)\n" %
+                (cv.name, n_done[0], n_total, elapsed)
+            )
+
+    if len(chunks) == 0:
+        return 0
+
+    topology = storage.topology
+    units = _block_units(storage)
+
+    if n_workers is None:
+        n_workers = multiprocessing.cpu_count()
+
+    n_workers = min(n_workers, len(chunks))
+
+    if n_workers <= 1:
+        for chunk_indices in chunks:
+            block = read_snapshot_block(storage, chunk_indices)
+            write(chunk_indices, _evaluate_block(cv, block, topology, units))
+        return n_total
+
+    tasks = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    current = multiprocessing.Array('i', [-1] * n_workers, lock=False)
+
+    workers = [
+        multiprocessing.Process(
+            target=_backfill_worker,
+            args=(cv, topology, units, tasks, results, slot, current)
+        ) for slot in range(n_workers)
+    ]
+
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+
+    # all access to the file happens in this process. Only a few blocks
+    # are read ahead so memory stays bounded.
+    n_submitted = 0
+    try:
+        for _ in range(min(2 * n_workers, len(chunks))):
+            tasks.put((n_submitted,
+                       read_snapshot_block(storage, chunks[n_submitted])))
+            n_submitted += 1
+
+        for _ in range(len(chunks)):
+            chunk_idx, values, error = _get_result(results, workers,
+                                                   current, 'chunk')
+            if error is not None:
+                raise RuntimeError(
+                    'Worker failed to compute CV for chunk %d:\n%s' %
+                    (chunk_idx, error)
+                )
+
+            if n_submitted < len(chunks):
+                tasks.put((n_submitted,
+                           read_snapshot_block(storage, chunks[n_submitted])))
+                n_submitted += 1
+
+            write(chunks[chunk_idx], values)
+
+        for _ in workers:
+            tasks.put(None)
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+
+    return n_total
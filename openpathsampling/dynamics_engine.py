@@ -6,11 +6,14 @@ Created on 01.07.2014
 '''
 
 import logging
+import time
 
+import numpy as np
 import simtk.unit as u
 
 import openpathsampling as paths
 from openpathsampling.netcdfplus import StorableNamedObject
+from openpathsampling.engine_timing import GenerationTiming
 
 logger = logging.getLogger(__name__)
 
@@ -40,9 +43,24 @@ class DynamicsEngine(StorableNamedObject):
 
     _default_options = {
         'n_frames_max' : None,
-        'timestep' : None
+        'timestep' : None,
+        'check_stride' : 1,
+        'spill_to_disk' : False,
+        'timing' : False,
+        'log_freq' : 10
     }
 
+    # engines that keep their frames in a FrameBuffer themselves
+    _buffers_frames = False
+
+    # the GenerationTiming of the last call of generate, if the option
+    # `timing` is set
+    last_timing = None
+
+    # the GenerationTimings of the trajectories of the last call of
+    # generate_batch, if the option `timing` is set
+    last_timings = None
+
     units = {
         'length' : u.Unit({}),
         'velocity' : u.Unit({}),
@@ -197,6 +215,27 @@ class DynamicsEngine(StorableNamedObject):
         when you hit a stop condition."""
         pass
 
+    def defer(self, task):
+        """
+        Run a task at a time when the engine would otherwise be idle.
+
+        Engines that integrate in a different process (`RemoteEngine`) run
+        the task while they wait for new frames. All others run it right
+        away.
+
+        Parameters
+        ----------
+        task : function()
+            the function to run
+        """
+        task()
+
+    def run_deferred(self):
+        """
+        Run all tasks passed to `defer` that did not run yet.
+        """
+        pass
+
     def stop_conditions(self, trajectory, continue_conditions=None, 
                         trusted=True):
         """
@@ -216,11 +255,15 @@ class DynamicsEngine(StorableNamedObject):
         boolean:
             true if the dynamics should be stopped; false otherwise
         """
+        start_time = time.time()
         stop = False
         if continue_conditions is not None:
             for condition in continue_conditions:
                 can_continue = condition(trajectory, trusted)
                 stop = stop or not can_continue
+
+        GenerationTiming.add_current('continue_conditions',
+                                     time.time() - start_time)
         return stop
 
 
@@ -238,7 +281,8 @@ class DynamicsEngine(StorableNamedObject):
 
         return self.generate(snapshot, ensemble.can_prepend, direction=-1)
 
-    def generate(self, snapshot, running=None, direction=+1):
+    def generate(self, snapshot, running=None, direction=+1,
+                 n_frames_max=None):
         r"""
         Generate a trajectory consisting of ntau segments of tau_steps in
         between storage of Snapshots.
@@ -255,6 +299,10 @@ class DynamicsEngine(StorableNamedObject):
             momenta of the given snapshot and then prepending generated snapshots
             with reversed momenta. This will generate a _reversed_ trajectory that
             effectively ends in the initial snapshot
+        n_frames_max : int or None
+            if not None, the trajectory is stopped after this many frames even
+            if the engine's option `n_frames_max` would allow more. This is
+            used to stop trials that can no longer be accepted.
 
         Returns
         -------    
@@ -267,6 +315,20 @@ class DynamicsEngine(StorableNamedObject):
         If the returned trajectory has length n_frames_max it can still happen
         that it stopped because of the stopping criterion. You need to check
         in that case.
+
+        With the option `check_stride` set to k > 1 the continue conditions
+        are only evaluated every k frames. If they fail, the trajectory is
+        cut back to the first frame where they fail, so the result is the
+        same as with checking every frame.
+
+        With the option `spill_to_disk` every new frame is moved to a
+        memory-mapped FrameBuffer right away and the trajectory consists of
+        snapshots that refer to it. Only the frames that are in use are
+        kept in memory, so very long trajectories can be generated.
+
+        With the option `timing` the time spent in the different phases is
+        recorded in a GenerationTiming object, which is available as
+        `last_timing` afterwards.
         """
 
         if direction == 0:
@@ -277,6 +339,32 @@ class DynamicsEngine(StorableNamedObject):
         except:
             running = [running]
 
+        timing = None
+        if self.options.get('timing', False):
+            timing = GenerationTiming()
+
+        # code called by the engine reports to the current timing
+        previous_timing = GenerationTiming.current
+        GenerationTiming.current = timing
+        start_time = time.time()
+        try:
+            trajectory = self._generate(snapshot, running, direction,
+                                        n_frames_max, timing)
+        finally:
+            GenerationTiming.current = previous_timing
+
+        if timing is not None:
+            timing.add('total', time.time() - start_time)
+            timing.n_frames = len(trajectory)
+            logger.info("Timing of trajectory:\n%s", timing)
+
+        self.last_timing = timing
+        return trajectory
+
+    def _generate(self, snapshot, running, direction, n_frames_max, timing):
+        """
+        The main loop of `generate`; reports to `timing` if not None
+        """
         trajectory = paths.Trajectory()
 
         if direction > 0:
@@ -290,36 +378,116 @@ class DynamicsEngine(StorableNamedObject):
         # Store initial state for each trajectory segment in trajectory.
         trajectory.append(snapshot)
 
+        max_frames = self.options.get('n_frames_max', None)
+        if n_frames_max is not None:
+            if max_frames is None or n_frames_max < max_frames:
+                max_frames = n_frames_max
+
+        check_stride = self.options.get('check_stride', 1)
+        if check_stride is None or check_stride < 1:
+            check_stride = 1
+
+        # CVs used by the continue conditions that share their input data
+        # are computed together for all frames of a check
+        cv_group = None
+        if running:
+            cv_group = paths.CVGroup.referenced_by(running)
+            if not cv_group.shares_inputs:
+                cv_group = None
+
         frame = 0
         # maybe we should stop before we even begin?
+        self._compute_cvs(cv_group, trajectory, 0, direction)
         stop = self.stop_conditions(trajectory=trajectory,
                                     continue_conditions=running,
                                     trusted=False)
+        # number of frames known to pass the continue conditions
+        n_checked = len(trajectory)
+
+        spill = self.options.get('spill_to_disk', False) and \
+            not self._buffers_frames
+        frame_buffer = None
+
+        # frames of a backward run in the order they are generated. They
+        # are prepended in one go before the next check, so the trajectory
+        # is moved once per check and not once per frame
+        pending = []
 
         logger.info("Starting trajectory")
-        log_freq = 10 # TODO: set this from a singleton class
+        log_freq = self.options.get('log_freq', 10)
         while stop == False:
-            if self.options.get('n_frames_max', None) is not None :
-                if len(trajectory) >= self.options['n_frames_max']:
+            # the frames up to the next check are generated in one go
+            n_frames = check_stride - frame % check_stride
+            if max_frames is not None:
+                n_generated = len(trajectory) + len(pending)
+                if n_generated >= max_frames:
                     break
+                n_frames = min(n_frames, max_frames - n_generated)
 
             # Do integrator x steps
-            snapshot = self.generate_next_frame()
-            frame += 1
-            if frame % log_freq == 0:
-                logger.info("Through frame: %d", frame)
-
-            # Store snapshot and add it to the trajectory. Stores also
-            # final frame the last time
-            if direction > 0:
-                trajectory.append(snapshot)
-            elif direction < 0:
-                # We are simulating forward and just build in backwards order
-                trajectory.prepend(snapshot.reversed)
+            phase_start = time.time()
+            if n_frames == 1:
+                snapshots = [self.generate_next_frame()]
+            else:
+                snapshots = self.generate_next_frames(n_frames)
+            if timing is not None:
+                timing.add('dynamics', time.time() - phase_start,
+                           len(snapshots))
+
+            phase_start = time.time()
+            for snapshot in snapshots:
+                frame += 1
+                if log_freq and frame % log_freq == 0:
+                    logger.info("Through frame: %d", frame)
+
+                if spill:
+                    if frame_buffer is None:
+                        frame_buffer = self._spill_buffer(snapshot)
+                    snapshot = self._spill_frame(frame_buffer, snapshot)
+
+                # Store snapshot and add it to the trajectory. Stores also
+                # final frame the last time
+                if direction > 0:
+                    trajectory.append(snapshot)
+                elif direction < 0:
+                    # We are simulating forward and just build in backwards
+                    # order
+                    pending.append(snapshot.reversed)
+
+            if running and frame % check_stride == 0:
+                self._prepend_frames(trajectory, pending)
+
+            if timing is not None:
+                timing.add('trajectory', time.time() - phase_start,
+                           len(snapshots))
+
+            if not running or frame % check_stride != 0:
+                # nothing to check now
+                continue
 
             # Check if we should stop. If not, continue simulation
-            stop = self.stop_conditions(trajectory=trajectory,
-                                        continue_conditions=running)
+            self._compute_cvs(cv_group, trajectory, n_checked, direction)
+            if check_stride == 1:
+                stop = self.stop_conditions(trajectory=trajectory,
+                                            continue_conditions=running)
+            else:
+                stop, trajectory = self._stop_conditions_strided(
+                    trajectory, running, n_checked, direction
+                )
+            n_checked = len(trajectory)
+
+        if pending:
+            phase_start = time.time()
+            self._prepend_frames(trajectory, pending)
+            if timing is not None:
+                timing.add('trajectory', time.time() - phase_start, 0)
+
+        if running and not stop and len(trajectory) > n_checked:
+            # frames generated since the last strided check
+            self._compute_cvs(cv_group, trajectory, n_checked, direction)
+            stop, trajectory = self._stop_conditions_strided(
+                trajectory, running, n_checked, direction
+            )
 
         # exit the while loop once we must stop, so we call the engine's
         # stop function (which should manage any end-of-trajectory
@@ -328,5 +496,247 @@ class DynamicsEngine(StorableNamedObject):
         logger.info("Finished trajectory, length: %d", frame)
         return trajectory
 
+    @staticmethod
+    def _compute_cvs(cv_group, trajectory, n_checked, direction):
+        """
+        Compute the CVs of a CVGroup for the frames of `trajectory` that
+        were not checked yet, so the continue conditions find them cached
+
+        Parameters
+        ----------
+        cv_group : CVGroup or None
+            the CVs to compute; nothing is done if None
+        trajectory : Trajectory
+            the trajectory we've generated so far
+        n_checked : int
+            the number of frames of `trajectory` that are already checked
+        direction : -1 or +1
+            whether the new frames are at the end (+1) or at the beginning
+            (-1) of `trajectory`
+        """
+        if cv_group is None or len(trajectory) <= n_checked:
+            return
+
+        start_time = time.time()
+        if direction > 0:
+            cv_group(trajectory[n_checked:])
+        else:
+            cv_group(trajectory[:len(trajectory) - n_checked])
+
+        GenerationTiming.add_current('continue_conditions',
+                                     time.time() - start_time, 0)
+
+    @staticmethod
+    def _prepend_frames(trajectory, pending):
+        """
+        Prepend the frames of a backward run (in the order they were
+        generated) to `trajectory` and empty `pending`
+        """
+        if pending:
+            trajectory[0:0] = pending[::-1]
+            del pending[:]
+
+    def _spill_buffer(self, snapshot):
+        """
+        A FrameBuffer on disk for frames like `snapshot`; used with the
+        option `spill_to_disk`
+        """
+        units = {}
+        for dimension, value in [
+                ('length', snapshot.coordinates),
+                ('velocity', snapshot.velocities),
+                ('energy', snapshot.potential_energy)]:
+            if isinstance(value, u.Quantity):
+                units[dimension] = value.unit
+            else:
+                units[dimension] = None
+
+        coordinates = snapshot.coordinates
+        if units['length'] is not None:
+            coordinates = coordinates.value_in_unit(units['length'])
+
+        return paths.FrameBuffer(
+            np.shape(coordinates),
+            topology=snapshot.topology,
+            units=units,
+            spill_to_disk=True
+        )
+
+    @staticmethod
+    def _spill_frame(frame_buffer, snapshot):
+        """
+        Move a new frame to `frame_buffer` and return the snapshot that
+        refers to it
+        """
+        idx = frame_buffer.append(
+            snapshot.coordinates,
+            snapshot.velocities,
+            snapshot.potential_energy,
+            snapshot.kinetic_energy
+        )
+        return frame_buffer.snapshot(idx)
+
+    def _stop_conditions_strided(self, trajectory, continue_conditions,
+                                 n_checked, direction):
+        """
+        Check several new frames at once; used by generate if the option
+        `check_stride` is larger than 1.
+
+        Parameters
+        ----------
+        trajectory : Trajectory
+            the trajectory we've generated so far
+        continue_conditions : list of function(Trajectory)
+            see `stop_conditions`
+        n_checked : int
+            the number of frames of `trajectory` that are already known
+            to pass the continue conditions
+        direction : -1 or +1
+            whether the new frames are at the end (+1) or at the beginning
+            (-1) of `trajectory`
+
+        Returns
+        -------
+        stop : boolean
+            true if the dynamics should be stopped; false otherwise
+        trajectory : Trajectory
+            the trajectory, cut back to the first frame where it should have
+            been stopped
+        """
+        # the frames in between have not been checked, so we cannot trust
+        # anything the continue conditions remember about the trajectory
+        stop = self.stop_conditions(trajectory=trajectory,
+                                    continue_conditions=continue_conditions,
+                                    trusted=False)
+        if not stop:
+            return False, trajectory
+
+        # find the first frame at which the conditions fail. The shorter
+        # trajectory did pass, so each step can use the trusted check
+        n_frames = len(trajectory)
+        for length in range(n_checked + 1, n_frames):
+            if direction > 0:
+                partial = trajectory[0:length]
+            else:
+                partial = trajectory[n_frames - length:]
+
+            if self.stop_conditions(trajectory=partial,
+                                    continue_conditions=continue_conditions):
+                return True, partial
+
+        return True, trajectory
+
+    @staticmethod
+    def _batch_running(snapshots, running):
+        """
+        Regularize the continue conditions for a batch to one list per
+        snapshot
+        """
+        if running is None:
+            return [[] for _ in snapshots]
+
+        if len(running) != len(snapshots):
+            raise ValueError(
+                'Need one (list of) continue condition(s) per snapshot, ' +
+                'got %d for %d snapshots' % (len(running), len(snapshots)))
+
+        batch_running = []
+        for conditions in running:
+            if conditions is None:
+                conditions = []
+            else:
+                try:
+                    conditions = list(conditions)
+                except TypeError:
+                    conditions = [conditions]
+            batch_running.append(conditions)
+
+        return batch_running
+
+    @staticmethod
+    def _batch_n_frames_max(snapshots, n_frames_max):
+        """
+        Regularize the frame limits for a batch to one entry per snapshot
+        """
+        if n_frames_max is None:
+            return [None for _ in snapshots]
+
+        if len(n_frames_max) != len(snapshots):
+            raise ValueError(
+                'Need one n_frames_max per snapshot, ' +
+                'got %d for %d snapshots' % (len(n_frames_max), len(snapshots)))
+
+        return list(n_frames_max)
+
+    def generate_batch(self, snapshots, running=None, direction=+1,
+                       n_frames_max=None):
+        r"""
+        Generate one trajectory for each of several initial snapshots.
+
+        Parameters
+        ----------
+        snapshots : list of Snapshot
+            initial coordinates and velocities, one per trajectory
+        running : list of (list of) function(Trajectory) or None
+            one entry per snapshot. Each entry are the continue conditions
+            of the trajectory started from that snapshot; the trajectory
+            stops as soon as one of them returns False.
+        direction : -1 or +1 (DynamicsEngine.FORWARD or DynamicsEngine.BACKWARD)
+            see `generate`
+        n_frames_max : list of (int or None) or None
+            one entry per snapshot, see `generate`
+
+        Returns
+        -------
+        list of Trajectory
+            the generated trajectories in the order of `snapshots`
+
+        Notes
+        -----
+        The default implementation just calls `generate` for each snapshot.
+        Engines that can propagate several walkers at once (e.g. the
+        `ToyEngine`) override this.
+
+        With the option `timing` the GenerationTiming of each trajectory is
+        available in `last_timings` afterwards.
+        """
+        running = self._batch_running(snapshots, running)
+        n_frames_max = self._batch_n_frames_max(snapshots, n_frames_max)
+
+        trajectories = []
+        timings = []
+        for snapshot, conditions, max_frames in zip(snapshots, running,
+                                                    n_frames_max):
+            trajectories.append(
+                self.generate(snapshot, conditions, direction, max_frames))
+            timings.append(self.last_timing)
+
+        if self.options.get('timing', False):
+            self.last_timings = timings
+        else:
+            self.last_timings = None
+
+        return trajectories
+
     def generate_next_frame(self):
         raise NotImplementedError('Next frame generation must be implemented!')
+
+    def generate_next_frames(self, n_frames):
+        """
+        Generate several consecutive frames without checking in between.
+
+        Used by `generate` with `check_stride` larger than 1. Engines that
+        can collect several frames more efficiently than one by one can
+        override this.
+
+        Parameters
+        ----------
+        n_frames : int
+            the number of frames to generate
+
+        Returns
+        -------
+        list of Snapshot
+            the new frames in the order they were generated
+        """
+        return [self.generate_next_frame() for _ in range(n_frames)]
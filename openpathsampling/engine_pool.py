@@ -0,0 +1,334 @@
+"""
+Run the trajectories of a single engine concurrently in worker processes.
+"""
+
+import logging
+import multiprocessing
+import Queue
+import random
+import traceback
+
+import numpy as np
+
+import openpathsampling as paths
+
+logger = logging.getLogger(__name__)
+
+
+def _frame_data(snapshot):
+    """The data needed to rebuild a snapshot in the parent process"""
+    return (
+        snapshot.coordinates,
+        snapshot.velocities,
+        snapshot.box_vectors,
+        snapshot.potential_energy,
+        snapshot.kinetic_energy
+    )
+
+
+def _timing_data(timing):
+    """The data needed to rebuild a GenerationTiming in the parent process"""
+    if timing is None:
+        return None
+
+    return timing.times, timing.counts, timing.n_frames
+
+
+def _get_result(results, workers, current, task_name, timeout=1.0):
+    """
+    Wait for the next result of forked worker processes
+
+    A worker that is killed (by a segmentation fault in native code, the
+    OOM killer, ...) never puts its result. So the workers are checked
+    every `timeout` seconds and an error is raised instead of waiting
+    forever.
+
+    Parameters
+    ----------
+    results : multiprocessing.Queue
+        the queue the workers put their results to
+    workers : list of multiprocessing.Process
+        the worker processes
+    current : multiprocessing.Array of int
+        the task each worker is working on, -1 if none. `current[i]` is set
+        by `workers[i]`
+    task_name : str
+        what a task is called in the error message, e.g. 'trajectory'
+    timeout : float
+        the time in seconds between checks of the workers
+
+    Returns
+    -------
+    tuple
+        the next result
+
+    Raises
+    ------
+    RuntimeError
+        if a worker died, or all workers ended, and no result is pending
+    """
+    while True:
+        try:
+            return results.get(timeout=timeout)
+        except Queue.Empty:
+            pass
+
+        for slot, worker in enumerate(workers):
+            if worker.exitcode not in (None, 0):
+                if current[slot] < 0:
+                    lost = 'in between tasks'
+                else:
+                    lost = 'while working on %s %d' % (task_name,
+                                                       current[slot])
+                raise RuntimeError(
+                    'Worker process died with exit code %d %s' %
+                    (worker.exitcode, lost)
+                )
+
+        if not any(worker.is_alive() for worker in workers):
+            raise RuntimeError(
+                'All worker processes ended before every %s was done' %
+                task_name
+            )
+
+
+def _pool_worker(engine, snapshots, running, direction, n_frames_max, tasks,
+                 results, slot, current):
+    """
+    Main loop of a worker process.
+
+    The worker is forked from the process that called `generate_many`, so
+    the snapshots and the continue conditions are inherited and never
+    have to be pickled. Only the task indices and the generated frames go
+    through the queues. The index of the trajectory that is being
+    generated is kept in `current[slot]`.
+    """
+    # otherwise all workers would share the random state of the parent
+    random.seed()
+    np.random.seed()
+
+    # every worker gets its own engine, built the same way as it would be
+    # loaded from storage
+    worker_engine = engine.__class__.from_dict(engine.to_dict())
+
+    while True:
+        idx = tasks.get()
+        if idx is None:
+            break
+
+        current[slot] = idx
+        try:
+            trajectory = worker_engine.generate(
+                snapshots[idx], running[idx], direction, n_frames_max[idx]
+            )
+            # the initial snapshot is known to the parent already
+            if direction > 0:
+                frames = trajectory[1:]
+            else:
+                frames = trajectory[:-1]
+            results.put((idx, [_frame_data(snap) for snap in frames],
+                         _timing_data(worker_engine.last_timing), None))
+        except Exception:
+            results.put((idx, None, None, traceback.format_exc()))
+        current[slot] = -1
+
+
+class EnginePool(object):
+    """
+    Runs several trajectories of one engine at the same time.
+
+    Each of the `n_workers` worker processes gets its own copy of the
+    engine, created from the engine's `to_dict`/`from_dict`. An EnginePool
+    quacks like an engine as far as `EngineMover` is concerned, so it can
+    be set as the default engine using `set_as_default`.
+
+    Attributes
+    ----------
+    engine : DynamicsEngine
+        the engine to be replicated in the worker processes
+    n_workers : int
+        the maximal number of worker processes
+    last_timings : list of GenerationTiming or None
+        the timings of the trajectories of the last call of
+        `generate_many` or `generate_batch`, if the engine has the option
+        `timing` set
+
+    Notes
+    -----
+    If a worker process dies without reporting an error, e.g. from a
+    segmentation fault in the engine, `generate_many` raises a
+    RuntimeError as soon as no other result is pending.
+
+    The workers are forked for each call of `generate_many`. The continue
+    conditions are usually bound methods of ensembles which cannot be
+    pickled, but they are inherited by a forked worker. This means that
+    the engine is rebuilt for each batch, so the pool only pays off if the
+    trajectories are more expensive than setting up the engine.
+    """
+
+    def __init__(self, engine, n_workers=None):
+        if n_workers is None:
+            n_workers = multiprocessing.cpu_count()
+
+        self.engine = engine
+        self.n_workers = n_workers
+        self.last_timings = None
+
+    def __getattr__(self, item):
+        # everything else (options, template, ...) comes from the engine
+        if item == 'engine':
+            raise AttributeError(item)
+        return getattr(self.engine, item)
+
+    def set_as_default(self):
+        paths.EngineMover.engine = self
+
+    def generate(self, snapshot, running=None, direction=+1,
+                 n_frames_max=None):
+        """
+        Generate a single trajectory; this runs in the calling process.
+
+        See `DynamicsEngine.generate`
+        """
+        return self.engine.generate(snapshot, running, direction,
+                                    n_frames_max)
+
+    def generate_many(self, snapshots, running_conditions=None,
+                      direction=+1, n_frames_max=None):
+        """
+        Generate one trajectory per snapshot using all workers.
+
+        Parameters
+        ----------
+        snapshots : list of Snapshot
+            initial snapshots, one per trajectory
+        running_conditions : list of (list of) function(Trajectory) or None
+            the continue conditions for each of the snapshots
+        direction : -1 or +1 (DynamicsEngine.FORWARD or DynamicsEngine.BACKWARD)
+            see `DynamicsEngine.generate`
+        n_frames_max : list of (int or None) or None
+            the maximal length of each of the trajectories, see
+            `DynamicsEngine.generate`
+
+        Yields
+        ------
+        (int, Trajectory)
+            the index of the initial snapshot in `snapshots` and the
+            generated trajectory, in the order in which the trajectories
+            are finished
+        """
+        if direction == 0:
+            raise RuntimeError('direction must be positive (FORWARD) or negative (BACKWARD).')
+
+        running = paths.DynamicsEngine._batch_running(
+            snapshots, running_conditions
+        )
+        n_frames_max = paths.DynamicsEngine._batch_n_frames_max(
+            snapshots, n_frames_max
+        )
+
+        timing = self.engine.options.get('timing', False)
+        if timing:
+            self.last_timings = [None] * len(snapshots)
+        else:
+            self.last_timings = None
+
+        n_workers = min(self.n_workers, len(snapshots))
+
+        if n_workers <= 1:
+            # no need to fork for a single trajectory
+            for idx, snapshot in enumerate(snapshots):
+                trajectory = self.engine.generate(
+                    snapshot, running[idx], direction, n_frames_max[idx]
+                )
+                if timing:
+                    self.last_timings[idx] = self.engine.last_timing
+                yield idx, trajectory
+            return
+
+        tasks = multiprocessing.Queue()
+        results = multiprocessing.Queue()
+        current = multiprocessing.Array('i', [-1] * n_workers, lock=False)
+
+        for idx in range(len(snapshots)):
+            tasks.put(idx)
+
+        for _ in range(n_workers):
+            tasks.put(None)
+
+        workers = [
+            multiprocessing.Process(
+                target=_pool_worker,
+                args=(self.engine, snapshots, running, direction,
+                      n_frames_max, tasks, results, slot, current)
+            ) for slot in range(n_workers)
+        ]
+
+        logger.info("Starting %d trajectories on %d workers",
+                    len(snapshots), n_workers)
+
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+
+        try:
+            for _ in range(len(snapshots)):
+                idx, frames, timing_data, error = _get_result(
+                    results, workers, current, 'trajectory')
+                if error is not None:
+                    raise RuntimeError(
+                        'Worker failed to generate trajectory %d:\n%s' %
+                        (idx, error)
+                    )
+
+                if timing_data is not None:
+                    self.last_timings[idx] = paths.GenerationTiming(
+                        *timing_data)
+
+                yield idx, self._build_trajectory(
+                    snapshots[idx], frames, direction
+                )
+        finally:
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+                worker.join()
+
+    def generate_batch(self, snapshots, running=None, direction=+1,
+                       n_frames_max=None):
+        """
+        Generate one trajectory per snapshot using all workers.
+
+        See `DynamicsEngine.generate_batch`
+        """
+        trajectories = [None] * len(snapshots)
+        for idx, trajectory in self.generate_many(snapshots, running,
+                                                  direction, n_frames_max):
+            trajectories[idx] = trajectory
+
+        return trajectories
+
+    @staticmethod
+    def _build_trajectory(snapshot, frames, direction):
+        """
+        Combine the initial snapshot and the frames from a worker into the
+        trajectory that `generate` would have returned
+        """
+        topology = snapshot.topology
+        generated = [
+            paths.Snapshot(
+                coordinates=coordinates,
+                velocities=velocities,
+                box_vectors=box_vectors,
+                potential_energy=potential_energy,
+                kinetic_energy=kinetic_energy,
+                topology=topology
+            )
+            for coordinates, velocities, box_vectors,
+                potential_energy, kinetic_energy in frames
+        ]
+
+        if direction > 0:
+            return paths.Trajectory([snapshot] + generated)
+        else:
+            return paths.Trajectory(generated + [snapshot])
@@ -0,0 +1,247 @@
+"""
+Run the dynamics of an engine in a separate process.
+"""
+
+import collections
+import logging
+import multiprocessing
+import random
+import traceback
+
+import numpy as np
+
+import openpathsampling as paths
+from openpathsampling.dynamics_engine import DynamicsEngine
+from openpathsampling.engine_pool import _frame_data
+
+logger = logging.getLogger(__name__)
+
+
+def _server_main(engine, connection):
+    """
+    Main loop of the server process.
+
+    Messages from the client are tuples starting with the command:
+
+    * ('generate', frame, credit) : start from `frame` (see `_frame_data`)
+      and send up to `credit` frames
+    * ('continue', credit) : allow `credit` more frames
+    * ('stop',) : stop the current trajectory; answered by ('stopped',)
+    * ('close',) : end the server
+
+    Frames are sent as ('frame', frame), errors as ('error', traceback).
+    """
+    random.seed()
+    np.random.seed()
+
+    server_engine = engine.__class__.from_dict(engine.to_dict())
+    topology = server_engine.topology
+
+    while True:
+        message = connection.recv()
+        command = message[0]
+        if command == 'close':
+            break
+        elif command != 'generate':
+            # left over from a trajectory that failed
+            if command == 'stop':
+                connection.send(('stopped',))
+            continue
+
+        coordinates, velocities, box_vectors, potential_energy, \
+            kinetic_energy = message[1]
+        credit = message[2]
+
+        try:
+            server_engine.current_snapshot = paths.Snapshot(
+                coordinates=coordinates,
+                velocities=velocities,
+                box_vectors=box_vectors,
+                potential_energy=potential_energy,
+                kinetic_energy=kinetic_energy,
+                topology=topology
+            )
+            server_engine.start()
+        except Exception:
+            connection.send(('error', traceback.format_exc()))
+            continue
+
+        stopped = False
+        while not stopped:
+            # handle all messages, wait for some if we may not run ahead
+            while credit == 0 or connection.poll():
+                message = connection.recv()
+                if message[0] == 'continue':
+                    credit += message[1]
+                elif message[0] == 'stop':
+                    connection.send(('stopped',))
+                    stopped = True
+                    break
+
+            if stopped:
+                break
+
+            try:
+                snapshot = server_engine.generate_next_frame()
+                connection.send(('frame', _frame_data(snapshot)))
+            except Exception:
+                connection.send(('error', traceback.format_exc()))
+                break
+
+            credit -= 1
+
+        server_engine.stop(None)
+
+
+class RemoteEngine(DynamicsEngine):
+    """
+    Runs the dynamics of an engine in a server process.
+
+    The server rebuilds the engine from its `to_dict` and integrates ahead
+    of the client by up to `lookahead` frames, streaming them back through
+    a pipe. The continue conditions are checked in the calling process as
+    usual. Frames generated past the stop condition are discarded.
+
+    While the client waits for frames it runs the tasks handed to `defer`.
+    `PathSampling` uses this to store the previous MC step and compute its
+    collective variables while the engine integrates the next one.
+
+    Attributes
+    ----------
+    engine : DynamicsEngine
+        the engine that is run in the server process. The options
+        (`n_frames_max`, `check_stride`, ...) are taken from this engine.
+    lookahead : int
+        the number of frames the server may generate ahead of the client
+
+    Notes
+    -----
+    The server process is started on the first trajectory and runs until
+    `close` is called. As it is forked from the calling process the
+    engine does not need to be pickled.
+    """
+
+    def __init__(self, engine, lookahead=10):
+        self.engine = engine
+        self.lookahead = lookahead
+
+        self._process = None
+        self._connection = None
+        self._running = False
+        self._deferred = collections.deque()
+        self._current_snapshot = None
+
+        super(RemoteEngine, self).__init__(
+            options=engine.options,
+            template=engine.template
+        )
+
+    @property
+    def default_options(self):
+        return self.engine.default_options
+
+    def to_dict(self):
+        return {
+            'engine' : self.engine,
+            'lookahead' : self.lookahead
+        }
+
+    @property
+    def snapshot_timestep(self):
+        return self.engine.snapshot_timestep
+
+    @property
+    def current_snapshot(self):
+        return self._current_snapshot
+
+    @current_snapshot.setter
+    def current_snapshot(self, snapshot):
+        self._current_snapshot = snapshot
+
+    def _start_server(self):
+        self._connection, server_connection = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_server_main,
+            args=(self.engine, server_connection)
+        )
+        self._process.daemon = True
+        self._process.start()
+        logger.info("Started engine server, pid %d", self._process.pid)
+
+    def close(self):
+        """
+        Run the deferred tasks and end the server process
+        """
+        self.run_deferred()
+        if self._process is not None:
+            if self._running:
+                self._stop_server()
+            self._connection.send(('close',))
+            self._process.join()
+            self._process = None
+            self._connection = None
+
+    def start(self, snapshot=None):
+        super(RemoteEngine, self).start(snapshot)
+        if self._process is None:
+            self._start_server()
+        elif self._running:
+            # the last trajectory did not finish regularly
+            self._stop_server()
+
+        self._connection.send(
+            ('generate', _frame_data(self._current_snapshot), self.lookahead)
+        )
+        self._running = True
+
+    def _receive(self):
+        # use the time until the next message arrives
+        while self._deferred and not self._connection.poll():
+            self._deferred.popleft()()
+
+        message = self._connection.recv()
+        if message[0] == 'error':
+            self._running = False
+            raise RuntimeError('Engine server failed:\n%s' % message[1])
+
+        return message
+
+    def generate_next_frame(self):
+        message = self._receive()
+        self._connection.send(('continue', 1))
+
+        coordinates, velocities, box_vectors, potential_energy, \
+            kinetic_energy = message[1]
+
+        self._current_snapshot = paths.Snapshot(
+            coordinates=coordinates,
+            velocities=velocities,
+            box_vectors=box_vectors,
+            potential_energy=potential_energy,
+            kinetic_energy=kinetic_energy,
+            topology=self.topology
+        )
+        return self._current_snapshot
+
+    def _stop_server(self):
+        self._connection.send(('stop',))
+        # frames generated ahead are dropped
+        while self._receive()[0] != 'stopped':
+            pass
+        self._running = False
+
+    def stop(self, trajectory):
+        if self._running:
+            self._stop_server()
+
+    def defer(self, task):
+        """
+        Run `task` while waiting for the next frame from the server.
+
+        See `DynamicsEngine.defer`
+        """
+        self._deferred.append(task)
+
+    def run_deferred(self):
+        while self._deferred:
+            self._deferred.popleft()()
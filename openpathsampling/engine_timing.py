@@ -0,0 +1,97 @@
+"""
+Wall time spent in the different phases of generating a trajectory.
+"""
+
+from openpathsampling.netcdfplus import StorableObject
+
+
+class GenerationTiming(StorableObject):
+    """
+    Accumulated wall times and counters of the phases of one (or several)
+    calls of `DynamicsEngine.generate`.
+
+    The phases recorded by `DynamicsEngine.generate` are
+
+    * 'total' : the whole call
+    * 'dynamics' : running the engine (`generate_next_frame`), counted
+      per frame. Engines may report 'snapshots' as the part of this that
+      builds the snapshots.
+    * 'trajectory' : adding the new frames to the trajectory
+    * 'continue_conditions' : checking the continue conditions, counted
+      per check. 'cv' is the part of this (and of everything else during
+      the call) spent evaluating collective variables, counted per
+      evaluated snapshot.
+
+    Nested phases are included in their parent phase, so the times do not
+    add up to 'total'.
+
+    Attributes
+    ----------
+    times : dict of str : float
+        the accumulated wall time in seconds per phase
+    counts : dict of str : int
+        how often each phase was entered (or how many items it handled)
+    n_frames : int
+        the number of frames of the generated trajectories
+    """
+
+    # the timing of the trajectory that is being generated, if any. This is
+    # where code that is called from the engine can report to.
+    current = None
+
+    def __init__(self, times=None, counts=None, n_frames=0):
+        super(GenerationTiming, self).__init__()
+        if times is None:
+            times = {}
+        if counts is None:
+            counts = {}
+
+        self.times = times
+        self.counts = counts
+        self.n_frames = n_frames
+
+    def add(self, phase, seconds, count=1):
+        """
+        Add time spent in a phase
+
+        Parameters
+        ----------
+        phase : str
+            the name of the phase
+        seconds : float
+            the wall time to add
+        count : int
+            the number to add to the counter of the phase
+        """
+        self.times[phase] = self.times.get(phase, 0.0) + seconds
+        self.counts[phase] = self.counts.get(phase, 0) + count
+
+    @classmethod
+    def add_current(cls, phase, seconds, count=1):
+        """
+        Add time to the timing of the trajectory being generated, if any
+        """
+        if cls.current is not None:
+            cls.current.add(phase, seconds, count)
+
+    def __add__(self, other):
+        result = GenerationTiming(dict(self.times), dict(self.counts),
+                                  self.n_frames + other.n_frames)
+        for phase, seconds in other.times.iteritems():
+            result.add(phase, seconds, other.counts.get(phase, 0))
+        return result
+
+    def __str__(self):
+        total = self.times.get('total', 0.0)
+        lines = ['%-20s %10s %12s %7s' % ('phase', 'count', 'time [s]', '%')]
+        for phase in sorted(self.times, key=lambda p: -self.times[p]):
+            seconds = self.times[phase]
+            if total > 0.0:
+                percent = '%6.1f%%' % (100.0 * seconds / total)
+            else:
+                percent = ''
+            lines.append('%-20s %10d %12.6f %7s' % (
+                phase, self.counts.get(phase, 0), seconds, percent
+            ))
+        lines.append('frames: %d' % self.n_frames)
+        return '\n'.join(lines)
@@ -6,7 +6,13 @@ Created on 03.09.2014
 
 import logging
 
+import numpy as np
+
 from openpathsampling.netcdfplus import StorableNamedObject
+from openpathsampling.ensemble_automaton import (
+    EnsembleAutomaton, SequentialAutomaton
+)
+from openpathsampling.adaptive_order import AdaptiveOrder, flatten_combination
 import openpathsampling as paths
 
 import abc
@@ -153,12 +159,40 @@ class Ensemble(StorableNamedObject):
 
     use_shortcircuit = True
 
+    # evaluate unions and intersections in the order that is expected to be
+    # cheapest for untrusted calls (see `AdaptiveOrder`)
+    adaptive_shortcircuit = False
+
+    # compiled automata (see `ensemble_automaton`) can be turned off
+    _use_automaton = True
+
     def __init__(self):
         '''
         A path volume defines a set of paths.
         '''
         super(Ensemble, self).__init__()
 
+    def _compile_automaton(self, direction):
+        return EnsembleAutomaton.compile(self, direction)
+
+    def _automaton(self, direction):
+        """
+        The compiled automaton for reading frames in `direction`, or None
+        if the ensemble can't be compiled (see `EnsembleAutomaton`).
+        """
+        if not self._use_automaton or not Ensemble.use_shortcircuit:
+            return None
+        try:
+            automata = self._automata
+        except AttributeError:
+            automata = self._automata = {}
+        try:
+            return automata[direction]
+        except KeyError:
+            automaton = self._compile_automaton(direction)
+            automata[direction] = automaton
+            return automaton
+
     def __eq__(self, other):
         if self is other:
             return True
@@ -345,6 +379,12 @@ class Ensemble(StorableNamedObject):
 
             return ensemble_list
         else:
+            automaton = self._automaton(+1)
+            if automaton is not None:
+                # the same search from precomputed frame labels
+                return automaton.find_valid_slices(trajectory, min_length,
+                                                   overlap)
+
             start = 0
             end = min_length
 
@@ -628,28 +668,67 @@ class EnsembleCombination(Ensemble):
         self.fnc = fnc
         self.sfnc = str_fnc
 
+    # the value of a subensemble that decides the result (True for unions,
+    # False for intersections), None if the combination can't be reordered
+    _decisive = None
+
     def to_dict(self):
         return { 'ensemble1' : self.ensemble1, 'ensemble2' : self.ensemble2 }
 
+    def _adaptive_order(self, method, trusted):
+        """
+        The AdaptiveOrder for `method`, or None if the subensembles are
+        evaluated in the given order.
+
+        Trusted calls assume that each subensemble has seen the previous
+        frames, so they are never reordered.
+        """
+        if trusted or self._decisive is None or \
+                not Ensemble.adaptive_shortcircuit or \
+                not Ensemble.use_shortcircuit:
+            return None
+        try:
+            orders = self._adaptive
+        except AttributeError:
+            orders = self._adaptive = {}
+        try:
+            return orders[method]
+        except KeyError:
+            order = AdaptiveOrder(
+                flatten_combination(self,
+                                    lambda e: (e.ensemble1, e.ensemble2)),
+                self._decisive
+            )
+            orders[method] = order
+            return order
+
     def __call__(self, trajectory, trusted=None):
+        adaptive = self._adaptive_order('__call__', trusted)
+        if adaptive is not None:
+            return adaptive.evaluate('__call__', trajectory, trusted)
         # Shortcircuit will automatically skip the second part of the combination if the result does not depend on it!
         # This makes sense since the expensive part is the ensemble testing not computing two logic operations
         if Ensemble.use_shortcircuit:
             a = self.ensemble1(trajectory, trusted)
-            logger.debug("Combination is " + self.__class__.__name__)
-            logger.debug("Combination: " + self.ensemble1.__class__.__name__ + 
-                         " is "+str(a))
-            logger.debug("Combination: " + self.ensemble2.__class__.__name__ +
-                         " is " +str(self.ensemble2(trajectory, trusted)))
-            logger.debug("Combination: returning " + 
-                         str(self.fnc(a,self.ensemble2(trajectory,trusted))))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Combination is " + self.__class__.__name__)
+                logger.debug("Combination: " +
+                             self.ensemble1.__class__.__name__ +
+                             " is "+str(a))
             res_true = self.fnc(a, True)
             res_false = self.fnc(a, False)
             if res_false == res_true:
                 # result is independent of ensemble_b so ignore it
+                logger.debug("Combination: returning " + str(res_true))
                 return res_true
             else:
                 b = self.ensemble2(trajectory, trusted)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Combination: " +
+                                 self.ensemble2.__class__.__name__ +
+                                 " is " + str(b))
+                    logger.debug("Combination: returning " +
+                                 str(self.fnc(a, b)))
                 return self.fnc(a, b)
         else:
             return self.fnc(self.ensemble1(trajectory, trusted), self.ensemble2(trajectory, trusted))
@@ -675,25 +754,28 @@ class EnsembleCombination(Ensemble):
         return res
 
     def can_append(self, trajectory, trusted=False):
+        # for unions and intersections, _continue_fnc is just fnc
+        adaptive = self._adaptive_order('can_append', trusted)
+        if adaptive is not None:
+            return adaptive.evaluate('can_append', trajectory, trusted)
         if Ensemble.use_shortcircuit:
             a = self.ensemble1.can_append(trajectory, trusted)
-            logger.debug("Combination is " + self.__class__.__name__)
-            logger.debug("Combination.can_append: " + 
-                         self.ensemble1.__class__.__name__ + " is "+str(a))
-            logger.debug("Combination.can_append: " 
-                         + self.ensemble2.__class__.__name__ +
-                         " is " +
-                         str(self.ensemble2.can_append(trajectory, trusted)))
-            logger.debug("Combination.can_append: returning " + 
-                         str(self.fnc(a,self.ensemble2.can_append(trajectory,trusted))))
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Combination is " + self.__class__.__name__)
+                logger.debug("Combination.can_append: " +
+                             self.ensemble1.__class__.__name__ + " is "+str(a))
             res_true = self._continue_fnc(a, True)
             res_false = self._continue_fnc(a, False)
             if res_false == res_true:
                 # result is independent of ensemble_b so ignore it
+                logger.debug("Combination.can_append: returning " +
+                             str(res_true))
                 return res_true
             else:
                 b = self.ensemble2.can_append(trajectory, trusted)
-                #logger.debug("b is " + str(b))
+                logger.debug("Combination.can_append: "
+                             + self.ensemble2.__class__.__name__ +
+                             " is " + str(b))
                 if b == True:
                     #logger.debug("Will return res_true")
                     return res_true
@@ -705,6 +787,9 @@ class EnsembleCombination(Ensemble):
                             self.ensemble2.can_append(trajectory, trusted))
 
     def can_prepend(self, trajectory, trusted=False):
+        adaptive = self._adaptive_order('can_prepend', trusted)
+        if adaptive is not None:
+            return adaptive.evaluate('can_prepend', trajectory, trusted)
         if Ensemble.use_shortcircuit:
             a = self.ensemble1.can_prepend(trajectory, trusted)
             res_true = self._continue_fnc(a, True)
@@ -728,11 +813,15 @@ class EnsembleCombination(Ensemble):
 
 
 class UnionEnsemble(EnsembleCombination):
+    _decisive = True
+
     def __init__(self, ensemble1, ensemble2):
         super(UnionEnsemble, self).__init__(ensemble1, ensemble2, fnc = lambda a,b : a or b, str_fnc = '{0}\nor\n{1}')
 
 
 class IntersectionEnsemble(EnsembleCombination):
+    _decisive = False
+
     def __init__(self, ensemble1, ensemble2):
         super(IntersectionEnsemble, self).__init__(ensemble1, ensemble2, fnc = lambda a,b : a and b, str_fnc = '{0}\nand\n{1}')
 
@@ -793,6 +882,8 @@ class SequentialEnsemble(Ensemble):
         self.greedy = greedy
 
         self._use_cache = True # cache can be turned off
+        self._use_automaton = True # compiled automata can be turned off
+        self._automata = {}
         self._cache_can_append = EnsembleCache(+1)
         self._cache_call = EnsembleCache(+1)
         self._cache_can_prepend = EnsembleCache(-1)
@@ -807,6 +898,9 @@ class SequentialEnsemble(Ensemble):
             if min_overlap[i] > max_overlap[i]:
                 raise ValueError("min_overlap greater than max_overlap!")
 
+    def _compile_automaton(self, direction):
+        return SequentialAutomaton.compile(self, direction)
+
     def update_cache(self, cache, ens_num, ens_from, subtraj_from):
         """Updates the given cache.
 
@@ -892,6 +986,10 @@ class SequentialEnsemble(Ensemble):
 
 
     def __call__(self, trajectory, trusted=None):
+        automaton = self._automaton(+1)
+        if automaton is not None:
+            return automaton.accepts(trajectory)
+
         logger.debug("Looking for transitions in trajectory " + str(trajectory))
         transitions = self.transition_frames(trajectory, trusted)
         logger.debug("Found transitions: " + str(transitions))
@@ -993,6 +1091,10 @@ class SequentialEnsemble(Ensemble):
         # (c) loop around to text another subtrajectory (we can't tell)
         # Returning false can only happen if all ensembles have been tested
         #self._check_cache(trajectory, function="can_append")
+        automaton = self._automaton(+1)
+        if automaton is not None:
+            return automaton.can_extend(trajectory)
+
         cache = self._cache_can_append
         if trusted:
             cache.trusted = True
@@ -1123,6 +1225,10 @@ class SequentialEnsemble(Ensemble):
 
     def can_prepend(self, trajectory, trusted=False):
         # based on .can_append(); see notes there for algorithm details
+        automaton = self._automaton(-1)
+        if automaton is not None:
+            return automaton.can_extend(trajectory)
+
         cache = self._cache_can_prepend
         if trusted:
             cache.trusted = True
@@ -1363,10 +1469,7 @@ class AllInXEnsemble(VolumeEnsemble):
             return self._volume(frame)
         else:
             #logger.debug("Calling volume untrusted "+repr(self))
-            for frame in trajectory.as_proxies():
-                if not self._volume(frame):
-                    return False
-            return True
+            return bool(np.all(self._volume.evaluate_trajectory(trajectory)))
 
     def check_reverse(self, trajectory, trusted=False):
         # order in this one only matters if it is trusted
@@ -1419,10 +1522,7 @@ class PartInXEnsemble(VolumeEnsemble):
         trajectory : Trajectory
             The trajectory to be checked
         '''
-        for frame in trajectory.as_proxies():
-            if self._volume(frame):
-                return True
-        return False
+        return bool(np.any(self._volume.evaluate_trajectory(trajectory)))
 
     def __invert__(self):
         return AllOutXEnsemble(self.volume, self.frames, self.trusted)
@@ -1444,10 +1544,7 @@ class PartOutXEnsemble(PartInXEnsemble):
         return AllInXEnsemble(self.volume, self.frames, self.trusted)
 
     def __call__(self, trajectory, trusted=None):
-        for frame in trajectory.as_proxies():
-            if self._volume(frame):
-                return True
-        return False
+        return bool(np.any(self._volume.evaluate_trajectory(trajectory)))
 
 
 class ExitsXEnsemble(VolumeEnsemble):
@@ -1466,14 +1563,9 @@ class ExitsXEnsemble(VolumeEnsemble):
         return domain+result
 
     def __call__(self, trajectory, trusted=None):
-        subtraj = trajectory
-        for i in range(len(subtraj)-1):
-            frame_i = subtraj.get_as_proxy(i)
-            if self._volume(frame_i):
-                frame_iplus = subtraj.get_as_proxy(i+1)
-                if not self._volume(frame_iplus):
-                    return True
-        return False
+        inside = self._volume.evaluate_trajectory(trajectory)
+        return bool(np.any(np.logical_and(inside[:-1],
+                                          np.logical_not(inside[1:]))))
 
 
 class EntersXEnsemble(ExitsXEnsemble):
@@ -1488,14 +1580,9 @@ class EntersXEnsemble(ExitsXEnsemble):
         return domain+result
 
     def __call__(self, trajectory, trusted=None):
-        subtraj = trajectory
-        for i in range(len(subtraj)-1):
-            frame_i = subtraj.get_as_proxy(i)
-            if not self._volume(frame_i):
-                frame_iplus = subtraj.get_as_proxy(i+1)
-                if self._volume(frame_iplus):
-                    return True
-        return False
+        inside = self._volume.evaluate_trajectory(trajectory)
+        return bool(np.any(np.logical_and(np.logical_not(inside[:-1]),
+                                          inside[1:])))
 
 
 class WrappedEnsemble(Ensemble):
@@ -1567,27 +1654,22 @@ class SuffixTrajectoryEnsemble(WrappedEnsemble):
     def __init__(self, ensemble, add_trajectory):
         super(SuffixTrajectoryEnsemble, self).__init__(ensemble)
         self.add_trajectory = add_trajectory
-        self._cached_trajectory = paths.Trajectory(add_trajectory.as_proxies())
+        self._cached_trajectory = paths.ConcatenatedTrajectory(
+            paths.Trajectory(), add_trajectory, reverse_first=True
+        )
 
     def _alter(self, trajectory):
         logger.debug("Starting Suffix._alter")
-        #logger.debug("altered " + str([id(i) for i in self._cached_trajectory]))
         reset = self._cache_can_prepend.check(trajectory)
-        #logger.debug("altered " + str([id(i) for i in self._cached_trajectory]))
-        #logger.debug("traj    " + str([id(i) for i in trajectory]))
-        #logger.debug("trajrev " + str([id(i) for i in trajectory.reversed]))
-        #reset = False
         if not reset:
             logger.debug("BackwardPrended was not reset")
-            first_frame = trajectory.get_as_proxy(-1)
-            if self._cached_trajectory.get_as_proxy(0) != first_frame:
-                self._cached_trajectory.insert(0, first_frame)
+            # the cache made sure that trajectory extends the last one, so
+            # the view just grows
+            self._cached_trajectory.first = trajectory
         else:
-            self._cached_trajectory = trajectory.reversed + self.add_trajectory
-
-        #logger.debug("revtraj " + str([id(i) for i in revtraj]))
-        #logger.debug("add     " + str([id(i) for i in self.add_trajectory]))
-        #logger.debug("altered " + str([id(i) for i in self._cached_trajectory]))
+            self._cached_trajectory = paths.ConcatenatedTrajectory(
+                trajectory, self.add_trajectory, reverse_first=True
+            )
 
         return self._cached_trajectory
 
@@ -1604,29 +1686,21 @@ class PrefixTrajectoryEnsemble(WrappedEnsemble):
     def __init__(self, ensemble, add_trajectory):
         super(PrefixTrajectoryEnsemble, self).__init__(ensemble)
         self.add_trajectory = add_trajectory
-        self._cached_trajectory = paths.Trajectory(add_trajectory.as_proxies())
+        self._cached_trajectory = paths.ConcatenatedTrajectory(
+            add_trajectory, paths.Trajectory()
+        )
 
     def _alter(self, trajectory):
         logger.debug("Starting _alter")
         reset = self._cache_can_append.check(trajectory)
         if not reset:
-            final_frame = trajectory.get_as_proxy(-1)
-            if self._cached_trajectory.get_as_proxy(-1) != final_frame:
-                self._cached_trajectory.append(final_frame)
+            # the cache made sure that trajectory extends the last one, so
+            # the view just grows
+            self._cached_trajectory.second = trajectory
         else: 
-            logger.debug("doing it oldstyle")
-            self._cached_trajectory = self.add_trajectory + trajectory
-
-        # DEBUG 
-        #logger.debug("add   " + str([i for i in self.add_trajectory]))
-        #logger.debug("traj  " + str([i for i in trajectory]))
-        #logger.debug("cache " + str([i for i in self._cached_trajectory]))
-        #oldstyle = self.add_trajectory + trajectory
-        #for (t,b) in zip(self._cached_trajectory,
-                         #self.add_trajectory+trajectory):
-            #logger.debug(str(t) + " ?=? " + str(b))
-            #assert(t == b)
-        #assert(len(self._cached_trajectory) == len(oldstyle))
+            self._cached_trajectory = paths.ConcatenatedTrajectory(
+                self.add_trajectory, trajectory
+            )
 
         return self._cached_trajectory
 
@@ -1858,6 +1932,14 @@ class TISEnsemble(SequentialEnsemble):
 #        self.name = interface.name
         self.orderparameter = orderparameter
 
+    # the EnsembleSet which answers untrusted calls, if any
+    _ensemble_set = None
+
+    def __call__(self, trajectory, trusted=None):
+        if not trusted and self._ensemble_set is not None:
+            return self._ensemble_set.contains(self, trajectory)
+        return super(TISEnsemble, self).__call__(trajectory, trusted)
+
     def trajectory_summary(self, trajectory):
         initial_state_i = None
         final_state_i = None
@@ -1988,5 +2070,7 @@ class EnsembleFactory():
             myset.append(
                 paths.TISEnsemble(volume_a, volume_b, vol, orderparameter)
             )
+        # membership in all interface ensembles is evaluated together
+        paths.EnsembleSet(myset).register()
         return myset
 
@@ -0,0 +1,683 @@
+"""
+Deterministic automata for ensembles.
+
+Most sequential ensembles (TIS, minus, A-to-B, ...) are built only from
+volume, length and logical ensembles. Whether a trajectory is in such an
+ensemble only depends on which volumes its frames are in, so it can be
+decided by an automaton that reads one label (the tuple of volume
+memberships) per frame. The automata here reproduce the frame assignment
+of `SequentialEnsemble` (which greedily assigns the longest possible
+subtrajectory to each subensemble) and are built lazily: each state and
+transition is created the first time it is needed.
+
+Non-sequential ensembles made of the same building blocks are compiled
+into an `EnsembleAutomaton`, which is used to split trajectories.
+"""
+
+import logging
+
+import openpathsampling as paths
+
+logger = logging.getLogger(__name__)
+
+
+class _NotCompilable(Exception):
+    pass
+
+
+class _Node(object):
+    """
+    A subensemble that is fed the frames of a growing subtrajectory.
+
+    States are immutable and hashable. `value` answers the queries that
+    `SequentialEnsemble` asks its subensembles:
+
+    * 'call' : ensemble(subtraj)
+    * 'call_t' : ensemble(subtraj, trusted=True)
+    * 'can', 'can_t' : can_append (forward) or can_prepend (backward) of
+      subtraj, untrusted or trusted
+    * 'rev_t' : ensemble.check_reverse(subtraj, trusted=True)
+    """
+    start = None
+
+    def __init__(self, direction):
+        self.direction = direction
+
+    def step(self, state, label):
+        raise NotImplementedError
+
+    def value(self, state, query):
+        raise NotImplementedError
+
+
+class _ConstantNode(_Node):
+    # FullEnsemble and EmptyEnsemble
+    start = ()
+
+    def __init__(self, direction, result):
+        super(_ConstantNode, self).__init__(direction)
+        self.result = result
+
+    def step(self, state, label):
+        return state
+
+    def value(self, state, query):
+        return self.result
+
+
+class _AllInNode(_Node):
+    # state : (nonempty, all frames in, first frame in, last frame in)
+    start = (False, True, None, None)
+
+    def __init__(self, direction, index, negate):
+        super(_AllInNode, self).__init__(direction)
+        self.index = index
+        self.negate = negate
+
+    def step(self, state, label):
+        inside = label[self.index] != self.negate
+        nonempty, all_in, first_in, last_in = state
+        if not nonempty:
+            return (True, inside, inside, inside)
+        elif self.direction > 0:
+            return (True, all_in and inside, first_in, inside)
+        else:
+            return (True, all_in and inside, inside, last_in)
+
+    def value(self, state, query):
+        nonempty, all_in, first_in, last_in = state
+        if query == 'call':
+            return nonempty and all_in
+        elif query == 'call_t':
+            return nonempty and last_in
+        elif query == 'can':
+            return not nonempty or all_in
+        elif query == 'can_t':
+            if self.direction > 0:
+                return not nonempty or last_in
+            else:
+                return not nonempty or first_in
+        else:
+            return nonempty and first_in
+
+
+class _PartInNode(_Node):
+    # state : any frame in
+    start = False
+
+    def __init__(self, direction, index, negate):
+        super(_PartInNode, self).__init__(direction)
+        self.index = index
+        self.negate = negate
+
+    def step(self, state, label):
+        return state or label[self.index] != self.negate
+
+    def value(self, state, query):
+        if query in ['can', 'can_t']:
+            return True
+        return state
+
+
+class _CrossingNode(_Node):
+    # state : (last fed frame in, crossing found)
+    start = (None, False)
+
+    def __init__(self, direction, index, enters):
+        super(_CrossingNode, self).__init__(direction)
+        self.index = index
+        self.enters = enters
+
+    def step(self, state, label):
+        inside = label[self.index]
+        edge, found = state
+        if edge is not None and not found:
+            if self.direction > 0:
+                before, after = edge, inside
+            else:
+                before, after = inside, edge
+            if self.enters:
+                found = not before and after
+            else:
+                found = before and not after
+        return (inside, found)
+
+    def value(self, state, query):
+        if query in ['can', 'can_t']:
+            return True
+        return state[1]
+
+
+class _LengthNode(_Node):
+    # state : number of frames, capped where the result cannot change
+    start = 0
+
+    def __init__(self, direction, ensemble):
+        super(_LengthNode, self).__init__(direction)
+        self.ensemble = ensemble
+        length = ensemble.length
+        if type(length) is int:
+            self.cap = length + 1
+        else:
+            self.cap = max(length.start or 0, length.stop or 0) + 1
+
+    def step(self, state, label):
+        return min(state + 1, self.cap)
+
+    def value(self, state, query):
+        # LengthEnsemble only looks at len(trajectory)
+        placeholder = [None] * state
+        if query in ['can', 'can_t']:
+            return self.ensemble.can_append(placeholder)
+        return self.ensemble(placeholder)
+
+
+class _CombinationNode(_Node):
+    def __init__(self, direction, ensemble, node1, node2):
+        super(_CombinationNode, self).__init__(direction)
+        self.ensemble = ensemble
+        self.node1 = node1
+        self.node2 = node2
+        self.start = (node1.start, node2.start)
+
+    def step(self, state, label):
+        return (self.node1.step(state[0], label),
+                self.node2.step(state[1], label))
+
+    def value(self, state, query):
+        if query == 'rev_t':
+            # combinations use the untrusted call for check_reverse
+            query = 'call'
+        a = self.node1.value(state[0], query)
+        b = self.node2.value(state[1], query)
+        if query in ['can', 'can_t']:
+            return self.ensemble._continue_fnc(a, b)
+        return self.ensemble.fnc(a, b)
+
+
+class _NegatedNode(_Node):
+    def __init__(self, direction, node):
+        super(_NegatedNode, self).__init__(direction)
+        self.node = node
+        self.start = node.start
+
+    def step(self, state, label):
+        return self.node.step(state, label)
+
+    def value(self, state, query):
+        if query in ['can', 'can_t']:
+            return True
+        elif query == 'rev_t':
+            query = 'call'
+        return not self.node.value(state, query)
+
+
+class _WrappedNode(_Node):
+    def __init__(self, direction, node):
+        super(_WrappedNode, self).__init__(direction)
+        self.node = node
+        self.start = node.start
+
+    def step(self, state, label):
+        return self.node.step(state, label)
+
+    def value(self, state, query):
+        if query == 'rev_t':
+            query = 'call'
+        elif query == 'can_t' and self.direction < 0:
+            # WrappedEnsemble.can_prepend does not pass `trusted` on
+            query = 'can'
+        return self.node.value(state, query)
+
+
+def _volume_index(volumes, volume):
+    for idx, known in enumerate(volumes):
+        if known is volume:
+            return idx
+    volumes.append(volume)
+    return len(volumes) - 1
+
+
+def _compile(ensemble, direction, volumes):
+    """
+    The node for `ensemble`; raises _NotCompilable for ensembles that do
+    not only depend on the volume labels of the frames.
+    """
+    ens = paths.ensemble
+    # subclasses can change the behavior, so the exact type has to match
+    cls = type(ensemble)
+    if cls in [ens.AllInXEnsemble, ens.AllOutXEnsemble]:
+        return _AllInNode(direction, _volume_index(volumes, ensemble.volume),
+                          cls is ens.AllOutXEnsemble)
+    elif cls in [ens.PartInXEnsemble, ens.PartOutXEnsemble]:
+        return _PartInNode(direction,
+                           _volume_index(volumes, ensemble.volume),
+                           cls is ens.PartOutXEnsemble)
+    elif cls in [ens.ExitsXEnsemble, ens.EntersXEnsemble]:
+        return _CrossingNode(direction,
+                             _volume_index(volumes, ensemble.volume),
+                             cls is ens.EntersXEnsemble)
+    elif cls is ens.LengthEnsemble:
+        return _LengthNode(direction, ensemble)
+    elif cls is ens.FullEnsemble:
+        return _ConstantNode(direction, True)
+    elif cls is ens.EmptyEnsemble:
+        return _ConstantNode(direction, False)
+    elif cls in [ens.UnionEnsemble, ens.IntersectionEnsemble,
+                 ens.SymmetricDifferenceEnsemble,
+                 ens.RelativeComplementEnsemble]:
+        return _CombinationNode(
+            direction, ensemble,
+            _compile(ensemble.ensemble1, direction, volumes),
+            _compile(ensemble.ensemble2, direction, volumes)
+        )
+    elif cls is ens.NegatedEnsemble:
+        return _NegatedNode(direction,
+                            _compile(ensemble.ensemble, direction, volumes))
+    elif cls in [ens.WrappedEnsemble, ens.AppendedNameEnsemble,
+                 ens.OptionalEnsemble, ens.SingleFrameEnsemble]:
+        return _WrappedNode(
+            direction, _compile(ensemble._new_ensemble, direction, volumes)
+        )
+
+    raise _NotCompilable(cls.__name__)
+
+
+class EnsembleAutomaton(object):
+    """
+    Automaton deciding an ensemble from the volume labels of the frames.
+
+    The automaton reads the frames of a trajectory one by one; each state
+    knows whether the frames read so far are in the ensemble and whether
+    the ensemble can be extended (`can_append` forward, `can_prepend`
+    backward, both untrusted). The states are interned as integers and
+    each transition is only computed once.
+
+    Use `compile` to create an automaton; it returns None if the ensemble
+    can not be compiled.
+
+    Attributes
+    ----------
+    ensemble : Ensemble
+        the compiled ensemble
+    direction : +1 or -1
+        +1 to read the frames forward (`__call__`, `can_append`), -1 to
+        read them backward (`can_prepend`)
+    volumes : list of Volume
+        the volumes that make up the label of a frame
+    """
+
+    def __init__(self, ensemble, direction):
+        self.ensemble = ensemble
+        self.direction = direction
+        self.volumes = []
+        self._setup()
+
+        self._ids = {}
+        self._transitions = []
+        self._states = []
+        self._accepts = []
+        self._can_extend = []
+        self._start = self._intern(self._initial())
+
+        # (fixed frame, moving end frame, length, state) of the last
+        # trajectory given to can_extend
+        self._last = None
+
+    def _setup(self):
+        self._node = _compile(self.ensemble, self.direction, self.volumes)
+
+    # the states of the uncompiled automaton; overridden in subclasses
+
+    def _initial(self):
+        return self._node.start
+
+    def _next(self, state, label):
+        return self._node.step(state, label)
+
+    def _verdicts(self, state):
+        return (self._node.value(state, 'call'),
+                self._node.value(state, 'can'))
+
+    @classmethod
+    def compile(cls, ensemble, direction=+1):
+        """
+        The automaton of an ensemble or None
+
+        Parameters
+        ----------
+        ensemble : Ensemble
+            the ensemble to compile
+        direction : +1 or -1
+            the direction in which frames are read
+
+        Returns
+        -------
+        EnsembleAutomaton or None
+            None if (a part of) the ensemble can not be compiled
+        """
+        try:
+            return cls(ensemble, direction)
+        except _NotCompilable as e:
+            logger.debug("Cannot compile ensemble: " + str(e))
+            return None
+
+    @property
+    def n_states(self):
+        """
+        The number of states created so far
+        """
+        return len(self._states)
+
+    def _intern(self, state):
+        try:
+            return self._ids[state]
+        except KeyError:
+            state_id = len(self._states)
+            self._ids[state] = state_id
+            self._states.append(state)
+            self._transitions.append({})
+            accepts, can_extend = self._verdicts(state)
+            self._accepts.append(accepts)
+            self._can_extend.append(can_extend)
+            return state_id
+
+    def label(self, frame):
+        """
+        The label of a frame: whether it is in each of the `volumes`
+        """
+        return tuple(bool(volume(frame)) for volume in self.volumes)
+
+    def labels(self, trajectory):
+        """
+        The labels of all frames of a trajectory, in trajectory order
+
+        Each volume is evaluated for all frames at once (see
+        `Volume.evaluate_trajectory`).
+        """
+        if len(trajectory) == 0:
+            return []
+        if len(self.volumes) == 0:
+            return [()] * len(trajectory)
+        return zip(*[volume.evaluate_trajectory(trajectory).tolist()
+                     for volume in self.volumes])
+
+    def step(self, state, frame):
+        """
+        The state after reading `frame` in `state`
+        """
+        return self._step_label(state, self.label(frame))
+
+    def _step_label(self, state, label):
+        transitions = self._transitions[state]
+        try:
+            return transitions[label]
+        except KeyError:
+            new_state = self._intern(self._next(self._states[state], label))
+            transitions[label] = new_state
+            return new_state
+
+    def run(self, trajectory):
+        """
+        The state after reading all frames of `trajectory`
+        """
+        labels = self.labels(trajectory)
+        if self.direction < 0:
+            labels.reverse()
+
+        state = self._start
+        for label in labels:
+            state = self._step_label(state, label)
+        return state
+
+    def accepts(self, trajectory):
+        """
+        Whether `trajectory` is in the ensemble; one pass over the frames.
+        """
+        return self._accepts[self.run(trajectory)]
+
+    def can_extend(self, trajectory):
+        """
+        `can_append` (forward) or `can_prepend` (backward) of the ensemble.
+
+        If `trajectory` extends the trajectory of the previous call at the
+        end (beginning for backward), only the new frames are read.
+        """
+        n_frames = len(trajectory)
+        if n_frames == 0:
+            return self._can_extend[self._start]
+
+        forward = self.direction > 0
+        if forward:
+            fixed_idx, moving_idx = 0, n_frames - 1
+        else:
+            fixed_idx, moving_idx = n_frames - 1, 0
+
+        state = None
+        if self._last is not None:
+            fixed, moving, length, last_state = self._last
+            n_new = n_frames - length
+            if n_new >= 0 and trajectory.get_as_proxy(fixed_idx) == fixed:
+                if forward:
+                    old_idx, new_frames = length - 1, xrange(length, n_frames)
+                else:
+                    old_idx, new_frames = n_new, xrange(n_new - 1, -1, -1)
+                if trajectory.get_as_proxy(old_idx) == moving:
+                    state = last_state
+                    for idx in new_frames:
+                        state = self.step(state, trajectory.get_as_proxy(idx))
+
+        if state is None:
+            state = self.run(trajectory)
+
+        self._last = (trajectory.get_as_proxy(fixed_idx),
+                      trajectory.get_as_proxy(moving_idx),
+                      n_frames, state)
+        return self._can_extend[state]
+
+    def _run_until_stop(self, labels, position, state, previous, stops):
+        # Continue a run at `position` in `state` (`previous` is the state
+        # one frame before) until can_extend fails or the frames run out.
+        # Returns the stop position and the states at and before it. Runs
+        # in the same state at the same position stop at the same place,
+        # which `stops` remembers.
+        n_frames = len(labels)
+        path = []
+        while True:
+            known = stops.get(position, {}).get(state)
+            if known is not None:
+                stop, stop_state, before = known
+                break
+            if position == n_frames or not self._can_extend[state]:
+                stop, stop_state, before = position, state, None
+                stops.setdefault(position, {})[state] = (stop, state, None)
+                break
+            path.append((position, state))
+            previous = state
+            state = self._step_label(state, labels[position])
+            position += 1
+
+        if before is None:
+            before = previous
+
+        for path_position, path_state in path:
+            stops.setdefault(path_position, {})[path_state] = (
+                stop, stop_state, before)
+
+        return stop, stop_state, before
+
+    def find_valid_slices(self, trajectory, min_length=1, overlap=1):
+        """
+        `Ensemble.find_valid_slices` (lazy) from the frame labels
+
+        The subtrajectories are tested exactly as the lazy search of
+        `Ensemble.find_valid_slices` does, but the labels are computed once
+        and runs from different starting frames that reach the same state
+        are only followed once, so this is linear in the number of frames.
+
+        Parameters
+        ----------
+        trajectory : Trajectory or list of Snapshot
+            the trajectory to split
+        min_length : int > 0
+            the minimal length of the subtrajectories
+        overlap : int >= 0
+            the number of frames two subtrajectories may share
+
+        Returns
+        -------
+        list of slices
+            the slices of `trajectory` that are in the ensemble
+        """
+        if self.direction < 0:
+            raise RuntimeError("Only forward automata find slices")
+
+        labels = self.labels(trajectory)
+        length = len(labels)
+        min_length = max(1, min_length)
+
+        slices = []
+        # stop positions by state for all positions from `start` on
+        stops = {}
+        start = 0
+        while start <= length - min_length:
+            state = previous = self._start
+            for position in range(start, start + min_length):
+                previous = state
+                state = self._step_label(state, labels[position])
+
+            stop, stop_state, before = self._run_until_stop(
+                labels, start + min_length, state, previous, stops)
+
+            if self._accepts[stop_state]:
+                slices.append(slice(start, stop))
+                pad = min(overlap, stop - start - 1)
+                new_start = stop - pad
+                if stop == length:
+                    # all other subtrajectories are contained in this one
+                    new_start = length
+            elif self._accepts[before]:
+                slices.append(slice(start, stop - 1))
+                pad = min(overlap, stop - start - 2)
+                new_start = stop - pad
+            else:
+                new_start = start + 1
+
+            for position in range(start, new_start):
+                stops.pop(position, None)
+            start = new_start
+
+        return slices
+
+
+# terminal states of a single assignment run
+_RESTART = 'restart'   # a subensemble could not take its first frame
+_FAIL = 'fail'         # frames left after the last subensemble
+
+
+class SequentialAutomaton(EnsembleAutomaton):
+    """
+    Automaton deciding `__call__` and `can_append` (or `can_prepend`) of a
+    SequentialEnsemble from the volume labels of the frames.
+
+    Like `SequentialEnsemble.can_append`, the automaton tracks one
+    assignment of frames to subensembles for each subensemble the
+    trajectory could start in (ending in for the backward direction).
+    Each assignment run is in the subensemble that takes the next frame,
+    together with the state of that subensemble. The states of all runs
+    together form a state of the automaton.
+
+    Attributes
+    ----------
+    ensemble : SequentialEnsemble
+        the compiled ensemble
+    direction : +1 or -1
+        +1 to read the frames forward (`__call__`, `can_append`), -1 to
+        read them backward (`can_prepend`)
+    volumes : list of Volume
+        the volumes that make up the label of a frame
+    """
+
+    def _setup(self):
+        self._nodes = [_compile(sub, self.direction, self.volumes)
+                       for sub in self.ensemble.ensembles]
+        if self.direction < 0:
+            self._nodes.reverse()
+
+        if self.direction > 0:
+            self._passes = lambda node, state: (
+                node.value(state, 'can_t') or node.value(state, 'call_t'))
+        else:
+            self._passes = lambda node, state: (
+                node.value(state, 'can_t') or node.value(state, 'rev_t'))
+
+        # whether all subensembles from i on accept zero frames
+        empty = [node.value(node.start, 'call') for node in self._nodes]
+        self._empty = empty
+        self._empty_from = [all(empty[i:]) for i in range(len(empty) + 1)]
+
+    def _initial(self):
+        return tuple((ens_first, False, self._nodes[ens_first].start, True)
+                     for ens_first in range(len(self._nodes)))
+
+    def _next(self, runs, label):
+        return tuple(self._step_run(run, label) for run in runs)
+
+    def _verdicts(self, runs):
+        return self._run_accepts(runs[0]), self._runs_can_extend(runs)
+
+    def _step_run(self, run, label):
+        if run is _RESTART or run is _FAIL:
+            return run
+
+        ens_num, has_frames, sub, ok = run
+        last = len(self._nodes) - 1
+        while True:
+            node = self._nodes[ens_num]
+            new_sub = node.step(sub, label)
+            if self._passes(node, new_sub):
+                return (ens_num, True, new_sub, ok)
+
+            # the frame starts the next subensemble
+            if has_frames:
+                ok = ok and node.value(sub, 'call')
+            elif not self._empty[ens_num]:
+                return _RESTART
+
+            if ens_num == last:
+                return _FAIL
+
+            ens_num += 1
+            has_frames = False
+            sub = self._nodes[ens_num].start
+
+    def _run_accepts(self, run):
+        if run is _RESTART or run is _FAIL:
+            return False
+
+        ens_num, has_frames, sub, ok = run
+        if has_frames:
+            ok = ok and self._nodes[ens_num].value(sub, 'call')
+            ens_num += 1
+        return ok and self._empty_from[ens_num]
+
+    def _runs_can_extend(self, runs):
+        last = len(self._nodes) - 1
+        for run in runs:
+            if run is _RESTART:
+                # try the assignment starting with the next subensemble
+                continue
+            elif run is _FAIL:
+                return False
+
+            ens_num, has_frames, sub, ok = run
+            if has_frames and ens_num == last:
+                return self._nodes[ens_num].value(sub, 'can_t')
+            return True
+
+        return False
+
+    def accepts(self, trajectory):
+        if self.direction < 0:
+            raise RuntimeError("Only forward automata decide the ensemble")
+        return super(SequentialAutomaton, self).accepts(trajectory)
@@ -0,0 +1,367 @@
+"""
+Profiling of the evaluation of (nested) ensembles.
+"""
+
+import time
+
+import openpathsampling as paths
+from openpathsampling.ensemble import Ensemble, EnsembleCache
+
+
+def _subclasses(cls):
+    classes = [cls]
+    for subclass in cls.__subclasses__():
+        for sub in _subclasses(subclass):
+            if sub not in classes:
+                classes.append(sub)
+    return classes
+
+
+def _children(ensemble):
+    """
+    The ensembles that `ensemble` is built from, in the order of its
+    attributes
+    """
+    children = []
+    for key, value in sorted(vars(ensemble).items()):
+        if isinstance(value, Ensemble):
+            value = [value]
+        elif not isinstance(value, (list, tuple)):
+            continue
+        for child in value:
+            if isinstance(child, Ensemble) and \
+                    not any(child is c for c in children):
+                children.append(child)
+    return children
+
+
+class EnsembleProfile(object):
+    """
+    What the `EnsembleProfiler` recorded for one ensemble
+
+    Attributes
+    ----------
+    ensemble : Ensemble
+        the profiled ensemble
+    calls : dict of str : int
+        the number of calls per method
+    trusted : int
+        the number of calls with `trusted` set
+    untrusted : int
+        the number of calls without `trusted` set
+    resets : int
+        the number of resets of the ensemble's caches
+    frames : int
+        the number of frames the ensemble tested against volumes (not
+        counting its subensembles)
+    time : float
+        the cumulative wall time in seconds spent in the ensemble,
+        including its subensembles
+    self_time : float
+        the part of `time` not spent in the subensembles
+    """
+    def __init__(self, ensemble):
+        self.ensemble = ensemble
+        self.calls = {}
+        self.trusted = 0
+        self.untrusted = 0
+        self.resets = 0
+        self.frames = 0
+        self.time = 0.0
+        self.self_time = 0.0
+        # number of calls of this ensemble that are running
+        self._running = 0
+
+    @property
+    def n_calls(self):
+        """The number of calls of all methods"""
+        return sum(self.calls.values())
+
+
+class EnsembleProfiler(object):
+    """
+    Records how often and how long ensembles are evaluated.
+
+    While the profiler runs, the methods in `methods` of every Ensemble
+    class are replaced by versions that record their calls, per ensemble
+    instance. Resets of an `EnsembleCache` and the frames tested by volumes
+    are attributed to the innermost ensemble that is running. Calls of the
+    same method of the same ensemble from within that method (e.g. from
+    `super`) are counted once. Nothing is changed while no profiler runs.
+
+    Examples
+    --------
+    >>> with EnsembleProfiler() as profiler:
+    >>>     ensemble.split(trajectory)
+    >>> print profiler.report(ensemble)
+
+    Attributes
+    ----------
+    methods : list of str
+        the names of the profiled methods of the ensembles
+    profiles : dict of int : EnsembleProfile
+        the profile of each ensemble, by `id` of the ensemble
+    """
+
+    # the profiler that is running, if any
+    active = None
+
+    methods = ['__call__', 'can_append', 'can_prepend', 'check_reverse',
+               'find_valid_slices']
+
+    def __init__(self):
+        self.profiles = {}
+        # [ensemble, method, time spent in other profiled calls]
+        self._stack = []
+        # number of volume calls running
+        self._volume_depth = 0
+        # (class, name, original attribute) of the replaced methods
+        self._replaced = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """
+        Start recording
+
+        Returns
+        -------
+        EnsembleProfiler
+            self
+        """
+        if EnsembleProfiler.active is not None:
+            raise RuntimeError("Another EnsembleProfiler is running")
+        EnsembleProfiler.active = self
+
+        for cls in _subclasses(Ensemble):
+            for name in self.methods:
+                if name in cls.__dict__:
+                    self._replace(cls, name, self._ensemble_wrapper(name))
+        self._replace(EnsembleCache, 'check', self._cache_wrapper())
+        for cls in _subclasses(paths.Volume):
+            if '__call__' in cls.__dict__:
+                self._replace(cls, '__call__', self._volume_wrapper(False))
+            if 'evaluate_trajectory' in cls.__dict__:
+                self._replace(cls, 'evaluate_trajectory',
+                              self._volume_wrapper(True))
+        return self
+
+    def stop(self):
+        """
+        Stop recording and restore the original methods
+        """
+        for cls, name, original in reversed(self._replaced):
+            setattr(cls, name, original)
+        self._replaced = []
+        if EnsembleProfiler.active is self:
+            EnsembleProfiler.active = None
+
+    def reset(self):
+        """
+        Forget everything recorded so far
+        """
+        self.profiles = {}
+
+    def _replace(self, cls, name, wrapper):
+        original = cls.__dict__[name]
+        self._replaced.append((cls, name, original))
+        setattr(cls, name, wrapper(original))
+
+    def profile(self, ensemble):
+        """
+        The EnsembleProfile of an ensemble
+
+        Parameters
+        ----------
+        ensemble : Ensemble
+            the ensemble
+
+        Returns
+        -------
+        EnsembleProfile
+            what was recorded for the ensemble (empty if it was not called)
+        """
+        try:
+            return self.profiles[id(ensemble)]
+        except KeyError:
+            return EnsembleProfile(ensemble)
+
+    def _get_profile(self, ensemble):
+        try:
+            return self.profiles[id(ensemble)]
+        except KeyError:
+            profile = EnsembleProfile(ensemble)
+            self.profiles[id(ensemble)] = profile
+            return profile
+
+    def _ensemble_wrapper(self, name):
+        profiler = self
+
+        def wrapper(method):
+            def profiled(ensemble, *args, **kwargs):
+                stack = profiler._stack
+                if stack and stack[-1][0] is ensemble and stack[-1][1] == name:
+                    return method(ensemble, *args, **kwargs)
+
+                profile = profiler._get_profile(ensemble)
+                profile.calls[name] = profile.calls.get(name, 0) + 1
+                if name != 'find_valid_slices':
+                    if len(args) > 1:
+                        trusted = args[1]
+                    else:
+                        trusted = kwargs.get('trusted', None)
+                    if trusted:
+                        profile.trusted += 1
+                    else:
+                        profile.untrusted += 1
+
+                frame = [ensemble, name, 0.0]
+                stack.append(frame)
+                profile._running += 1
+                start = time.time()
+                try:
+                    return method(ensemble, *args, **kwargs)
+                finally:
+                    elapsed = time.time() - start
+                    stack.pop()
+                    profile._running -= 1
+                    if profile._running == 0:
+                        profile.time += elapsed
+                    profile.self_time += elapsed - frame[2]
+                    if stack:
+                        stack[-1][2] += elapsed
+
+            profiled.__name__ = method.__name__
+            profiled.__doc__ = method.__doc__
+            return profiled
+
+        return wrapper
+
+    def _cache_wrapper(self):
+        profiler = self
+
+        def wrapper(method):
+            def profiled(cache, *args, **kwargs):
+                reset = method(cache, *args, **kwargs)
+                if reset and profiler._stack:
+                    ensemble = profiler._stack[-1][0]
+                    profiler._get_profile(ensemble).resets += 1
+                return reset
+
+            profiled.__name__ = method.__name__
+            profiled.__doc__ = method.__doc__
+            return profiled
+
+        return wrapper
+
+    def _volume_wrapper(self, whole_trajectory):
+        profiler = self
+
+        def wrapper(method):
+            def profiled(volume, frames, *args, **kwargs):
+                # only count the outermost volume, not the ones it is made of
+                if profiler._volume_depth == 0 and profiler._stack:
+                    ensemble = profiler._stack[-1][0]
+                    if whole_trajectory:
+                        n_frames = len(frames)
+                    else:
+                        n_frames = 1
+                    profiler._get_profile(ensemble).frames += n_frames
+                profiler._volume_depth += 1
+                try:
+                    return method(volume, frames, *args, **kwargs)
+                finally:
+                    profiler._volume_depth -= 1
+
+            profiled.__name__ = method.__name__
+            profiled.__doc__ = method.__doc__
+            return profiled
+
+        return wrapper
+
+    def _roots(self):
+        """
+        The profiled ensembles that are not part of another profiled
+        ensemble, slowest first
+        """
+        inner = set()
+        for profile in self.profiles.values():
+            todo = _children(profile.ensemble)
+            while todo:
+                child = todo.pop()
+                if id(child) not in inner:
+                    inner.add(id(child))
+                    todo.extend(_children(child))
+        roots = [profile for key, profile in self.profiles.iteritems()
+                 if key not in inner]
+        return [profile.ensemble
+                for profile in sorted(roots, key=lambda p: -p.time)]
+
+    def report(self, ensemble=None):
+        """
+        The recorded profile as a tree of ensembles
+
+        The tree follows the nesting of the ensembles as in
+        `Ensemble.__str__`. Each line shows the number of calls, the
+        untrusted calls, the cache resets, the frames tested, the
+        cumulative time and the time not spent in the subensembles, followed
+        by the ensemble and its calls per method. Subensembles are indented
+        below their ensemble; ensembles that occur several times in the tree
+        are only expanded once.
+
+        Parameters
+        ----------
+        ensemble : Ensemble or None
+            the ensemble to report. If None, all profiled ensembles that are
+            not part of another profiled ensemble are reported.
+
+        Returns
+        -------
+        str
+            the report
+        """
+        if ensemble is None:
+            roots = self._roots()
+        else:
+            roots = [ensemble]
+
+        lines = ['%8s %9s %7s %9s %11s %11s  %s' % (
+            'calls', 'untrusted', 'resets', 'frames', 'time [s]',
+            'self [s]', 'ensemble'
+        )]
+        shown = set()
+        for root in roots:
+            self._report_lines(root, 0, lines, shown)
+        return '\n'.join(lines)
+
+    def _report_lines(self, ensemble, depth, lines, shown):
+        profile = self.profile(ensemble)
+        children = _children(ensemble)
+        if children:
+            label = ensemble.__class__.__name__
+            if ensemble.is_named:
+                label += " '" + ensemble.name + "'"
+        else:
+            label = ' '.join(str(ensemble).split())
+        if profile.calls:
+            label += ' [' + ', '.join(
+                '%s: %d' % (name, profile.calls[name])
+                for name in self.methods if name in profile.calls
+            ) + ']'
+        repeated = id(ensemble) in shown and children
+        if repeated:
+            label += ' (see above)'
+        shown.add(id(ensemble))
+
+        lines.append('%8d %9d %7d %9d %11.6f %11.6f  %s%s' % (
+            profile.n_calls, profile.untrusted, profile.resets,
+            profile.frames, profile.time, profile.self_time,
+            '  ' * depth, label
+        ))
+        if not repeated:
+            for child in children:
+                self._report_lines(child, depth + 1, lines, shown)
@@ -0,0 +1,174 @@
+"""
+Evaluation of one trajectory against several TIS ensembles at once.
+"""
+
+import weakref
+
+import numpy as np
+
+import openpathsampling as paths
+
+
+class EnsembleSet(object):
+    """
+    Decides whether a trajectory is in each of a set of ensembles in one
+    pass.
+
+    TIS ensembles (see `TISEnsemble`) with the same initial and final states
+    only differ in their interface. For these, the frames in the states are
+    determined once per trajectory; each interface then only needs to know
+    if the frames between the states leave it. For interfaces that are
+    `CVRangeVolume`s of the same collective variable, the collective
+    variable is evaluated once and the interfaces are compared with the
+    minimal and maximal value (max lambda).
+
+    Ensembles that are not TIS ensembles are called as usual. The results
+    are cached per trajectory, so checking the same trajectory against
+    each ensemble (e.g. in replica exchange) only scans it once.
+
+    Attributes
+    ----------
+    ensembles : list of Ensemble
+        the ensembles of the set
+    """
+
+    def __init__(self, ensembles):
+        self.ensembles = list(ensembles)
+        self._index = {id(ens): i for i, ens in enumerate(self.ensembles)}
+
+        # TIS ensembles with the same states, by (initial, final) states
+        self._tis_groups = {}
+        self._others = []
+        for i, ens in enumerate(self.ensembles):
+            if type(ens) is paths.TISEnsemble:
+                key = (tuple(id(vol) for vol in ens.initial_states),
+                       tuple(id(vol) for vol in ens.final_states))
+                self._tis_groups.setdefault(key, []).append(i)
+            else:
+                self._others.append(i)
+
+        # trajectory : (length, first frame, last frame, results)
+        self._cache = weakref.WeakKeyDictionary()
+
+    def register(self):
+        """
+        Let the TIS ensembles of the set use it for untrusted calls
+
+        Returns
+        -------
+        EnsembleSet
+            self
+        """
+        for indices in self._tis_groups.values():
+            for i in indices:
+                self.ensembles[i]._ensemble_set = self
+        return self
+
+    def __call__(self, trajectory):
+        """
+        Whether `trajectory` is in each of the ensembles
+
+        Parameters
+        ----------
+        trajectory : Trajectory
+            the trajectory to test
+
+        Returns
+        -------
+        list of bool
+            the result for each ensemble, in the order of `ensembles`
+        """
+        return list(self._results(trajectory))
+
+    def contains(self, ensemble, trajectory):
+        """
+        Whether `trajectory` is in `ensemble`, which must be in the set
+
+        Parameters
+        ----------
+        ensemble : Ensemble
+            one of the `ensembles`
+        trajectory : Trajectory
+            the trajectory to test
+
+        Returns
+        -------
+        bool
+            the same as `ensemble(trajectory)`
+        """
+        try:
+            i = self._index[id(ensemble)]
+        except KeyError:
+            raise ValueError(repr(ensemble) + " is not in the EnsembleSet")
+        return self._results(trajectory)[i]
+
+    def _results(self, trajectory):
+        n_frames = len(trajectory)
+        if n_frames > 0:
+            ends = (trajectory.get_as_proxy(0), trajectory.get_as_proxy(-1))
+        else:
+            ends = (None, None)
+
+        try:
+            cached = self._cache.get(trajectory)
+        except TypeError:
+            # trajectories that are not weakly referenceable are not cached
+            cached = None
+        if cached is not None and cached[0] == n_frames and \
+                cached[1] is ends[0] and cached[2] is ends[1]:
+            return cached[3]
+
+        results = [None] * len(self.ensembles)
+        for indices in self._tis_groups.values():
+            self._evaluate_tis(trajectory, indices, results)
+        for i in self._others:
+            results[i] = bool(self.ensembles[i](trajectory))
+
+        try:
+            self._cache[trajectory] = (n_frames, ends[0], ends[1], results)
+        except TypeError:
+            pass
+
+        return results
+
+    def _evaluate_tis(self, trajectory, indices, results):
+        # all ensembles in indices share their states; use the volumes of
+        # the first ensemble
+        ensemble = self.ensembles[indices[0]]
+        n_frames = len(trajectory)
+        hit_pattern = False
+        if n_frames >= 3:
+            volume_a = ensemble.ensembles[0].ensemble1.volume
+            volume_ab = ensemble.ensembles[2].ensemble1.volume
+            in_ab = volume_ab.evaluate_trajectory(trajectory)
+            hit_pattern = (in_ab[-1] and not np.any(in_ab[1:-1]) and
+                           volume_a(trajectory.get_as_proxy(0)))
+
+        if not hit_pattern:
+            for i in indices:
+                results[i] = False
+            return
+
+        middle = trajectory[1:n_frames - 1]
+        # (min, max) of the collective variables of CVRangeVolume interfaces
+        extrema = {}
+        for i in indices:
+            interface = self.ensembles[i].interface
+            if type(interface) is paths.CVRangeVolume:
+                cv = interface.collectivevariable
+                try:
+                    lambdas = extrema[id(cv)]
+                except KeyError:
+                    values = interface._cv_array(middle)
+                    if np.any(np.isnan(values)):
+                        # nan is outside of every interface
+                        lambdas = None
+                    else:
+                        lambdas = (values.min(), values.max())
+                    extrema[id(cv)] = lambdas
+                results[i] = bool(lambdas is None or
+                                  lambdas[0] < interface.lambda_min or
+                                  lambdas[1] > interface.lambda_max)
+            else:
+                results[i] = not np.all(
+                    interface.evaluate_trajectory(middle))
@@ -0,0 +1,256 @@
+"""
+Growable numpy buffer for the frames generated by an engine.
+"""
+
+import tempfile
+import weakref
+
+import numpy as np
+import simtk.unit as u
+
+from openpathsampling.snapshot import Snapshot, Configuration, Momentum
+
+
+class _LazyFrames(object):
+    """
+    Creates the objects for single frames of a FrameBuffer on first access.
+
+    This acts as the store in a `(store, idx)` tuple set to a lazy loading
+    attribute, so a Snapshot only builds its Configuration and Momentum if
+    they are actually used. With `weak` the objects are only kept as long
+    as they are used somewhere else.
+    """
+    def __init__(self, build, weak=False):
+        self._build = build
+        if weak:
+            self._cache = weakref.WeakValueDictionary()
+        else:
+            self._cache = dict()
+
+    def __getitem__(self, idx):
+        try:
+            return self._cache[idx]
+        except KeyError:
+            obj = self._build(idx)
+            self._cache[idx] = obj
+            return obj
+
+
+class FrameBuffer(object):
+    """
+    Coordinates, velocities and energies of consecutive frames in
+    preallocated numpy arrays.
+
+    The arrays double in size when full, so appending a frame is amortized
+    O(1) and does not create any python objects. Snapshots for the frames
+    are thin wrappers whose Configuration and Momentum are created on first
+    access, with coordinates and velocities being views into the buffer.
+
+    With `spill_to_disk` the arrays are memory-mapped temporary files, so
+    the operating system can page out frames that are not in use and very
+    long trajectories do not need to fit into memory. The Configurations
+    and Momenta are then only kept while they are referenced.
+
+    Attributes
+    ----------
+    topology : Topology
+        the topology set to the configurations
+    energies : function(coordinates, velocities) or None
+        returns the potential and kinetic energies for an array of frames.
+        It is called for all frames that have no energies yet as soon as
+        the energy of one of them is needed. If None, the energies passed
+        to `append` are used.
+    units : dict of str : simtk.unit.Unit or None
+        the units of 'length', 'velocity' and 'energy'. Quantities passed to
+        `append` are stored in these units and the coordinates, velocities
+        and energies of the snapshots are Quantities again. If None, plain
+        numbers are stored.
+    """
+
+    def __init__(self, frame_shape, topology=None, energies=None,
+                 capacity=64, dtype=np.float64, units=None,
+                 spill_to_disk=False):
+        """
+        Parameters
+        ----------
+        frame_shape : tuple of int
+            the shape of the coordinates (and velocities) of a single frame,
+            usually (n_atoms, n_spatial)
+        topology : Topology
+            the topology of the configurations
+        energies : function(coordinates, velocities) or None
+            see above
+        capacity : int
+            the number of frames to allocate initially
+        dtype : numpy.dtype
+            the type of the stored coordinates and velocities
+        units : dict of str : simtk.unit.Unit or None
+            see above
+        spill_to_disk : bool
+            if True the frames are kept in memory-mapped temporary files
+        """
+        self.topology = topology
+        self.energies = energies
+        self.units = units
+        self.frame_shape = tuple(frame_shape)
+        self.spill_to_disk = spill_to_disk
+
+        capacity = max(1, capacity)
+        self._coordinates = self._allocate((capacity,) + self.frame_shape,
+                                           dtype)
+        self._velocities = self._allocate((capacity,) + self.frame_shape,
+                                          dtype)
+        self._potential_energies = self._allocate((capacity,), np.float64)
+        self._kinetic_energies = self._allocate((capacity,), np.float64)
+        self._n_frames = 0
+        self._n_energies = 0
+
+        self.configurations = _LazyFrames(self._build_configuration,
+                                          weak=spill_to_disk)
+        self.momenta = _LazyFrames(self._build_momentum,
+                                   weak=spill_to_disk)
+
+    def _allocate(self, shape, dtype):
+        if self.spill_to_disk:
+            # the file is deleted once the last view is gone
+            return np.memmap(tempfile.TemporaryFile(), dtype=dtype,
+                             mode='w+', shape=shape)
+        return np.zeros(shape, dtype)
+
+    def __len__(self):
+        return self._n_frames
+
+    @property
+    def capacity(self):
+        return len(self._coordinates)
+
+    @property
+    def coordinates(self):
+        return self._coordinates[:self._n_frames]
+
+    @property
+    def velocities(self):
+        return self._velocities[:self._n_frames]
+
+    @property
+    def potential_energies(self):
+        self._update_energies()
+        return self._potential_energies[:self._n_frames]
+
+    @property
+    def kinetic_energies(self):
+        self._update_energies()
+        return self._kinetic_energies[:self._n_frames]
+
+    def _grow(self):
+        capacity = 2 * self.capacity
+        for name in ['_coordinates', '_velocities',
+                     '_potential_energies', '_kinetic_energies']:
+            old = getattr(self, name)
+            new = self._allocate((capacity,) + old.shape[1:], old.dtype)
+            new[:len(old)] = old
+            # views handed out before still point to the old array, which
+            # keeps its (never changing) content
+            setattr(self, name, new)
+
+    def _strip(self, value, dimension):
+        if self.units is not None and self.units.get(dimension) is not None:
+            return value.value_in_unit(self.units[dimension])
+        return value
+
+    def _dress(self, value, dimension):
+        if self.units is not None and self.units.get(dimension) is not None:
+            return u.Quantity(value, self.units[dimension])
+        return value
+
+    def append(self, coordinates, velocities, potential_energy=None,
+               kinetic_energy=None):
+        """
+        Add a frame to the buffer.
+
+        Parameters
+        ----------
+        coordinates : numpy.ndarray
+            the coordinates of the frame, of shape `frame_shape`
+        velocities : numpy.ndarray
+            the velocities of the frame, of shape `frame_shape`
+        potential_energy : float or None
+            only used if the buffer has no `energies` function
+        kinetic_energy : float or None
+            only used if the buffer has no `energies` function
+
+        Returns
+        -------
+        int
+            the index of the new frame in the buffer
+        """
+        if self._n_frames == self.capacity:
+            self._grow()
+
+        idx = self._n_frames
+        self._coordinates[idx] = self._strip(coordinates, 'length')
+        self._velocities[idx] = self._strip(velocities, 'velocity')
+
+        if self.energies is None:
+            # unknown energies are nan and turn into None again
+            for energies, energy in [
+                    (self._potential_energies, potential_energy),
+                    (self._kinetic_energies, kinetic_energy)]:
+                if energy is None:
+                    energies[idx] = np.nan
+                else:
+                    energies[idx] = self._strip(energy, 'energy')
+
+        if np.any(np.isnan(self._coordinates[idx])):
+            raise ValueError(
+                "Some coordinates became 'nan'; simulation is unstable or buggy.")
+
+        self._n_frames += 1
+        return idx
+
+    def _update_energies(self):
+        if self.energies is None or self._n_energies == self._n_frames:
+            return
+
+        new = slice(self._n_energies, self._n_frames)
+        potential, kinetic = self.energies(self._coordinates[new],
+                                           self._velocities[new])
+        self._potential_energies[new] = potential
+        self._kinetic_energies[new] = kinetic
+        self._n_energies = self._n_frames
+
+    def _energy(self, energies, idx):
+        self._update_energies()
+        energy = energies[idx]
+        if self.energies is None and np.isnan(energy):
+            return None
+        return self._dress(energy, 'energy')
+
+    def _build_configuration(self, idx):
+        configuration = Configuration(topology=self.topology)
+        configuration.coordinates = self._dress(self._coordinates[idx],
+                                                'length')
+        configuration.potential_energy = self._energy(
+            self._potential_energies, idx)
+        return configuration
+
+    def _build_momentum(self, idx):
+        momentum = Momentum()
+        momentum.velocities = self._dress(self._velocities[idx], 'velocity')
+        momentum.kinetic_energy = self._energy(self._kinetic_energies, idx)
+        return momentum
+
+    def snapshot(self, idx):
+        """
+        A Snapshot of frame `idx`; configuration and momentum are only
+        created when they are accessed.
+        """
+        if idx < 0:
+            idx += self._n_frames
+        if not 0 <= idx < self._n_frames:
+            raise IndexError('Frame %d is not in the buffer' % idx)
+
+        return Snapshot(
+            configuration=(self.configurations, idx),
+            momentum=(self.momenta, idx)
+        )
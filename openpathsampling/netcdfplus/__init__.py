@@ -3,4 +3,5 @@ from base import StorableNamedObject, StorableObject
 from proxy import DelayedLoader, lazy_loading_attributes, LoaderProxy
 from cache import WeakKeyCache, WeakLRUCache, WeakValueCache, MaxCache, NoCache, Cache, LRUCache
 from dictify import ObjectJSON, StorableObjectJSON
-from objects import ObjectStore
\ No newline at end of file
+from objects import ObjectStore
+from writer import AsyncWriter
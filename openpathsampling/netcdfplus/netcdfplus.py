@@ -7,10 +7,12 @@ init_log = logging.getLogger('openpathsampling.initialization')
 
 from dictify import StorableObjectJSON
 from proxy import LoaderProxy
+from writer import AsyncWriter
 
 import numpy as np
 import netCDF4
 import os.path
+import threading
 
 
 # =============================================================================================
@@ -64,13 +66,20 @@ class NetCDFPlus(netCDF4.Dataset):
             the function applied to the value to be stored using __setitem__ on the variable
         store : openpathsampling.storage.ObjectStore
             a reference to an object store used for convenience in some cases
+        lock : threading.RLock
+            the lock of the storage, held while the variable is accessed
 
         """
 
-        def __init__(self, variable, getter=None, setter=None, store=None):
+        def __init__(self, variable, getter=None, setter=None, store=None,
+                     lock=None):
             self.variable = variable
             self.store = store
 
+            if lock is None:
+                lock = threading.RLock()
+            self.lock = lock
+
             if setter is None:
                 setter = lambda v: v
             self.setter = setter
@@ -80,10 +89,14 @@ class NetCDFPlus(netCDF4.Dataset):
             self.getter = getter
 
         def __setitem__(self, key, value):
-            self.variable[key] = self.setter(value)
+            value = self.setter(value)
+            with self.lock:
+                self.variable[key] = value
 
         def __getitem__(self, key):
-            return self.getter(self.variable[key])
+            with self.lock:
+                value = self.variable[key]
+            return self.getter(value)
 
         def __getattr__(self, item):
             return getattr(self.variable, item)
@@ -121,20 +134,26 @@ class NetCDFPlus(netCDF4.Dataset):
                 idxs = [item if type(item) is int else self.store.index[item] for item in key]
                 sorted_idxs = list(set(idxs))
                 sorted_values = [value[idxs.index(val)] for val in sorted_idxs]
-                self.variable[sorted_idxs] = sorted_values
+                with self.store.storage.lock:
+                    self.variable[sorted_idxs] = sorted_values
 
             else:
-                self.variable[key if type(key) is int else self.store.index[key]] = value
+                idx = key if type(key) is int else self.store.index[key]
+                with self.store.storage.lock:
+                    self.variable[idx] = value
 
         def __getitem__(self, key):
             if hasattr(key, '__iter__'):
                 idxs = [item if type(item) is int else self.store.index[item] for item in key]
                 sorted_idxs = sorted(list(set(idxs)))
 
-                sorted_values = self.variable[sorted_idxs]
+                with self.store.storage.lock:
+                    sorted_values = self.variable[sorted_idxs]
                 return [sorted_values[sorted_idxs.index(idx)] for idx in idxs]
             else:
-                return self.variable[key if type(key) is int else self.store.index[key]]
+                idx = key if type(key) is int else self.store.index[key]
+                with self.store.storage.lock:
+                    return self.variable[idx]
 
     @property
     def objects(self):
@@ -261,6 +280,83 @@ class NetCDFPlus(netCDF4.Dataset):
 
         self.dimension_units = dict()
 
+        # serializes the access to the file with the writer thread
+        self.lock = threading.RLock()
+        self.writer = None
+
+    def start_writer(self, max_queue_size=16):
+        """
+        Write synced values in a dedicated thread
+
+        Afterwards `sync` of the storage and of the stored CVs only queue
+        their writes for a single writer thread, which runs them in order.
+        Use `flush` to wait until everything is written. `close` flushes and
+        stops the writer.
+
+        Parameters
+        ----------
+        max_queue_size : int
+            the maximal number of queued writes. Syncing blocks while the
+            queue is full.
+
+        Returns
+        -------
+        AsyncWriter
+            the writer of this storage
+
+        Notes
+        -----
+        netCDF4 releases the GIL during its calls into the library, so
+        every access to the file holds `lock`: the writer holds it while a
+        task runs, and the stores, the variable delegates and the
+        `VerdictCache` take it around each read and write in the calling
+        thread. Code that accesses `variables` directly while a writer runs
+        has to do the same.
+        """
+        if self.writer is None:
+            self.writer = AsyncWriter(self.lock, max_queue_size)
+
+        return self.writer
+
+    def stop_writer(self):
+        """
+        Run all queued writes and go back to writing in the calling thread
+        """
+        writer = self.writer
+        if writer is not None:
+            self.writer = None
+            writer.close()
+
+    def flush(self):
+        """
+        Wait until all writes queued for the writer thread are done
+        """
+        if self.writer is not None:
+            self.writer.flush()
+
+    def _sync_file(self):
+        with self.lock:
+            super(NetCDFPlus, self).sync()
+
+    def sync(self):
+        """
+        Write the buffered data to disk
+
+        If a writer thread is running, this happens in the writer after all
+        writes that are queued so far.
+        """
+        if self.writer is not None:
+            self.writer.put(self._sync_file)
+        else:
+            self._sync_file()
+
+    def close(self):
+        """
+        Flush all queued writes and close the file
+        """
+        self.stop_writer()
+        super(NetCDFPlus, self).close()
+
     def add(self, name, store, register_attr=True):
         """
         Add a object store to the file
@@ -460,7 +556,8 @@ class NetCDFPlus(netCDF4.Dataset):
             store = self._storages[obj.base_cls]
 
             if store.json:
-                return store.variables['json'][store.idx(obj)]
+                with self.lock:
+                    return store.variables['json'][store.idx(obj)]
 
         return None
 
@@ -484,30 +581,31 @@ class NetCDFPlus(netCDF4.Dataset):
 
         copied_storages = 0
 
-        for variable in self.variables.keys():
-            if variable.startswith(storage_name + '_'):
-                copied_storages += 1
-                if variable not in new_storage.variables:
-                    # collectivevariables have additional variables in the storage that need to be copied
-                    # TODO: copy chunksizes?
-                    var = self.variables[variable]
-                    new_storage.createVariable(
-                        variable,
-                        str(var.dtype),
-                        var.dimensions,
-                        chunksizes=var.chunk
-                    )
-                    for attr in self.variables[variable].ncattrs():
-                        setattr(
-                            new_storage.variables[variable],
-                            attr,
-                            getattr(self.variables[variable], attr)
+        with self.lock, new_storage.lock:
+            for variable in self.variables.keys():
+                if variable.startswith(storage_name + '_'):
+                    copied_storages += 1
+                    if variable not in new_storage.variables:
+                        # collectivevariables have additional variables in the storage that need to be copied
+                        # TODO: copy chunksizes?
+                        var = self.variables[variable]
+                        new_storage.createVariable(
+                            variable,
+                            str(var.dtype),
+                            var.dimensions,
+                            chunksizes=var.chunk
                         )
-
-                    new_storage.variables[variable][:] = self.variables[variable][:]
-                else:
-                    for idx in range(0, len(self.variables[variable])):
-                        new_storage.variables[variable][idx] = self.variables[variable][idx]
+                        for attr in self.variables[variable].ncattrs():
+                            setattr(
+                                new_storage.variables[variable],
+                                attr,
+                                getattr(self.variables[variable], attr)
+                            )
+
+                        new_storage.variables[variable][:] = self.variables[variable][:]
+                    else:
+                        for idx in range(0, len(self.variables[variable])):
+                            new_storage.variables[variable][idx] = self.variables[variable][idx]
 
         if copied_storages == 0:
             raise RuntimeWarning(
@@ -529,8 +627,9 @@ class NetCDFPlus(netCDF4.Dataset):
             an infinite dimension that extends when more objects are stored
 
         """
-        if dim_name not in self.dimensions:
-            self.createDimension(dim_name, size)
+        with self.lock:
+            if dim_name not in self.dimensions:
+                self.createDimension(dim_name, size)
 
     def cache_image(self):
         """
@@ -751,7 +850,8 @@ class NetCDFPlus(netCDF4.Dataset):
                     else:
                         getter = _get2(lambda v: v)
 
-            self.vars[var_name] = NetCDFPlus.ValueDelegate(var, getter, setter, store)
+            self.vars[var_name] = NetCDFPlus.ValueDelegate(
+                var, getter, setter, store, self.lock)
 
         else:
             raise ValueError("Variable '%s' is already taken!")
@@ -827,64 +927,65 @@ class NetCDFPlus(netCDF4.Dataset):
 
         nc_type = NetCDFPlus.var_type_to_nc_type(var_type)
 
-        for dim_name, size in new_dimensions.items():
-            ncfile.create_dimension(dim_name, size)
+        with self.lock:
+            for dim_name, size in new_dimensions.items():
+                ncfile.create_dimension(dim_name, size)
 
-        dimensions = tuple(dimensions)
+            dimensions = tuple(dimensions)
 
-        if variable_length:
-            vlen_t = ncfile.createVLType(nc_type, var_name + '_vlen')
-            ncvar = ncfile.createVariable(var_name, vlen_t, dimensions,
-                                          zlib=False, chunksizes=chunksizes)
-        else:
-            ncvar = ncfile.createVariable(var_name, nc_type, dimensions,
-                                          zlib=False, chunksizes=chunksizes)
-
-        setattr(ncvar, 'var_type', var_type)
-
-        if self.support_simtk_unit and simtk_unit is not None:
-
-            import simtk.unit as u
-
-            if isinstance(simtk_unit, u.Unit):
-                unit_instance = simtk_unit
-                symbol = unit_instance.get_symbol()
-            elif isinstance(simtk_unit, u.BaseUnit):
-                unit_instance = u.Unit({simtk_unit: 1.0})
-                symbol = unit_instance.get_symbol()
-            elif type(simtk_unit) is str and hasattr(u, simtk_unit):
-                unit_instance = getattr(u, simtk_unit)
-                symbol = unit_instance.get_symbol()
-            elif type(simtk_unit) is str and simtk_unit in self.dimension_units:
-                unit_instance = self.dimension_units[simtk_unit]
-                symbol = unit_instance.get_symbol()
+            if variable_length:
+                vlen_t = ncfile.createVLType(nc_type, var_name + '_vlen')
+                ncvar = ncfile.createVariable(var_name, vlen_t, dimensions,
+                                              zlib=False, chunksizes=chunksizes)
             else:
-                raise NotImplementedError('Unit by abbreviated string representation is not yet supported')
+                ncvar = ncfile.createVariable(var_name, nc_type, dimensions,
+                                              zlib=False, chunksizes=chunksizes)
+
+            setattr(ncvar, 'var_type', var_type)
+
+            if self.support_simtk_unit and simtk_unit is not None:
+
+                import simtk.unit as u
+
+                if isinstance(simtk_unit, u.Unit):
+                    unit_instance = simtk_unit
+                    symbol = unit_instance.get_symbol()
+                elif isinstance(simtk_unit, u.BaseUnit):
+                    unit_instance = u.Unit({simtk_unit: 1.0})
+                    symbol = unit_instance.get_symbol()
+                elif type(simtk_unit) is str and hasattr(u, simtk_unit):
+                    unit_instance = getattr(u, simtk_unit)
+                    symbol = unit_instance.get_symbol()
+                elif type(simtk_unit) is str and simtk_unit in self.dimension_units:
+                    unit_instance = self.dimension_units[simtk_unit]
+                    symbol = unit_instance.get_symbol()
+                else:
+                    raise NotImplementedError('Unit by abbreviated string representation is not yet supported')
 
-            json_unit = self.simplifier.unit_to_json(unit_instance)
+                json_unit = self.simplifier.unit_to_json(unit_instance)
 
-            # store the unit in the dict inside the Storage object
-            self.units[var_name] = unit_instance
+                # store the unit in the dict inside the Storage object
+                self.units[var_name] = unit_instance
 
-            # Define units for a float variable
-            setattr(ncvar, 'unit_simtk', json_unit)
-            setattr(ncvar, 'unit', symbol)
+                # Define units for a float variable
+                setattr(ncvar, 'unit_simtk', json_unit)
+                setattr(ncvar, 'unit', symbol)
 
-        if maskable:
-            setattr(ncvar, 'maskable', 'True')
+            if maskable:
+                setattr(ncvar, 'maskable', 'True')
 
-        if description is not None:
-            if type(dimensions) is str:
-                dim_names = [dimensions]
-            else:
-                dim_names = map(lambda p: '#ix{0}:{1}'.format(*p), enumerate(dimensions))
+            if description is not None:
+                if type(dimensions) is str:
+                    dim_names = [dimensions]
+                else:
+                    dim_names = map(lambda p: '#ix{0}:{1}'.format(*p), enumerate(dimensions))
 
-            idx_desc = '[' + ']['.join(dim_names) + ']'
-            description = var_name + idx_desc + ' is ' + description.format(idx=dim_names[0],
-                                                                            ix=dim_names)
+                idx_desc = '[' + ']['.join(dim_names) + ']'
+                description = var_name + idx_desc + ' is ' + description.format(idx=dim_names[0],
+                                                                                ix=dim_names)
 
-            # Define long (human-readable) names for variables.
-            setattr(ncvar, "long_str", description)
+                # Define long (human-readable) names for variables.
+                setattr(ncvar, "long_str", description)
 
         return ncvar
 
@@ -894,6 +995,7 @@ class NetCDFPlus(netCDF4.Dataset):
 
         Should be called after new variables have been created or loaded.
         """
-        for name in self.variables:
-            if name not in self.vars:
-                self.create_variable_delegate(name)
+        with self.lock:
+            for name in self.variables:
+                if name not in self.vars:
+                    self.create_variable_delegate(name)
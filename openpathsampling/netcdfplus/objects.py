@@ -187,7 +187,10 @@ class ObjectStore(object):
         """
         if self.has_name:
             if not self._names_loaded:
-                for idx, name in enumerate(self.storage.variables[self.prefix + "_name"][:]):
+                with self.storage.lock:
+                    names = self.storage.variables[self.prefix + "_name"][:]
+
+                for idx, name in enumerate(names):
                     self._update_name_in_cache(name, idx)
 
                 self._names_loaded = True
@@ -292,7 +295,8 @@ class ObjectStore(object):
         -----
         Equal to `store.count()`
         """
-        return len(self.storage.dimensions[self.prefix])
+        with self.storage.lock:
+            return len(self.storage.dimensions[self.prefix])
 
     def iterator(this, iter_range=None):
         """
@@ -401,7 +405,8 @@ class ObjectStore(object):
         """
         if not self._cached_all:
             idxs = range(len(self))
-            jsons = self.variables['json'][:]
+            with self.storage.lock:
+                jsons = self.variables['json'][:]
 
             [self.add_single_to_cache(i, j) for i, j in zip(
                 idxs,
@@ -423,7 +428,8 @@ class ObjectStore(object):
             self.cache[idx] = obj
 
             if self.has_name:
-                name = self.storage.variables[self.prefix + '_name'][idx]
+                with self.storage.lock:
+                    name = self.storage.variables[self.prefix + '_name'][idx]
                 setattr(obj, '_name', name)
                 if name != '':
                     self._update_name_in_cache(obj._name, idx)
@@ -493,7 +499,8 @@ class ObjectStore(object):
             units used in the storage
         """
         # define dimensions used for the specific object
-        self.storage.createDimension(self.prefix, 0)
+        with self.storage.lock:
+            self.storage.createDimension(self.prefix, 0)
 
         if self.has_name:
             self.init_variable("name", 'str',
@@ -676,8 +683,9 @@ class ObjectStore(object):
         self.index[obj] = n_idx
 
         if self.has_name and hasattr(obj, '_name'):
-            setattr(obj, '_name',
-                    self.storage.variables[self.prefix + '_name'][idx])
+            with self.storage.lock:
+                name = self.storage.variables[self.prefix + '_name'][idx]
+            setattr(obj, '_name', name)
             # make sure that you cannot change the name of loaded objects
             obj.fix_name()
 
@@ -742,7 +750,8 @@ class ObjectStore(object):
 
             obj.fix_name()
 
-            self.storage.variables[self.prefix + '_name'][idx] = obj._name
+            with self.storage.lock:
+                self.storage.variables[self.prefix + '_name'][idx] = obj._name
 
         # store the name in the cache
         if hasattr(self, 'cache'):
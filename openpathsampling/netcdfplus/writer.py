@@ -0,0 +1,107 @@
+"""
+Writes to a storage in a dedicated thread.
+"""
+
+import logging
+import Queue
+import threading
+import traceback
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncWriter(object):
+    """
+    Runs write tasks for a storage in a dedicated thread
+
+    Tasks run one at a time in the order they were put, each while holding
+    the lock of the storage. Other threads take the same lock around their
+    own accesses to the file, so these never overlap with a task. The
+    queue is bounded: `put` blocks while `max_queue_size` tasks are
+    waiting, which limits the memory held by unwritten values.
+
+    If a task fails, the traceback is kept and the next call of `put`,
+    `flush` or `close` raises a RuntimeError with it. The failed task and
+    the tasks queued after it are dropped.
+
+    Attributes
+    ----------
+    lock : threading.RLock
+        the lock held while a task runs
+    max_queue_size : int
+        the maximal number of waiting tasks
+    """
+
+    def __init__(self, lock, max_queue_size=16):
+        self.lock = lock
+        self.max_queue_size = max_queue_size
+        self._queue = Queue.Queue(max_queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='AsyncWriter')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None:
+                    break
+
+                fnc, args = task
+                if self._error is None:
+                    with self.lock:
+                        fnc(*args)
+            except Exception:
+                self._error = traceback.format_exc()
+                logger.error("Write task failed:\n%s", self._error)
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise RuntimeError('Writer failed to write to storage:\n%s' % error)
+
+    @property
+    def running(self):
+        """True until the writer is closed"""
+        return self._thread.is_alive()
+
+    @property
+    def n_pending(self):
+        """The number of tasks waiting to run"""
+        return self._queue.qsize()
+
+    def put(self, fnc, *args):
+        """
+        Queue `fnc(*args)` to run in the writer thread
+
+        Parameters
+        ----------
+        fnc : callable
+            the write task. The arguments must not be changed afterwards
+        """
+        self._raise_error()
+        if not self.running:
+            raise RuntimeError('Writer is closed')
+
+        self._queue.put((fnc, args))
+
+    def flush(self):
+        """
+        Wait until all queued tasks have run
+        """
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        """
+        Run all queued tasks and stop the writer thread
+        """
+        if self.running:
+            self._queue.put(None)
+            self._thread.join()
+
+        self._raise_error()
@@ -1,9 +1,35 @@
+import time
+
 import numpy as np
 import simtk.unit as u
 from simtk.openmm.app import Simulation
 import simtk.openmm
 
 import openpathsampling as paths
+from openpathsampling.engine_timing import GenerationTiming
+
+
+class _LazyMomentum(object):
+    """
+    The momentum of a frame generated with `lazy_state`
+
+    This acts as the store in the `(store, idx)` tuple set to the momentum
+    of the snapshot, so the velocities are fetched from the context on first
+    access and are then kept as long as the snapshot (or its reversed copy)
+    exists.
+    """
+    def __init__(self, engine, frame_id):
+        self.engine = engine
+        self.frame_id = frame_id
+        self.momentum = None
+
+    def __getitem__(self, idx):
+        if self.momentum is None:
+            self.momentum = self.engine._load_lazy_momentum(self.frame_id)
+            # the engine is not needed anymore
+            self.engine = None
+
+        return self.momentum
 
 
 class OpenMMEngine(paths.DynamicsEngine):
@@ -22,7 +48,8 @@ class OpenMMEngine(paths.DynamicsEngine):
     _default_options = {
         'nsteps_per_frame': 10,
         'n_frames_max': 5000,
-        'platform': 'fastest'
+        'platform': 'fastest',
+        'lazy_state': False
     }
 
     #TODO: Planned to move topology to be part of engine and not snapshot
@@ -44,6 +71,10 @@ class OpenMMEngine(paths.DynamicsEngine):
                 trajectory object
                 `platform` : str, default: `fastest`, the openmm specification for the platform to be used, also 'fastest' is allowed
                 which will pick the currently fastest one available
+                'lazy_state' : bool, default: False, if True only the positions (and box vectors) are fetched from the
+                context for each generated frame. Velocities and energies are fetched when they are first accessed,
+                which is only possible as long as the frame is the current state of the context. Afterwards,
+                accessing them raises a RuntimeError. This cannot be combined with a `check_stride` larger than 1
 
         Notes
         -----
@@ -53,6 +84,14 @@ class OpenMMEngine(paths.DynamicsEngine):
         currently fastest one (usually `OpenCL` or `CUDA` for GPU and `CPU` otherwise). If you load this engine it will
         assume the same engine and not the currently fastest one, so you might have to create a replacement that uses
         another engine.
+        With `lazy_state` the momentum of a generated frame is only available if it has been accessed before the next
+        frame was generated. The last frame of a trajectory (the end frame) is completed when the trajectory is
+        finished. For all other frames the momentum raises a RuntimeError and the potential energy is None, so these
+        frames can neither be saved in a storage nor be used as shooting points with their original velocities, and
+        CVs that depend on velocities can only be evaluated while the frame is the current state. Use this mode only
+        for trajectories of which the end frames are kept, e.g. committor shots. A strided check of the continue
+        conditions can cut the trajectory back to a frame whose velocities are already lost, so `generate` raises a
+        ValueError if `check_stride` is larger than 1.
         """
 
         self.system = system
@@ -84,6 +123,11 @@ class OpenMMEngine(paths.DynamicsEngine):
         self._current_configuration = None
         self._current_box_vectors = None
 
+        # frames generated with `lazy_state`; the id changes whenever the
+        # state of the context changes
+        self._frame_id = 0
+        self._lazy_configuration = None
+
         self._simulation = None
 
     def from_new_options(self, integrator=None, options=None):
@@ -191,6 +235,36 @@ class OpenMMEngine(paths.DynamicsEngine):
                         topology = self.topology
                        )
 
+    def _build_lazy_snapshot(self):
+        state = self.simulation.context.getState(getPositions=True)
+
+        configuration = paths.Configuration(
+            coordinates=state.getPositions(asNumpy=True),
+            box_vectors=state.getPeriodicBoxVectors(asNumpy=True),
+            topology=self.topology
+        )
+
+        self._lazy_configuration = configuration
+        return paths.Snapshot(
+            configuration=configuration,
+            momentum=(_LazyMomentum(self, self._frame_id), 0)
+        )
+
+    def _load_lazy_momentum(self, frame_id):
+        if frame_id != self._frame_id:
+            raise RuntimeError(
+                'The velocities of a frame generated with lazy_state are '
+                'only available while it is the current state of the context')
+
+        state = self.simulation.context.getState(getVelocities=True,
+                                                 getEnergy=True)
+
+        self._lazy_configuration.potential_energy = state.getPotentialEnergy()
+        return paths.Momentum(
+            velocities=state.getVelocities(asNumpy=True),
+            kinetic_energy=state.getKineticEnergy()
+        )
+
     @property
     def current_snapshot(self):
         if self._current_snapshot is None:
@@ -200,26 +274,62 @@ class OpenMMEngine(paths.DynamicsEngine):
 
     def _changed(self):
         self._current_snapshot = None
+        self._frame_id += 1
 
     @current_snapshot.setter
     def current_snapshot(self, snapshot):
         if snapshot is not self._current_snapshot:
+            current = self._current_snapshot
+
+            # both momenta are read before the context changes. This raises
+            # for frames of `lazy_state` whose velocities are lost
+            momentum = snapshot.momentum
+            if momentum is not None and current is not None:
+                current_momentum = current.momentum
+            else:
+                current_momentum = None
+
             if snapshot.configuration is not None:
-                if self._current_snapshot is None or snapshot.configuration is not self._current_snapshot.configuration:
+                if current is None or snapshot.configuration is not current.configuration:
                     # new snapshot has a different configuration so update
                     self.simulation.context.setPositions(snapshot.coordinates)
+                    self._frame_id += 1
 
-            if snapshot.momentum is not None:
-                if self._current_snapshot is None or snapshot.momentum is not self._current_snapshot.momentum or snapshot.is_reversed != self._current_snapshot.is_reversed:
+            if momentum is not None:
+                if current is None or momentum is not current_momentum or snapshot.is_reversed != current.is_reversed:
                     self.simulation.context.setVelocities(snapshot.velocities)
+                    self._frame_id += 1
 
             # After the updates cache the new snapshot
             self._current_snapshot = snapshot
 
     def generate_next_frame(self):
         self.simulation.step(self.nsteps_per_frame)
-        self._current_snapshot = None
-        return self.current_snapshot
+        start_time = time.time()
+        self._changed()
+        if self.options['lazy_state']:
+            self._current_snapshot = self._build_lazy_snapshot()
+        snapshot = self.current_snapshot
+        GenerationTiming.add_current('snapshots', time.time() - start_time)
+        return snapshot
+
+    def start(self, snapshot=None):
+        check_stride = self.options.get('check_stride', 1)
+        if self.options['lazy_state'] and check_stride is not None and \
+                check_stride > 1:
+            raise ValueError(
+                'lazy_state cannot be used with a check_stride larger than 1')
+
+        super(OpenMMEngine, self).start(snapshot)
+
+    def stop(self, trajectory):
+        if self.options['lazy_state'] and len(trajectory) > 0:
+            # fetch velocities and energies of the end frame while they
+            # are still in the context. This is the last frame of a forward
+            # and the first one of a backward trajectory; the other end is
+            # the initial snapshot, which is complete anyway
+            trajectory[0].momentum
+            trajectory[-1].momentum
 
     @property
     def momentum(self):
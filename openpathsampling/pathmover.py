@@ -353,7 +353,7 @@ class SampleMover(PathMover):
         super(SampleMover, self).__init__()
 
     @classmethod
-    def metropolis(cls, trials):
+    def metropolis(cls, trials, random_value=None):
         """Implements the Metropolis acceptance for a list of trial samples
 
         The Metropolis uses the .bias for each sample and checks of samples
@@ -365,6 +365,11 @@ class SampleMover(PathMover):
         ----------
         trials : list of openpathsampling.Sample
             the list of all samples to be applied in a change.
+        random_value : float or None
+            the random number to compare against. If None (default) a new
+            one is drawn. Movers that already used the random number
+            before generating the trials (see `EngineMover.prerejection`)
+            need to pass it here.
 
         Returns
         -------
@@ -388,7 +393,7 @@ class SampleMover(PathMover):
         # TODO: This isn't right. `bias` should be associated with the 
         # change; not with each individual sample. ~~~DWHS
         for ens, sample in trial_dict.iteritems():
-            valid = ens(sample.trajectory)
+            valid = paths.ensemble_verdict(ens, sample.trajectory)
             if not valid:
                 # one sample not valid reject
                 accepted = False
@@ -397,7 +402,10 @@ class SampleMover(PathMover):
             else:
                 probability *= sample.bias
 
-        rand = random.random()
+        if random_value is None:
+            rand = random.random()
+        else:
+            rand = random_value
 
         if rand > probability:
             # rejected
@@ -438,10 +446,14 @@ class SampleMover(PathMover):
         # 3. pass these samples to the generator
         trials = self(*samples)
 
-        # 4. accept/reject
+        # 4. accept/reject and return a PMC
+        return self._change_from_trials(trials)
+
+    def _change_from_trials(self, trials):
+        """Decide acceptance of the trials and create the PathMoveChange
+        """
         accepted, details = self._accept(trials)
 
-        # 5. and return a PMC
         if accepted:
             return paths.AcceptedSamplePathMoveChange(
                 samples=trials,
@@ -483,15 +495,26 @@ class SampleMover(PathMover):
 
 class EngineMover(SampleMover):
     """Baseclass for Movers that use an engine
+
+    Attributes
+    ----------
+    prerejection : bool
+        if True the Metropolis random number is drawn before the dynamics
+        is run. For selectors where the acceptance only depends on the
+        trajectory lengths (e.g. the UniformSelector) this gives the
+        maximal length a trial can have and still be accepted, so the
+        engine is stopped as soon as the trial is longer than that.
     """
 
     engine = None
 
-    def __init__(self, ensemble, target_ensemble, selector):
+    def __init__(self, ensemble, target_ensemble, selector,
+                 prerejection=False):
         super(EngineMover, self).__init__()
         self.selector = selector
         self.ensemble = ensemble
         self.target_ensemble = target_ensemble
+        self.prerejection = prerejection
 
     def _called_ensembles(self):
         return [self.ensemble]
@@ -504,12 +527,35 @@ class EngineMover(SampleMover):
 
     def __call__(self, input_sample):
         initial_trajectory = input_sample.trajectory
-        replica = input_sample.replica
 
         shooting_index = self.selector.pick(initial_trajectory)
 
-        trial_trajectory = self._run(initial_trajectory, shooting_index)
+        random_value = None
+        max_length = None
+        if self.prerejection:
+            random_value = random.random()
+            max_length = self.selector.max_length(initial_trajectory,
+                                                  random_value)
+
+        trial_trajectory = self._run(initial_trajectory, shooting_index,
+                                     max_length)
 
+        trials = self._build_trials(input_sample, shooting_index,
+                                    trial_trajectory, random_value,
+                                    max_length)
+
+        # only set if the engine records timings (option `timing`)
+        timing = self.engine.last_timing
+        if timing is not None:
+            trials[0].details.generation_timing = timing
+
+        return trials
+
+    def _build_trials(self, input_sample, shooting_index, trial_trajectory,
+                      random_value=None, max_length=None):
+        """Create the trial samples from a generated trial trajectory"""
+        initial_trajectory = input_sample.trajectory
+        replica = input_sample.replica
 
         bias = self.selector.probability_ratio(
             initial_trajectory[shooting_index],
@@ -528,6 +574,16 @@ class EngineMover(SampleMover):
             shooting_snapshot=initial_trajectory[shooting_index]
         )
 
+        if random_value is not None:
+            # the trial was generated knowing the Metropolis random number.
+            # A trial longer than max_length was stopped early and is
+            # rejected by the Metropolis step.
+            trial_details.random_value = random_value
+            trial_details.max_length = max_length
+            trial_details.prerejected = (
+                max_length is not None and len(trial_trajectory) > max_length
+            )
+
         trial = paths.Sample(
             replica=replica,
             trajectory=trial_trajectory,
@@ -542,28 +598,104 @@ class EngineMover(SampleMover):
 
         return trials
 
-    def _make_forward_trajectory(self, trajectory, shooting_index):
+    def _accept(self, trials):
+        # use the random number the trials were generated with, if any
+        random_value = getattr(trials[0].details, 'random_value', None)
+        return self.metropolis(trials, random_value)
+
+    def _forward_request(self, trajectory, shooting_index):
+        """Initial snapshot and continue conditions of a forward shot"""
         initial_snapshot = trajectory[shooting_index]#.copy()
         run_f = paths.PrefixTrajectoryEnsemble(self.target_ensemble, 
                                                trajectory[0:shooting_index]
                                               ).can_append
-        partial_trajectory = self.engine.generate(initial_snapshot, 
-                                                  running=[run_f])
+        return initial_snapshot, [run_f]
+
+    def _forward_trial(self, trajectory, shooting_index, partial_trajectory):
+        """Trial trajectory from the result of a forward shot"""
         trial_trajectory = (trajectory[0:shooting_index] 
                             + partial_trajectory)
         return trial_trajectory
 
-    def _make_backward_trajectory(self, trajectory, shooting_index):
+    def _backward_request(self, trajectory, shooting_index):
+        """Initial snapshot and continue conditions of a backward shot"""
         initial_snapshot = trajectory[shooting_index].reversed#_copy()
         run_f = paths.SuffixTrajectoryEnsemble(self.target_ensemble,
                                                trajectory[shooting_index + 1:]
                                               ).can_prepend
-        partial_trajectory = self.engine.generate(initial_snapshot, 
-                                                  running=[run_f])
+        return initial_snapshot, [run_f]
+
+    def _backward_trial(self, trajectory, shooting_index, partial_trajectory):
+        """Trial trajectory from the result of a backward shot"""
         trial_trajectory = (partial_trajectory.reversed +
                             trajectory[shooting_index + 1:])
         return trial_trajectory
 
+    def _n_frames_max(self, trajectory, shooting_index, max_length):
+        """Maximal length of the partial trajectory of a prerejected shot
+
+        One frame more than `max_length` is enough to reject the trial.
+        """
+        if max_length is None:
+            return None
+
+        if self.direction == "forward":
+            return max_length + 1 - shooting_index
+        elif self.direction == "backward":
+            return max_length + 1 - (len(trajectory) - shooting_index - 1)
+        else:
+            raise RuntimeError("Unknown direction: " + str(self.direction))
+
+    def _make_forward_trajectory(self, trajectory, shooting_index,
+                                 max_length=None):
+        initial_snapshot, running = self._forward_request(trajectory,
+                                                          shooting_index)
+        n_frames_max = self._n_frames_max(trajectory, shooting_index,
+                                          max_length)
+        partial_trajectory = self.engine.generate(initial_snapshot, 
+                                                  running=running,
+                                                  n_frames_max=n_frames_max)
+        return self._forward_trial(trajectory, shooting_index,
+                                   partial_trajectory)
+
+    def _make_backward_trajectory(self, trajectory, shooting_index,
+                                  max_length=None):
+        initial_snapshot, running = self._backward_request(trajectory,
+                                                           shooting_index)
+        n_frames_max = self._n_frames_max(trajectory, shooting_index,
+                                          max_length)
+        partial_trajectory = self.engine.generate(initial_snapshot, 
+                                                  running=running,
+                                                  n_frames_max=n_frames_max)
+        return self._backward_trial(trajectory, shooting_index,
+                                    partial_trajectory)
+
+    def _shooting_request(self, trajectory, shooting_index):
+        """Initial snapshot and continue conditions for the engine
+
+        Together with `_trial_from_partial` this splits `_run` so that the
+        dynamics of several movers can be generated in one batch (see
+        `ConcurrentEngineMover`).
+        """
+        if self.direction == "forward":
+            return self._forward_request(trajectory, shooting_index)
+        elif self.direction == "backward":
+            return self._backward_request(trajectory, shooting_index)
+        else:
+            raise RuntimeError("Unknown direction: " + str(self.direction))
+
+    def _trial_from_partial(self, trajectory, shooting_index,
+                            partial_trajectory):
+        """Trial trajectory from the trajectory generated by the engine"""
+        if self.direction == "forward":
+            return self._forward_trial(trajectory, shooting_index,
+                                       partial_trajectory)
+        elif self.direction == "backward":
+            return self._backward_trial(trajectory, shooting_index,
+                                        partial_trajectory)
+        else:
+            raise RuntimeError("Unknown direction: " + str(self.direction))
+
     # direction is an abstract property to disallow instantiation of the EngineMover unless we use
     # a concrete subclass that sets this. This is not super elegant but is the way to do it with
     # abstract classes
@@ -572,9 +704,13 @@ class EngineMover(SampleMover):
     def direction(self):
         return 'unknown'
 
-    def _run(self, trajectory, shooting_index):
+    def _run(self, trajectory, shooting_index, max_length=None):
         """Takes initial trajectory and shooting point; return trial
-        trajectory"""
+        trajectory
+
+        If `max_length` is given, the dynamics is stopped as soon as the
+        trial trajectory is longer than `max_length`.
+        """
         shoot_str = "Running {sh_dir} from frame {fnum} in [0:{maxt}]"
         logger.info(shoot_str.format(
             fnum=shooting_index,
@@ -584,11 +720,11 @@ class EngineMover(SampleMover):
 
         if self.direction == "forward":
             trial_trajectory = self._make_forward_trajectory(
-                trajectory, shooting_index
+                trajectory, shooting_index, max_length
             )
         elif self.direction == "backward":
             trial_trajectory = self._make_backward_trajectory(
-                trajectory, shooting_index
+                trajectory, shooting_index, max_length
             )
         else:
             raise RuntimeError("Unknown direction: " + str(self.direction))
@@ -599,11 +735,12 @@ class EngineMover(SampleMover):
 class ForwardShootMover(EngineMover):
     """A forward shooting sample generator
     """
-    def __init__(self, ensemble, selector):
+    def __init__(self, ensemble, selector, prerejection=False):
         super(ForwardShootMover, self).__init__(
             ensemble=ensemble,
             target_ensemble=ensemble,
-            selector=selector
+            selector=selector,
+            prerejection=prerejection
         )
 
     @property
@@ -613,11 +750,12 @@ class ForwardShootMover(EngineMover):
 class BackwardShootMover(EngineMover):
     """A Backward shooting generator
     """
-    def __init__(self, ensemble, selector):
+    def __init__(self, ensemble, selector, prerejection=False):
         super(BackwardShootMover, self).__init__(
             ensemble=ensemble,
             target_ensemble=ensemble,
-            selector=selector
+            selector=selector,
+            prerejection=prerejection
         )
 
     @property
@@ -710,11 +848,11 @@ class ReplicaExchangeMover(SampleMover):
         replica1 = sample1.replica
         replica2 = sample2.replica
 
-        from1to2 = ensemble2(trajectory1)
+        from1to2 = paths.ensemble_verdict(ensemble2, trajectory1)
         logger.debug("trajectory " + repr(trajectory1) +
                      " into ensemble " + repr(ensemble2) +
                      " : " + str(from1to2))
-        from2to1 = ensemble1(trajectory2)
+        from2to1 = paths.ensemble_verdict(ensemble1, trajectory2)
         logger.debug("trajectory " + repr(trajectory2) +
                      " into ensemble " + repr(ensemble1) +
                      " : " + str(from2to1))
@@ -790,11 +928,11 @@ class StateSwapMover(SampleMover):
         replica1 = sample1.replica
         replica2 = sample2.replica
 
-        from1to2 = ensemble2(trajectory1)
+        from1to2 = paths.ensemble_verdict(ensemble2, trajectory1)
         logger.debug("trajectory " + repr(trajectory1) +
                      " into ensemble " + repr(ensemble2) +
                      " : " + str(from1to2))
-        from2to1 = ensemble1(trajectory2)
+        from2to1 = paths.ensemble_verdict(ensemble1, trajectory2)
         logger.debug("trajectory " + repr(trajectory2) +
                      " into ensemble " + repr(ensemble1) +
                      " : " + str(from2to1))
@@ -1511,6 +1649,108 @@ class ConditionalSequentialMover(SequentialMover):
         return paths.ConditionalSequentialPathMoveChange(pathmovechanges, mover=self)
 
 
+class ConcurrentEngineMover(SequentialMover):
+    """
+    Performs each of the EngineMovers in its movers list, generating the
+    dynamics of all of them in a single batch.
+
+    The trial trajectories are generated by one call to the engine's
+    `generate_batch`. With an EnginePool (or an engine that integrates
+    several walkers at once) as engine, all shots run concurrently. Since
+    the movers must act on different ensembles the result is the same as
+    that of a SequentialMover with the same movers. Movers with
+    `prerejection` draw their Metropolis random number before the batch
+    is started, and the timings of the engine are set to the trials as in
+    `EngineMover`.
+
+    For example, this would be used to shoot in all interfaces of a RETIS
+    network in one step.
+    """
+    def __init__(self, movers):
+        """
+        Parameters
+        ----------
+        movers : list of openpathsampling.EngineMover
+            the shooting movers, each acting on a different ensemble
+        """
+        for mover in movers:
+            if not isinstance(mover, EngineMover):
+                raise TypeError(
+                    "ConcurrentEngineMover only supports EngineMovers, " +
+                    "got " + mover.__class__.__name__
+                )
+
+        ensembles = [mover.ensemble for mover in movers]
+        if len(set(ensembles)) < len(ensembles):
+            raise ValueError(
+                "ConcurrentEngineMover needs movers with different ensembles"
+            )
+
+        super(ConcurrentEngineMover, self).__init__(movers)
+
+    def move(self, globalstate):
+        logger.debug("Starting concurrent engine move")
+
+        input_samples = []
+        shooting_indices = []
+        random_values = []
+        max_lengths = []
+        snapshots = []
+        running = []
+        n_frames_max = []
+
+        for mover in self.movers:
+            sample = mover.select_sample(globalstate, mover.ensemble)
+            shooting_index = mover.selector.pick(sample.trajectory)
+
+            random_value = None
+            max_length = None
+            if mover.prerejection:
+                random_value = random.random()
+                max_length = mover.selector.max_length(sample.trajectory,
+                                                       random_value)
+
+            snapshot, conditions = mover._shooting_request(
+                sample.trajectory, shooting_index
+            )
+
+            input_samples.append(sample)
+            shooting_indices.append(shooting_index)
+            random_values.append(random_value)
+            max_lengths.append(max_length)
+            snapshots.append(snapshot)
+            running.append(conditions)
+            n_frames_max.append(mover._n_frames_max(
+                sample.trajectory, shooting_index, max_length
+            ))
+
+        engine = self.movers[0].engine
+        partial_trajectories = engine.generate_batch(
+            snapshots, running, n_frames_max=n_frames_max
+        )
+        # only set if the engine records timings (option `timing`)
+        timings = engine.last_timings
+        if timings is None:
+            timings = [None] * len(self.movers)
+
+        pathmovechanges = []
+        for (mover, sample, shooting_index, random_value, max_length,
+             partial_trajectory, timing) in zip(
+                self.movers, input_samples, shooting_indices, random_values,
+                max_lengths, partial_trajectories, timings):
+            trial_trajectory = mover._trial_from_partial(
+                sample.trajectory, shooting_index, partial_trajectory
+            )
+            trials = mover._build_trials(sample, shooting_index,
+                                         trial_trajectory, random_value,
+                                         max_length)
+            if timing is not None:
+                trials[0].details.generation_timing = timing
+            pathmovechanges.append(mover._change_from_trials(trials))
+
+        return paths.SequentialPathMoveChange(pathmovechanges, mover=self)
+
+
 class ReplicaIDChangeMover(PathMover):
     """
     Changes the replica ID for a path.
@@ -1662,16 +1902,21 @@ class OneWayShootingMover(RandomChoiceMover):
         The shooting point selection scheme
     ensemble : paths.Ensemble
         Ensemble for this shooting mover
+    prerejection : bool
+        whether the submovers stop the dynamics as soon as the trial
+        cannot be accepted anymore (see `EngineMover`)
     """
-    def __init__(self, ensemble, selector):
+    def __init__(self, ensemble, selector, prerejection=False):
         movers = [
             ForwardShootMover(
                 ensemble=ensemble,
-                selector=selector
+                selector=selector,
+                prerejection=prerejection
             ),
             BackwardShootMover(
                 ensemble=ensemble,
-                selector=selector
+                selector=selector,
+                prerejection=prerejection
             )
         ]
         super(OneWayShootingMover, self).__init__(
@@ -1698,6 +1943,10 @@ class OneWayShootingMover(RandomChoiceMover):
     def selector(self):
         return self.movers[0].selector
 
+    @property
+    def prerejection(self):
+        return self.movers[0].prerejection
+
 class OneWayExtendMover(RandomChoiceMover):
     """
     OneWayShootingMover is a special case of a RandomChoiceMover which
@@ -2000,6 +2249,9 @@ class SampleDetails(Details):
     ----------
     selection_probability : float
         the chance that a sample will be accepted due to asymmetrical proposal
+    generation_timing : GenerationTiming
+        only for samples from an EngineMover whose engine has the option
+        `timing` set; where the time went while generating the trial
     """
 
     def __init__(self, **kwargs):
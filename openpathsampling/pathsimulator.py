@@ -228,11 +228,11 @@ class Bootstrapping(PathSimulator):
     def run(self, nsteps):
         bootstrapmove = self._bootstrapmove
 
-        cvs = []
+        cv_group = paths.CVGroup([])
         n_samples = 0
 
         if self.storage is not None:
-            cvs = list(self.storage.cvs)
+            cv_group = paths.CVGroup(self.storage.cvs)
             n_samples = len(self.storage.snapshots)
 
         ens_num = len(self.globalstate)-1
@@ -288,10 +288,9 @@ class Bootstrapping(PathSimulator):
 
             if self.storage is not None:
                 # compute all cvs now
-                for cv in cvs:
-                    n_len = len(self.storage.snapshots)
-                    cv(self.storage.snapshots[n_samples:n_len])
-                    n_samples = n_len
+                n_len = len(self.storage.snapshots)
+                cv_group(self.storage.snapshots[n_samples:n_len])
+                n_samples = n_len
 
                 self.storage.steps.save(mcstep)
 
@@ -476,72 +475,96 @@ class PathSampling(PathSimulator):
         nsteps_to_run = nsteps - self.step
         self.run(nsteps_to_run)
 
+    def _save_step(self, mcstep, cv_group):
+        """
+        Compute the collective variables of the new snapshots and store
+        the MC step
+        """
+        if self.storage is not None:
+            n_len = len(self.storage.snapshots)
+            cv_group(self.storage.snapshots[self._n_samples:n_len])
+            self._n_samples = n_len
+
+            self.storage.steps.save(mcstep)
+
     def run(self, nsteps):
         mcstep = None
 
-        cvs = list()
-        n_samples = 0
+        cv_group = paths.CVGroup([])
+        self._n_samples = 0
 
         if self.storage is not None:
-            n_samples = len(self.storage.snapshots)
-            cvs = list(self.storage.cvs)
+            self._n_samples = len(self.storage.snapshots)
+            cv_group = paths.CVGroup(self.storage.cvs)
+
+        engine = self.engine
+        if engine is None:
+            engine = paths.EngineMover.engine
 
         if self.step == 0:
             if self.storage is not None:
                 self.storage.save(self.move_scheme)
             self.save_initial()
 
-        for nn in range(nsteps):
-            self.step += 1
-            logger.info("Beginning MC cycle " + str(self.step))
-            refresh=True
-            if self.step % self.visualize_frequency == 0:
-                # do we visualize this step?
-                if self.live_visualization is not None and mcstep is not None:
-                    # do we visualize at all?
-                    self.live_visualization.draw_ipynb(mcstep)
-                    refresh=False
-
-                paths.tools.refresh_output(
-                    "Working on Monte Carlo cycle number " + str(self.step)
-                    + ".\n", 
-                    refresh=refresh
-                )
-
-            time_start = time.time() 
-            movepath = self._mover.move(self.globalstate, step=self.step)
-            samples = movepath.results
-            new_sampleset = self.globalstate.apply_samples(samples)
-            time_elapsed = time.time() - time_start
-
-            # TODO: we can save this with the MC steps for timing? The bit
-            # below works, but is only a temporary hack
-            setattr(movepath.details, "timing", time_elapsed)
-
-            mcstep = MCStep(
-                simulation=self,
-                mccycle=self.step,
-                previous=self.globalstate,
-                active=new_sampleset,
-                change=movepath
-            )
-
-
-            if self.storage is not None:
-                for cv in cvs:
-                    n_len = len(self.storage.snapshots)
-                    cv(self.storage.snapshots[n_samples:n_len])
-                    n_samples = n_len
-
-                self.storage.steps.save(mcstep)
-
-            if self.step % self.save_frequency == 0:
-                self.globalstate.sanity_check()
-                self.sync_storage()
+        try:
+            for nn in range(nsteps):
+                self.step += 1
+                logger.info("Beginning MC cycle " + str(self.step))
+                refresh=True
+                if self.step % self.visualize_frequency == 0:
+                    # do we visualize this step?
+                    if self.live_visualization is not None and mcstep is not None:
+                        # do we visualize at all?
+                        self.live_visualization.draw_ipynb(mcstep)
+                        refresh=False
+
+                    paths.tools.refresh_output(
+                        "Working on Monte Carlo cycle number " + str(self.step)
+                        + ".\n",
+                        refresh=refresh
+                    )
 
-            self.globalstate = new_sampleset
+                time_start = time.time()
+                movepath = self._mover.move(self.globalstate, step=self.step)
+                samples = movepath.results
+                new_sampleset = self.globalstate.apply_samples(samples)
+                time_elapsed = time.time() - time_start
+
+                # TODO: we can save this with the MC steps for timing? The bit
+                # below works, but is only a temporary hack
+                setattr(movepath.details, "timing", time_elapsed)
+
+                mcstep = MCStep(
+                    simulation=self,
+                    mccycle=self.step,
+                    previous=self.globalstate,
+                    active=new_sampleset,
+                    change=movepath
+                )
 
-        self.sync_storage()
+                # storing the step can overlap with the dynamics of the next
+                # one if the engine runs in a different process. The save of
+                # the previous step is still pending if this step did not
+                # run any dynamics, so at most one step waits to be saved
+                save = lambda mcstep=mcstep: self._save_step(mcstep, cv_group)
+                if engine is not None:
+                    engine.run_deferred()
+                    engine.defer(save)
+                else:
+                    save()
+
+                if self.step % self.save_frequency == 0:
+                    self.globalstate.sanity_check()
+                    if engine is not None:
+                        engine.run_deferred()
+                    self.sync_storage()
+
+                self.globalstate = new_sampleset
+        finally:
+            # steps already done are saved even if a move failed
+            if engine is not None:
+                engine.run_deferred()
+            self.sync_storage()
 
         if self.live_visualization is not None and mcstep is not None:
             self.live_visualization.draw_ipynb(mcstep)
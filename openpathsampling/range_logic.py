@@ -269,3 +269,78 @@ def periodic_range_sub(amin, amax, bmin, bmax):
         sub_res = range_sub(order[0], order[1], order[2], order[3])
         return recover_periodic_range(sub_res, order, adict)
 
+
+
+# The functions below work on interval sets: sorted lists of disjoint
+# closed intervals (min, max), as used by `CVIntervalSetVolume`. As above,
+# the boundaries are always included. Any list of intervals can be brought
+# into this form by `interval_set_normal_form`.
+
+def interval_set_normal_form(intervals):
+    """Sorts intervals and merges the ones that overlap or touch.
+
+    Parameters
+    ----------
+    intervals : list of 2-tuples
+        (min, max) of each interval; intervals with min > max are empty
+
+    Returns
+    -------
+    list of 2-tuples
+        the same set as sorted, disjoint intervals
+    """
+    result = []
+    for lmin, lmax in sorted(intervals):
+        if lmin > lmax:
+            continue
+        if result and lmin <= result[-1][1]:
+            if lmax > result[-1][1]:
+                result[-1] = (result[-1][0], lmax)
+        else:
+            result.append((lmin, lmax))
+    return result
+
+def interval_set_or(a, b):
+    """Union of two interval sets"""
+    return interval_set_normal_form(a + b)
+
+def interval_set_and(a, b):
+    """Intersection of two interval sets"""
+    result = []
+    i = 0
+    j = 0
+    while i < len(a) and j < len(b):
+        lmin = max(a[i][0], b[j][0])
+        lmax = min(a[i][1], b[j][1])
+        if lmin <= lmax:
+            result.append((lmin, lmax))
+        # move on with the interval that ends first
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+def interval_set_complement(a, domain_min, domain_max):
+    """The closure of the complement of an interval set in the domain
+
+    Since the boundaries are included, the complement shares them with `a`.
+    """
+    result = []
+    lmin = domain_min
+    for (amin, amax) in a:
+        if amin > lmin:
+            result.append((lmin, amin))
+        lmin = max(lmin, amax)
+    if lmin < domain_max:
+        result.append((lmin, domain_max))
+    return result
+
+def interval_set_sub(a, b, domain_min, domain_max):
+    """A - B for interval sets in the given domain"""
+    complement = interval_set_complement(b, domain_min, domain_max)
+    # single points are left over where A ends at a boundary of B
+    b_bounds = set(bound for interval in b for bound in interval)
+    return [(lmin, lmax)
+            for (lmin, lmax) in interval_set_and(a, complement)
+            if lmin < lmax or lmin not in b_bounds]
@@ -222,7 +222,8 @@ class SampleSet(StorableObject):
             logger.info("Checking sanity of "+repr(sample.ensemble)+
                         " with "+str(sample.trajectory))
             try:
-                assert(sample.ensemble(sample.trajectory))
+                assert(paths.ensemble_verdict(sample.ensemble,
+                                              sample.trajectory))
             except AssertionError as e:
                 failmsg = ("Trajectory does not match ensemble for replica "
                            + str(sample.replica))
@@ -466,6 +467,7 @@ class Sample(StorableObject):
         self.parent = parent
         self.details = details
         self.mover = mover
+        self._valid = None
 
     def __call__(self):
         return self.trajectory
@@ -539,7 +541,8 @@ class Sample(StorableObject):
                 self._valid = True
             else:
                 if self.ensemble is not None:
-                    self._valid = self.ensemble(self.trajectory)
+                    self._valid = paths.ensemble_verdict(self.ensemble,
+                                                         self.trajectory)
                 else:
                     # no ensemble means ALL ???
                     self._valid = True
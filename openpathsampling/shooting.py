@@ -64,6 +64,18 @@ class ShootingPointSelector(StorableNamedObject):
 
         return sum(self._biases(trajectory))
 
+    def max_length(self, trajectory, random_value):
+        '''
+        Returns the maximal length of a trial from `trajectory` that can
+        still be accepted with the Metropolis random number `random_value`
+
+        Notes
+        -----
+        In general the acceptance depends on more than the length of the
+        trial, so no bound is known and this returns None.
+        '''
+        return None
+
     def pick(self, trajectory):
         '''
         Returns the index of the chosen snapshot within `trajectory`
@@ -131,6 +143,24 @@ class UniformSelector(ShootingPointSelector):
     def sum_bias(self, trajectory):
         return float(len(trajectory) - self.pad_start - self.pad_end)
 
+    def max_length(self, trajectory, random_value):
+        '''
+        Returns the maximal length of a trial from `trajectory` that can
+        still be accepted with the Metropolis random number `random_value`
+
+        Notes
+        -----
+        The acceptance is `sum_bias(old) / sum_bias(new)`, so a trial is
+        only accepted if `sum_bias(new) <= sum_bias(old) / random_value`.
+        '''
+        if random_value <= 0.0:
+            return None
+
+        return int(math.floor(
+            self.pad_start + self.pad_end +
+            self.sum_bias(trajectory) / random_value
+        ))
+
     def pick(self, trajectory):
         idx = np.random.random_integers(self.pad_start, 
                                         len(trajectory) - self.pad_end - 1)
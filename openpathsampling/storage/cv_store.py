@@ -56,7 +56,7 @@ class ObjectDictStore(ObjectStore):
         if idx is not None:
             var_name = self.cache_var_name(idx)
 
-            if var_name not in self.storage.variables:
+            if self.key_store.prefix + '_' + var_name not in self.storage.variables:
 
                 params = objectdict.return_parameters_from_template(self.storage.template)
 
@@ -134,7 +134,10 @@ class ObjectDictStore(ObjectStore):
                 source_idx = objectdict.storage.snapshots.index[snapshot]
                 target_idx = target_file.snapshots.index.get(snapshot, None)
                 if target_idx is not None:
-                    target_variable[target_idx] = source_variable[source_idx]
+                    with self.storage.lock:
+                        value = source_variable[source_idx]
+                    with target_file.lock:
+                        target_variable[target_idx] = value
 
     def sync(self, objectdict=None):
         """
@@ -53,11 +53,12 @@ class MCStepStore(ObjectStore):
 
             storage = self.storage
 
-            steps = storage.variables[self.prefix + '_mccycle'][:]
-            previous_idxs = storage.variables[self.prefix + '_previous'][:]
-            active_idxs = storage.variables[self.prefix + '_active'][:]
-            simulation_idxs = storage.variables[self.prefix + '_simulation'][:]
-            change_idxs = storage.variables[self.prefix + '_change'][:]
+            with storage.lock:
+                steps = storage.variables[self.prefix + '_mccycle'][:]
+                previous_idxs = storage.variables[self.prefix + '_previous'][:]
+                active_idxs = storage.variables[self.prefix + '_active'][:]
+                simulation_idxs = storage.variables[self.prefix + '_simulation'][:]
+                change_idxs = storage.variables[self.prefix + '_change'][:]
 
             [self.add_to_cache(*v) for v in zip(
                 idxs,
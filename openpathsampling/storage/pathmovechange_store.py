@@ -64,11 +64,12 @@ class PathMoveChangeStore(ObjectStore):
         if not self._cached_all:
             idxs = range(len(self))
 
-            cls_names = self.variables['cls'][:]
-            samples_idxss = self.variables['samples'][:]
-            subchanges_idxss = self.variables['subchanges'][:]
-            mover_idxs = self.variables['mover'][:]
-            details_idxs = self.variables['details'][:]
+            with self.storage.lock:
+                cls_names = self.variables['cls'][:]
+                samples_idxss = self.variables['samples'][:]
+                subchanges_idxss = self.variables['subchanges'][:]
+                mover_idxs = self.variables['mover'][:]
+                details_idxs = self.variables['details'][:]
 
             [self._add_empty_to_cache(*v) for v in zip(
                 idxs,
@@ -57,13 +57,14 @@ class SampleStore(ObjectStore):
         """
         if not self._cached_all:
             idxs = range(len(self))
-            trajectory_idxs = self.variables['trajectory'][:]
-            replica_idxs = self.variables['replica'][:]
-            biass = self.variables['bias'][:]
-            ensemble_idxs = self.variables['ensemble'][:]
-            parent_idxs = self.variables['parent'][:]
-            mover_idxs = self.variables['mover'][:]
-            details_idxs = self.variables['details'][:]
+            with self.storage.lock:
+                trajectory_idxs = self.variables['trajectory'][:]
+                replica_idxs = self.variables['replica'][:]
+                biass = self.variables['bias'][:]
+                ensemble_idxs = self.variables['ensemble'][:]
+                parent_idxs = self.variables['parent'][:]
+                mover_idxs = self.variables['mover'][:]
+                details_idxs = self.variables['details'][:]
 
             [self._add_empty_to_cache(*v) for v in zip(
                 idxs,
@@ -129,7 +130,8 @@ class SampleSetStore(ObjectStore):
             list of sample indices
         """
 
-        return self.variables['samples'][idx].tolist()
+        with self.storage.lock:
+            return self.variables['samples'][idx].tolist()
 
     def _init(self, units=None):
         """
@@ -153,8 +155,9 @@ class SampleSetStore(ObjectStore):
         """
         if not self._cached_all:
             idxs = range(len(self))
-            samples_idxs = self.variables['samples'][:]
-            pmc_idxs = self.variables['movepath'][:]
+            with self.storage.lock:
+                samples_idxs = self.variables['samples'][:]
+                pmc_idxs = self.variables['movepath'][:]
 
             [self._add_empty_to_cache(*v) for v in zip(
                 idxs,
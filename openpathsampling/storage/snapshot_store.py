@@ -153,6 +153,66 @@ class SnapshotStore(ObjectStore):
     def all(self):
         return Trajectory([LoaderProxy(self, idx) for idx in range(len(self))])
 
+    def _configuration_data(self, reader, frame_indices, **kwargs):
+        """
+        Apply a bulk reader of the configuration store to the configurations
+        of the snapshots `frame_indices`
+        """
+        if frame_indices is None:
+            frame_indices = range(len(self))
+
+        # the indices are read sorted and without duplicates
+        unique, inverse = np.unique(np.asarray(frame_indices, dtype=np.int64),
+                                    return_inverse=True)
+        with self.storage.lock:
+            configurations = self.storage.variables[
+                self.prefix + '_configuration'][unique.tolist()]
+        conf_unique, conf_inverse = np.unique(configurations, return_inverse=True)
+
+        return reader(conf_unique.tolist(), **kwargs)[conf_inverse][inverse]
+
+    def coordinates_as_numpy(self, frame_indices=None, atom_indices=None):
+        """
+        Return the atom coordinates of stored snapshots
+
+        The configurations of all snapshots are read at once without
+        loading the snapshots.
+
+        Parameters
+        ----------
+        frame_indices : list of int or None
+            the snapshot indices to be included. If None all snapshots are
+            returned
+        atom_indices : list of int or None
+            the atom indices to be included. If None all atoms are returned
+
+        Returns
+        -------
+        numpy.array, shape=(n_frames, n_atoms, n_spatial)
+            the array of atom coordinates in a float32 numpy array
+        """
+        return self._configuration_data(
+            self.storage.configurations.coordinates_as_numpy, frame_indices,
+            atom_indices=atom_indices)
+
+    def box_vectors_as_numpy(self, frame_indices=None):
+        """
+        Return the box vectors of stored snapshots
+
+        Parameters
+        ----------
+        frame_indices : list of int or None
+            the snapshot indices to be included. If None all snapshots are
+            returned
+
+        Returns
+        -------
+        numpy.array, shape=(n_frames, n_spatial, n_spatial)
+            the array of box vectors in a float32 numpy array
+        """
+        return self._configuration_data(
+            self.storage.configurations.box_vectors_as_numpy, frame_indices)
+
 
 class MomentumStore(ObjectStore):
     """
@@ -196,7 +256,10 @@ class MomentumStore(ObjectStore):
         if atom_indices is None:
             atom_indices = slice(None)
 
-        return self.variables['velocities'][frame_indices, atom_indices, :].astype(np.float32).copy()
+        with self.storage.lock:
+            velocities = self.variables['velocities'][frame_indices, atom_indices, :]
+
+        return velocities.astype(np.float32).copy()
 
     def velocities_as_array(self, frame_indices=None, atom_indices=None):
         """
@@ -296,8 +359,33 @@ class ConfigurationStore(ObjectStore):
         if atom_indices is None:
             atom_indices = slice(None)
 
-        return self.storage.variables[self.prefix + '_coordinates'][frame_indices, atom_indices, :].astype(
-            np.float32).copy()
+        with self.storage.lock:
+            coordinates = self.storage.variables[self.prefix + '_coordinates'][frame_indices, atom_indices, :]
+
+        return coordinates.astype(np.float32).copy()
+
+    def box_vectors_as_numpy(self, frame_indices=None):
+        """
+        Return the box vectors in the storage for given frame indices
+
+        Parameters
+        ----------
+        frame_indices : list of int or None
+            the frame indices to be included. If None all frames are returned
+
+        Returns
+        -------
+        numpy.array, shape=(n_frames, n_spatial, n_spatial)
+            the array of box vectors in a float32 numpy array
+
+        """
+        if frame_indices is None:
+            frame_indices = slice(None)
+
+        with self.storage.lock:
+            box_vectors = self.storage.variables[self.prefix + '_box_vectors'][frame_indices, :, :]
+
+        return box_vectors.astype(np.float32).copy()
 
     def _init(self):
         super(ConfigurationStore, self)._init()
@@ -42,7 +42,9 @@ class Storage(NetCDFPlus):
             the initial snapshot
         """
         if self._template is None:
-            self._template = self.snapshots.load(int(self.variables['template_idx'][0]))
+            with self.lock:
+                template_idx = int(self.variables['template_idx'][0])
+            self._template = self.snapshots.load(template_idx)
 
         return self._template
 
@@ -241,9 +243,15 @@ class Storage(NetCDFPlus):
         Convenience function to sync `self.cvs` and `self` at once.
 
         Under most circumstances, you want to sync `self.cvs` and `self` at
-        the same time. This just makes it easier to do that.
+        the same time. This just makes it easier to do that. The verdicts of
+        an active `VerdictCache` for this storage are synced as well. If a
+        writer thread runs (see `start_writer`), the CV values and the sync
+        of the file are only queued for it.
         """
         self.cvs.sync()
+        verdicts = paths.VerdictCache.active
+        if verdicts is not None and verdicts.storage is self:
+            verdicts.sync()
         self.sync()
 
     def set_caching_mode(self, mode='default'):
@@ -39,7 +39,8 @@ class TrajectoryStore(ObjectStore):
         """
 
         # get the values
-        return self.variables['snapshots'][idx].tolist()
+        with self.storage.lock:
+            return self.variables['snapshots'][idx].tolist()
 
     def iter_snapshot_indices(this, iter_range=None):
         """
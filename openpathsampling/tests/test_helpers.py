@@ -19,6 +19,7 @@ from openpathsampling.snapshot import Snapshot
 from openpathsampling.dynamics_engine import DynamicsEngine
 from openpathsampling.topology import Topology
 import openpathsampling as paths
+import openpathsampling.storage
 
 
 def make_1d_traj(coordinates, velocities=None, topology=None):
@@ -72,6 +73,31 @@ class MoverWithSignature(paths.PathMover):
         # need to implement a fake move or this class will be considered abstract
         pass
 
+class ToyStorage(paths.storage.Storage):
+    """Storage of toy snapshots, which have no units"""
+    support_simtk_unit = False
+
+
+def make_toy_storage(filename, n_snapshots):
+    """
+    A ToyStorage with a trajectory of 2D toy snapshots with one atom at
+    x = 0, 1, ..., and velocity (1, x)
+    """
+    topology = paths.ToyTopology(n_spatial=2, masses=np.array([1.0]),
+                                 pes=None)
+    snapshots = [
+        Snapshot(coordinates=np.array([[float(i), 0.0]]),
+                 velocities=np.array([[1.0, float(i)]]),
+                 box_vectors=np.identity(2),
+                 potential_energy=0.5, kinetic_energy=0.25,
+                 topology=topology)
+        for i in range(n_snapshots)
+    ]
+    storage = ToyStorage(filename, mode='w', template=snapshots[0])
+    storage.save(Trajectory(snapshots))
+    return storage
+
+
 class CalvinistDynamics(DynamicsEngine):
     def __init__(self, predestination):
         topology = Topology(n_atoms=1, n_spatial=1)
@@ -125,6 +125,107 @@ class testCombinations(object):
     def test_kinetic_energy(self):
         assert_almost_equal(self.simpletest.kinetic_energy(self), 0.4575)
 
+class testBatchedPES(object):
+    def setUp(self):
+        self.positions = np.array([init_pos, init_pos[::-1], 2*init_pos])
+        self.velocities = np.array([init_vel, -init_vel, 0.5*init_vel])
+        self.mass = sys_mass
+        self.fullertest = gaussian + outer - linear + harmonic
+
+    def test_batch_matches_single(self):
+        for pes in [gaussian, outer, linear, harmonic, self.fullertest]:
+            batch_V = pes.V(self)
+            batch_dVdx = pes.dVdx(self)
+            batch_kin = pes.kinetic_energy(self)
+            assert_equal(batch_V.shape, (3,))
+            assert_equal(np.shape(batch_dVdx), (3, 2))
+            for walker in range(3):
+                single = testBatchedPES()
+                single.positions = self.positions[walker]
+                single.velocities = self.velocities[walker]
+                single.mass = sys_mass
+                assert_almost_equal(batch_V[walker], pes.V(single))
+                np.testing.assert_allclose(batch_dVdx[walker],
+                                           pes.dVdx(single))
+                assert_almost_equal(batch_kin[walker],
+                                    pes.kinetic_energy(single))
+
+class testFusedPES(object):
+    def setUp(self):
+        self.positions = init_pos.copy()
+        self.velocities = init_vel
+        self.mass = sys_mass
+        self.pes = (gaussian + Gaussian(2.0, [1.0, 5.0], [-0.3, 0.2])
+                    + outer - linear + harmonic - (harmonic + linear)
+                    + outer)
+
+    def _reference(self):
+        V = (gaussian.V(self) + Gaussian(2.0, [1.0, 5.0], [-0.3, 0.2]).V(self)
+             + 2*outer.V(self) - 2*linear.V(self))
+        dVdx = (gaussian.dVdx(self)
+                + Gaussian(2.0, [1.0, 5.0], [-0.3, 0.2]).dVdx(self)
+                + 2*outer.dVdx(self) - 2*np.asarray(linear.dVdx(self)))
+        return V, dVdx
+
+    def test_flattened_terms(self):
+        terms = self.pes._terms()
+        assert_equal(len(terms), 8)
+        assert_equal([c for c, term in terms],
+                     [1.0, 1.0, 1.0, -1.0, 1.0, -1.0, -1.0, 1.0])
+
+    def test_V_and_dVdx(self):
+        V, dVdx = self.pes.V_and_dVdx(self)
+        ref_V, ref_dVdx = self._reference()
+        assert_almost_equal(V, ref_V)
+        np.testing.assert_allclose(dVdx, ref_dVdx)
+        assert_almost_equal(self.pes.V(self), ref_V)
+        np.testing.assert_allclose(self.pes.dVdx(self), ref_dVdx)
+
+    def test_single_terms(self):
+        for pes in [gaussian, outer, linear, harmonic]:
+            V, dVdx = pes.V_and_dVdx(self)
+            assert_almost_equal(V, pes.V(self))
+            np.testing.assert_allclose(dVdx, pes.dVdx(self))
+
+    def test_cache(self):
+        first = self.pes.V_and_dVdx(self)
+        assert_equal(self.pes.V_and_dVdx(self) is first, True)
+        assert_equal(first[1].flags.writeable, False)
+        # positions changed in place, as done by the integrators
+        self.positions += 0.1
+        second = self.pes.V_and_dVdx(self)
+        assert_equal(second is first, False)
+        ref_V, ref_dVdx = self._reference()
+        assert_almost_equal(second[0], ref_V)
+        np.testing.assert_allclose(second[1], ref_dVdx)
+        # a different mass changes the harmonic terms
+        self.mass = 2.0 * sys_mass
+        assert_equal(self.pes.V_and_dVdx(self) is second, False)
+
+    def test_batch(self):
+        batch = testBatchedPES()
+        batch.setUp()
+        V, dVdx = self.pes.V_and_dVdx(batch)
+        assert_equal(V.shape, (3,))
+        assert_equal(dVdx.shape, (3, 2))
+        for walker in range(3):
+            self.positions = batch.positions[walker]
+            ref_V, ref_dVdx = self._reference()
+            assert_almost_equal(V[walker], ref_V)
+            np.testing.assert_allclose(dVdx[walker], ref_dVdx)
+
+    def test_generic_combination(self):
+        product = Toy_PES_Combination(gaussian, outer,
+                                      lambda a, b: a * b,
+                                      lambda a, b: a * b)
+        pes = product + linear
+        V, dVdx = pes.V_and_dVdx(self)
+        assert_almost_equal(V, gaussian.V(self) * outer.V(self)
+                               + linear.V(self))
+        np.testing.assert_allclose(
+            dVdx, gaussian.dVdx(self) * outer.dVdx(self) + linear.dVdx(self)
+        )
+
 
 # === TESTS FOR TOY ENGINE OBJECT =========================================
 
@@ -245,6 +346,210 @@ class testToyEngine(object):
         traj = self.sim.generate(self.sim.current_snapshot, [true_func])
         assert_equal(len(traj), self.sim.n_frames_max)
 
+    def test_generate_check_stride(self):
+        snap = self.sim.current_snapshot
+        self.sim.options['n_frames_max'] = 40
+        calls = []
+        def below(traj, trusted=False):
+            calls.append(trusted)
+            return all([s.coordinates[0][0] < 0.85 for s in traj])
+
+        # forward reaches x=0.85 after about 20 frames, backward never
+        for direction in [+1, -1]:
+            self.sim.options['check_stride'] = 1
+            del calls[:]
+            per_frame = self.sim.generate(snap, [below], direction)
+            n_calls_per_frame = len(calls)
+
+            for stride in [2, 3, 7, 50]:
+                self.sim.options['check_stride'] = stride
+                del calls[:]
+                strided = self.sim.generate(snap, [below], direction)
+                assert_equal(len(strided), len(per_frame))
+                for (s1, s2) in zip(strided, per_frame):
+                    np.testing.assert_allclose(s1.coordinates,
+                                               s2.coordinates)
+                if stride < 10:
+                    assert_equal(len(calls) < n_calls_per_frame, True)
+
+    def test_generate_check_stride_n_frames_max(self):
+        self.sim.options['check_stride'] = 3
+        traj = self.sim.generate(self.sim.current_snapshot, [true_func])
+        assert_equal(len(traj), self.sim.n_frames_max)
+
+    def test_generate_check_stride_blocks(self):
+        blocks = []
+        generate_next_frames = self.sim.generate_next_frames
+        def record(n_frames):
+            blocks.append(n_frames)
+            return generate_next_frames(n_frames)
+
+        self.sim.generate_next_frames = record
+        self.sim.options['check_stride'] = 3
+        self.sim.options['n_frames_max'] = 9
+        traj = self.sim.generate(self.sim.current_snapshot, [true_func])
+        assert_equal(len(traj), 9)
+        # the last block is cut short by n_frames_max
+        assert_equal(blocks, [3, 3, 2])
+
+    def test_generate_spill_to_disk(self):
+        snap = self.sim.current_snapshot
+        self.sim.options['n_frames_max'] = 12
+        for direction in [+1, -1]:
+            in_memory = self.sim.generate(snap, [true_func], direction)
+            self.sim.options['spill_to_disk'] = True
+            spilled = self.sim.generate(snap, [true_func], direction)
+            # the same for engines without their own frame buffer
+            self.sim._buffers_frames = False
+            copied = self.sim.generate(snap, [true_func], direction)
+            del self.sim._buffers_frames
+            self.sim.options['spill_to_disk'] = False
+
+            for traj in [spilled, copied]:
+                assert_equal(len(traj), len(in_memory))
+                for (s1, s2) in zip(traj, in_memory):
+                    np.testing.assert_allclose(s1.coordinates,
+                                               s2.coordinates)
+                    np.testing.assert_allclose(s1.velocities,
+                                               s2.velocities)
+                    assert_almost_equal(s1.potential_energy,
+                                        s2.potential_energy)
+            if direction > 0:
+                frame = copied[1]
+            else:
+                frame = copied[0]
+            assert_equal(
+                isinstance(frame._lazy[Snapshot.momentum], tuple), True
+            )
+
+    def test_generate_timing(self):
+        snap = self.sim.current_snapshot
+        self.sim.generate(snap, [true_func])
+        assert_equal(self.sim.last_timing, None)
+
+        self.sim.options['timing'] = True
+        for direction in [+1, -1]:
+            traj = self.sim.generate(snap, [true_func], direction)
+            timing = self.sim.last_timing
+            assert_equal(timing.n_frames, len(traj))
+            n_new = len(traj) - 1
+            assert_equal(timing.counts['dynamics'], n_new)
+            assert_equal(timing.counts['snapshots'], n_new)
+            assert_equal(timing.counts['trajectory'], n_new)
+            # the initial check and one per new frame
+            assert_equal(timing.counts['continue_conditions'], n_new + 1)
+            for phase in ['dynamics', 'snapshots', 'continue_conditions']:
+                assert_equal(timing.times[phase] <= timing.times['total'],
+                             True)
+
+    def test_generate_batch(self):
+        snap = self.sim.current_snapshot
+        trajs = self.sim.generate_batch([snap, snap, snap],
+                                        [[true_func]] * 3)
+        assert_equal(len(trajs), 3)
+        for traj in trajs:
+            assert_equal(len(traj), self.sim.n_frames_max)
+        # the single walker state is restored afterwards
+        assert_items_equal(self.sim.positions, init_pos)
+        assert_items_equal(self.sim.velocities, init_vel)
+
+    def test_generate_batch_matches_generate(self):
+        snap = self.sim.current_snapshot
+        self.sim.velocities = -init_vel
+        other = self.sim.current_snapshot
+        for direction in [+1, -1]:
+            batch = self.sim.generate_batch([snap, other],
+                                            [true_func, true_func],
+                                            direction=direction)
+            single = [self.sim.generate(snap, [true_func], direction),
+                      self.sim.generate(other, [true_func], direction)]
+            for (b_traj, s_traj) in zip(batch, single):
+                assert_equal(len(b_traj), len(s_traj))
+                for (b_snap, s_snap) in zip(b_traj, s_traj):
+                    np.testing.assert_allclose(b_snap.coordinates,
+                                               s_snap.coordinates)
+                    np.testing.assert_allclose(b_snap.velocities,
+                                               s_snap.velocities)
+                    assert_almost_equal(b_snap.potential_energy,
+                                        s_snap.potential_energy)
+
+    def test_generate_batch_stop_per_walker(self):
+        snap = self.sim.current_snapshot
+        max_len = lambda n: (lambda traj, trusted=True: len(traj) < n)
+        trajs = self.sim.generate_batch([snap, snap, snap],
+                                        [max_len(1), max_len(3), true_func])
+        assert_equal([len(traj) for traj in trajs], [1, 3, 5])
+
+    def test_generate_batch_n_frames_max(self):
+        snap = self.sim.current_snapshot
+        trajs = self.sim.generate_batch([snap, snap, snap],
+                                        [true_func] * 3,
+                                        n_frames_max=[2, None, 8])
+        assert_equal([len(traj) for traj in trajs],
+                     [2, self.sim.n_frames_max, self.sim.n_frames_max])
+
+    def test_generate_batch_check_stride(self):
+        snap = self.sim.current_snapshot
+        max_len = lambda n: (lambda traj, trusted=True: len(traj) < n)
+        self.sim.options['check_stride'] = 3
+        for direction in [+1, -1]:
+            running = [[max_len(2)], [max_len(4)], [true_func]]
+            batch = self.sim.generate_batch([snap] * 3, running,
+                                            direction=direction)
+            single = [self.sim.generate(snap, conditions, direction)
+                      for conditions in running]
+            # cut back to the first failing frame
+            assert_equal([len(traj) for traj in batch], [2, 4, 5])
+            for (b_traj, s_traj) in zip(batch, single):
+                assert_equal(len(b_traj), len(s_traj))
+                for (b_snap, s_snap) in zip(b_traj, s_traj):
+                    np.testing.assert_allclose(b_snap.coordinates,
+                                               s_snap.coordinates)
+
+    def test_generate_batch_spill_to_disk(self):
+        snap = self.sim.current_snapshot
+        in_memory = self.sim.generate_batch([snap, snap],
+                                            [true_func, true_func])
+        self.sim.options['spill_to_disk'] = True
+        spilled = self.sim.generate_batch([snap, snap],
+                                          [true_func, true_func])
+        for (traj, mem_traj) in zip(spilled, in_memory):
+            assert_equal(len(traj), len(mem_traj))
+            for (s1, s2) in zip(traj, mem_traj):
+                np.testing.assert_allclose(s1.coordinates, s2.coordinates)
+                assert_almost_equal(s1.potential_energy,
+                                    s2.potential_energy)
+            # new frames are views into the walker's frame buffer
+            assert_equal(
+                isinstance(traj[1]._lazy[Snapshot.momentum], tuple), True
+            )
+
+    def test_generate_batch_timing(self):
+        snap = self.sim.current_snapshot
+        self.sim.generate_batch([snap, snap], [true_func, true_func])
+        assert_equal(self.sim.last_timings, None)
+
+        self.sim.options['timing'] = True
+        max_len = lambda n: (lambda traj, trusted=True: len(traj) < n)
+        trajs = self.sim.generate_batch([snap, snap],
+                                        [max_len(3), true_func])
+        assert_equal(len(self.sim.last_timings), 2)
+        for (traj, timing) in zip(trajs, self.sim.last_timings):
+            assert_equal(timing.n_frames, len(traj))
+            n_new = len(traj) - 1
+            assert_equal(timing.counts['dynamics'], n_new)
+            assert_equal(timing.counts['snapshots'], n_new)
+            assert_equal(timing.counts['trajectory'], n_new)
+            assert_equal(timing.counts['continue_conditions'], n_new + 1)
+            for phase in ['dynamics', 'snapshots', 'continue_conditions']:
+                assert_equal(timing.times[phase] <= timing.times['total'],
+                             True)
+
+    @raises(ValueError)
+    def test_generate_batch_wrong_running(self):
+        snap = self.sim.current_snapshot
+        self.sim.generate_batch([snap, snap], [[true_func]])
+
     def test_start_with_snapshot(self):
         snap = Snapshot(coordinates=np.array([1,2]), 
                         velocities=np.array([3,4]))
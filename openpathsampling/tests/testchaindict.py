@@ -0,0 +1,220 @@
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+from nose.tools import assert_equal, assert_almost_equal, raises
+
+import openpathsampling as paths
+import openpathsampling.chaindict as cd
+from openpathsampling.netcdfplus import NetCDFPlus, ObjectStore, WeakLRUCache
+
+
+class Item(object):
+    pass
+
+
+class KeyStore(object):
+    """Minimal store of items with dense indices"""
+    def __init__(self, items):
+        self.index = {item: idx for idx, item in enumerate(items)}
+        self.cache = WeakLRUCache(100)
+        for item, idx in self.index.items():
+            self.cache[idx] = item
+
+    def __len__(self):
+        return len(self.index)
+
+
+class CVStorage(NetCDFPlus):
+    def _initialize(self):
+        self.create_dimension('items', None)
+        self.create_variable('scalar', 'float', ('items',), maskable=True)
+        self.create_variable('vector', 'numpy.float32', ('items', 3),
+                             maskable=True)
+        self.update_delegates()
+
+
+class CVObjectStorage(CVStorage):
+    """CVStorage that also stores ensembles"""
+    def _register_storages(self):
+        super(CVObjectStorage, self)._register_storages()
+        self.add('ensembles', ObjectStore(paths.Ensemble, nestable=True,
+                                          has_name=True))
+
+    def _initialize(self):
+        self._init_storages()
+        super(CVObjectStorage, self)._initialize()
+
+
+class testDenseStoredDict(object):
+    def setup(self):
+        handle, self.filename = tempfile.mkstemp(suffix='.nc')
+        os.close(handle)
+        self.storage = CVStorage(self.filename, mode='w')
+        self.items = [Item() for _ in range(6)]
+        self.key_store = KeyStore(self.items)
+        self.main_cache = WeakLRUCache(100, weak_type='key')
+
+    def teardown(self):
+        self.storage.close()
+        os.remove(self.filename)
+
+    def stored_dict(self, name, reversible=False):
+        value_store = self.storage.vars[name]
+        assert_equal(cd.DenseStoredDict.supports(value_store), True)
+        stored = cd.DenseStoredDict(self.key_store, value_store,
+                                    self.main_cache, reversible=reversible)
+        stored.post = cd.Function(lambda x: 0.5, requires_lists=False)
+        return stored
+
+    def test_values(self):
+        stored = self.stored_dict('scalar')
+        assert_equal(stored[self.items[:2]], [0.5, 0.5])
+        assert_equal(list(stored.valid[:2]), [True, True])
+        stored.post = None
+        assert_equal(stored[[self.items[1], Item(), self.items[2]]],
+                     [0.5, None, None])
+        assert_equal(type(stored[[self.items[0]]][0]), float)
+
+    def test_sync_and_load(self):
+        stored = self.stored_dict('vector', reversible=True)
+        stored.post = cd.Function(lambda x: np.array([1.0, 2.0, 3.0],
+                                                     dtype=np.float32),
+                                  requires_lists=False)
+        stored[[self.items[2]]]
+        assert_equal(sorted(stored.storable), [2, 3])
+        stored.sync()
+        assert_equal(stored.storable, set())
+
+        loaded = self.stored_dict('vector', reversible=True)
+        loaded.post = None
+        values = loaded[[self.items[3], self.items[0], self.items[2]]]
+        assert_equal(values[1], None)
+        assert_equal(values[0].tolist(), [1.0, 2.0, 3.0])
+        assert_equal(values[2].dtype, np.float32)
+        # returned arrays are copies
+        values[2][0] = 5.0
+        assert_equal(loaded[[self.items[2]]][0][0], 1.0)
+
+    def test_sync_stored_later(self):
+        stored = self.stored_dict('scalar', reversible=True)
+        self.main_cache[self.items[4]] = 0.25
+        stored.sync()
+        assert_equal(self.storage.vars['scalar'][[4, 5]], [0.25, 0.25])
+
+    def test_cache_all(self):
+        self.storage.variables['scalar'][0:3] = [1.0, 2.0, 3.0]
+        stored = self.stored_dict('scalar')
+        stored.post = None
+        stored.cache_all()
+        assert_equal(list(stored.valid), [True] * 3)
+        assert_equal(stored[self.items[:4]], [1.0, 2.0, 3.0, None])
+
+    def test_stored_dict(self):
+        self.storage.variables['scalar'][0:3] = [1.0, 2.0, 3.0]
+        stored = cd.StoredDict(self.key_store, self.storage.vars['scalar'],
+                               self.main_cache)
+        values = stored[[self.items[2], self.items[0], self.items[2]]]
+        assert_almost_equal(values[0], 3.0)
+        assert_almost_equal(values[1], 1.0)
+        assert_almost_equal(values[2], 3.0)
+
+
+class testAsyncWriter(object):
+    def setup(self):
+        handle, self.filename = tempfile.mkstemp(suffix='.nc')
+        os.close(handle)
+        self.storage = CVObjectStorage(self.filename, mode='w')
+        self.items = [Item() for _ in range(6)]
+        self.key_store = KeyStore(self.items)
+        self.key_store.storage = self.storage
+        self.main_cache = WeakLRUCache(100, weak_type='key')
+        self.writer = self.storage.start_writer(max_queue_size=2)
+
+    def teardown(self):
+        self.storage.close()
+        os.remove(self.filename)
+
+    def test_reversible_stored_dict(self):
+        stored = cd.ReversibleStoredDict(
+            self.key_store, self.storage.vars['scalar'], self.main_cache)
+        stored._add_new([self.items[3], self.items[0]], [0.5, 0.25])
+        assert_equal(stored.writer, self.writer)
+        stored.sync()
+        self.storage.sync()
+        self.storage.flush()
+        assert_equal(self.writer.n_pending, 0)
+        assert_equal(self.storage.variables['scalar'][0:4].tolist(),
+                     [0.25, 0.25, 0.5, 0.5])
+
+    def test_dense_stored_dict(self):
+        stored = cd.DenseStoredDict(
+            self.key_store, self.storage.vars['scalar'], self.main_cache,
+            reversible=False)
+        stored.add_stored([0, 1], [1.0, 2.0])
+        stored.sync()
+        # the queued values are not changed by later changes in memory
+        stored.add_stored([0, 2], [3.0, 4.0])
+        stored.flush()
+        assert_equal(self.storage.variables['scalar'][0:2].tolist(),
+                     [1.0, 2.0])
+        stored.sync()
+        stored.cache_all()
+        assert_equal(stored[self.items[:4]], [3.0, 2.0, 4.0, None])
+
+    def test_close(self):
+        stored = cd.DenseStoredDict(
+            self.key_store, self.storage.vars['scalar'], self.main_cache,
+            reversible=False)
+        stored.add_stored([0], [1.5])
+        stored.sync()
+        self.storage.close()
+        assert_equal(self.writer.running, False)
+
+        self.storage = CVStorage(self.filename, mode='a')
+        assert_equal(self.storage.variables['scalar'][0:1].tolist(), [1.5])
+
+    @raises(RuntimeError)
+    def test_error(self):
+        def fail():
+            raise ValueError('failed')
+
+        self.writer.put(fail)
+        self.storage.flush()
+
+    def test_save_while_writing(self):
+        stored = cd.DenseStoredDict(
+            self.key_store, self.storage.vars['scalar'], self.main_cache,
+            reversible=False)
+        ensembles = [paths.LengthEnsemble(n) for n in range(20)]
+        for n, ensemble in enumerate(ensembles):
+            stored.add_stored(range(6), [float(n)] * 6)
+            stored.sync()
+            self.storage.ensembles.save(ensemble)
+
+        self.storage.flush()
+        assert_equal(len(self.storage.ensembles), 20)
+        self.storage.ensembles.clear_cache()
+        assert_equal([ensemble.length for ensemble in
+                      self.storage.ensembles[0:20]], range(20))
+        assert_equal(self.storage.variables['scalar'][:].tolist(),
+                     [19.0] * 6)
+
+    def test_save_waits_for_write(self):
+        running = threading.Event()
+        order = []
+
+        def write():
+            running.set()
+            time.sleep(0.1)
+            order.append('write')
+
+        self.writer.put(write)
+        running.wait()
+        # the writer holds the lock, so the save has to wait for it
+        self.storage.ensembles.save(paths.LengthEnsemble(2))
+        order.append('save')
+        self.storage.flush()
+        assert_equal(order, ['write', 'save'])
@@ -2,7 +2,11 @@
 @author David W.H. Swenson
 """
 
-from test_helpers import data_filename
+import os
+import tempfile
+
+from nose.tools import assert_equal
+from test_helpers import data_filename, make_toy_storage
 
 import mdtraj as md
 import numpy as np
@@ -57,4 +61,53 @@ class testCV_Function(object):
 
         assert params['cv_return_type'] == 'numpy.float32'
         assert params['cv_return_simtk_unit'] is None
-        assert params['cv_return_shape'] == tuple([2])
\ No newline at end of file
+        assert params['cv_return_shape'] == tuple([2])
+
+class testCV_Coordinates_Function(object):
+    def setup(self):
+        handle, self.filename = tempfile.mkstemp(suffix='.nc')
+        os.close(handle)
+        self.storage = make_toy_storage(self.filename, 5)
+        # distance of the atom from the origin
+        self.cv = op.CV_Coordinates_Function(
+            "r", np.linalg.norm, atom_indices=[0], cv_time_reversible=False,
+            axis=2
+        )
+
+    def teardown(self):
+        self.storage.close()
+        os.remove(self.filename)
+
+    def test_stored(self):
+        proxies = self.storage.snapshots.all()
+        coordinates = self.cv.coordinates(proxies[4:0:-1])
+        assert_equal(coordinates.dtype, np.float32)
+        assert_equal(coordinates.shape, (4, 1, 2))
+        assert_equal(coordinates[:, 0, 0].tolist(), [2.0, 1.0, 1.0, 0.0])
+        assert_equal(self.cv(proxies).tolist(),
+                     [0.0, 0.0, 1.0, 1.0, 2.0, 2.0, 3.0, 3.0, 4.0, 4.0])
+
+    def test_mixed(self):
+        proxies = self.storage.snapshots.all()
+        snapshot = paths.Snapshot(coordinates=np.array([[3.0, 4.0]]),
+                                  box_vectors=2.0 * np.identity(2))
+        items = [proxies[2], snapshot, proxies[6]]
+        assert_equal(self.cv(items).tolist(), [1.0, 5.0, 3.0])
+        box_vectors = self.cv.box_vectors(items)
+        assert_equal(box_vectors[:, 0, 0].tolist(), [1.0, 2.0, 1.0])
+
+    def test_box_vectors(self):
+        cv = op.CV_Coordinates_Function(
+            "box", lambda xyz, box: box[:, 0, :1] + xyz[:, 0, :1],
+            cv_requires_box_vectors=True
+        )
+        snapshot = paths.Snapshot(coordinates=np.array([[7.0, 1.0]]),
+                                  box_vectors=2.0 * np.identity(2))
+        assert_equal(cv(snapshot), 9.0)
+
+    def test_dict(self):
+        cv = op.CV_Coordinates_Function.from_dict(self.cv.to_dict())
+        assert_equal(cv.atom_indices, [0])
+        assert_equal(cv.requires_box_vectors, False)
+        assert_equal(cv.kwargs, {'axis': 2})
+        assert_equal(cv.f, np.linalg.norm)
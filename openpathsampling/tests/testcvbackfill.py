@@ -0,0 +1,113 @@
+import os
+import tempfile
+
+import numpy as np
+from nose.tools import assert_equal, raises
+from test_helpers import make_toy_storage
+
+import openpathsampling as paths
+from openpathsampling.cv_backfill import missing_indices, read_snapshot_block
+
+
+class Interrupt(Exception):
+    pass
+
+
+class SnapshotCV(paths.CollectiveVariable):
+    """CV that is storable without storing its function"""
+    _compare_keys = ['name']
+
+    def __init__(self, name, f, cv_time_reversible=False):
+        super(SnapshotCV, self).__init__(
+            name, cv_store_cache=True, cv_time_reversible=cv_time_reversible)
+        self.f = f
+
+    def _eval(self, items):
+        return self.f(items)
+
+
+class testComputeAll(object):
+    def setup(self):
+        handle, self.filename = tempfile.mkstemp(suffix='.nc')
+        os.close(handle)
+        self.storage = make_toy_storage(self.filename, 10)
+        self.cv_x = SnapshotCV('x', lambda s: s.coordinates[0][0],
+                               cv_time_reversible=True)
+        self.cv_v = SnapshotCV('v', lambda s: s.velocities[0][0])
+
+    def teardown(self):
+        self.storage.close()
+        os.remove(self.filename)
+
+    def values(self, cv):
+        return self.storage.cvs.cache_var(cv).variable[:].tolist()
+
+    def test_read_block(self):
+        block = read_snapshot_block(self.storage, [3, 4])
+        assert_equal(block['coordinates'][:, 0, 0].tolist(), [1.0, 2.0])
+        assert_equal(block['is_reversed'].tolist(), [True, False])
+        assert_equal(block['box_vectors_missing'].tolist(), [False, False])
+
+    def test_serial(self):
+        n_computed = self.cv_x.compute_all(self.storage, n_workers=1,
+                                           chunk=3, progress=False)
+        assert_equal(n_computed, 10)
+        assert_equal(self.values(self.cv_x),
+                     [float(i // 2) for i in range(20)])
+        assert_equal(len(missing_indices(self.cv_x, self.storage)), 0)
+
+    def test_workers(self):
+        n_computed = self.cv_v.compute_all(self.storage, n_workers=3,
+                                           chunk=4, progress=False)
+        assert_equal(n_computed, 20)
+        assert_equal(self.values(self.cv_v), [1.0, -1.0] * 10)
+
+    def test_resume(self):
+        progress = []
+
+        def interrupt(n_done, n_total):
+            progress.append((n_done, n_total))
+            raise Interrupt()
+
+        try:
+            self.cv_v.compute_all(self.storage, n_workers=1, chunk=8,
+                                  progress=interrupt)
+        except Interrupt:
+            pass
+
+        assert_equal(progress, [(8, 20)])
+        assert_equal(missing_indices(self.cv_v, self.storage).tolist(),
+                     range(8, 20))
+        assert_equal(self.cv_v.compute_all(self.storage, n_workers=1,
+                                           progress=False), 12)
+        assert_equal(self.values(self.cv_v), [1.0, -1.0] * 10)
+
+    @raises(RuntimeError)
+    def test_worker_error(self):
+        def fail(snapshot):
+            # the template snapshot is evaluated when the cv is saved
+            if snapshot.coordinates[0][0] > 2.0:
+                raise ValueError()
+            return 0.0
+
+        cv = SnapshotCV('fail', fail)
+        cv.compute_all(self.storage, n_workers=2, chunk=4, progress=False)
+
+    def test_worker_died(self):
+        parent = os.getpid()
+
+        def crash(snapshot):
+            # like the OOM killer: the worker ends without an exception
+            if os.getpid() != parent and snapshot.coordinates[0][0] > 2.0:
+                os._exit(3)
+            return 0.0
+
+        cv = SnapshotCV('crash', crash)
+        try:
+            cv.compute_all(self.storage, n_workers=2, chunk=4,
+                           progress=False)
+        except RuntimeError as error:
+            assert_equal('exit code 3' in str(error), True)
+            assert_equal('chunk' in str(error), True)
+        else:
+            raise AssertionError('RuntimeError not raised')
@@ -0,0 +1,86 @@
+import numpy as np
+from nose.tools import assert_equal
+from test_helpers import make_1d_traj, CalvinistDynamics
+
+import openpathsampling as paths
+
+
+class testCVGroup(object):
+    def setup(self):
+        self.calls = []
+
+        def x(xyz):
+            self.calls.append(('x', id(xyz), len(xyz)))
+            return xyz[:, 0, :1]
+
+        def x_squared(xyz):
+            self.calls.append(('x2', id(xyz), len(xyz)))
+            return xyz[:, 0, :1] ** 2
+
+        self.cv_x = paths.CV_Coordinates_Function("x", x)
+        self.cv_x2 = paths.CV_Coordinates_Function("x2", x_squared)
+        self.cv_f = paths.CV_Function("f", lambda snap: snap.coordinates[0][0])
+        self.traj = make_1d_traj(coordinates=[0.0, 1.0, 2.0, 3.0],
+                                 velocities=[1.0]*4)
+
+    def test_shared(self):
+        group = paths.CVGroup([self.cv_x, self.cv_x2])
+        assert_equal(group.shares_inputs, True)
+        x, x2 = group(self.traj)
+        assert_equal(x.tolist(), [0.0, 1.0, 2.0, 3.0])
+        assert_equal(x2.tolist(), [0.0, 1.0, 4.0, 9.0])
+        # both functions got the same coordinate array
+        assert_equal(len(self.calls), 2)
+        assert_equal(self.calls[0][1], self.calls[1][1])
+
+    def test_cached(self):
+        group = paths.CVGroup([self.cv_x, self.cv_x2])
+        group(self.traj)
+        assert_equal(self.cv_x2(self.traj).tolist(), [0.0, 1.0, 4.0, 9.0])
+        assert_equal(self.cv_x(self.traj[2]), 2.0)
+        group(self.traj)
+        assert_equal(len(self.calls), 2)
+
+    def test_partial(self):
+        self.cv_x(self.traj[0:2])
+        group = paths.CVGroup([self.cv_x, self.cv_x2])
+        x, x2 = group(self.traj)
+        assert_equal(x.tolist(), [0.0, 1.0, 2.0, 3.0])
+        assert_equal(x2.tolist(), [0.0, 1.0, 4.0, 9.0])
+        # the snapshots missing for either CV are computed once for both
+        assert_equal([call[2] for call in self.calls], [2, 4, 4])
+        assert_equal(group(self.traj[3])[1], 9.0)
+
+    def test_other_cvs(self):
+        group = paths.CVGroup([self.cv_f, self.cv_x])
+        assert_equal(group.shares_inputs, False)
+        f, x = group(self.traj)
+        assert_equal(list(f), [0.0, 1.0, 2.0, 3.0])
+        assert_equal(x.tolist(), [0.0, 1.0, 2.0, 3.0])
+
+    def test_referenced_by(self):
+        vol_x = paths.CVRangeVolume(self.cv_x, -0.5, 0.5)
+        vol_x2 = paths.CVRangeVolume(self.cv_x2, 4.5, 10.0)
+        ensemble = paths.SequentialEnsemble([
+            paths.AllInXEnsemble(vol_x) & paths.LengthEnsemble(1),
+            paths.AllOutXEnsemble(vol_x | vol_x2),
+            paths.AllInXEnsemble(vol_x2 | paths.CVRangeVolume(self.cv_f,
+                                                                0.0, 1.0))
+        ])
+        group = paths.CVGroup.referenced_by([ensemble.can_append])
+        assert_equal(group.cvs, [self.cv_x, self.cv_x2, self.cv_f])
+
+    def test_engine(self):
+        vol_x = paths.CVRangeVolume(self.cv_x, 2.0, 3.0)
+        vol_x2 = paths.CVRangeVolume(self.cv_x2, 0.2, 1.0)
+        ensemble = paths.AllOutXEnsemble(vol_x | vol_x2)
+        engine = CalvinistDynamics([0.1, 0.3, 0.5, 0.7, 0.9, 1.1])
+        engine.options['check_stride'] = 2
+        snapshot = make_1d_traj(coordinates=[0.1], velocities=[1.0])[0]
+        traj = engine.generate(snapshot, [ensemble.can_append])
+        assert_equal(len(traj), 3)
+        # the CVs of each check are computed together
+        assert_equal([call[2] for call in self.calls if call[0] == 'x'],
+                     [1, 2])
+        assert_equal([call[2] for call in self.calls if call[0] == 'x2'],
+                     [1, 2])
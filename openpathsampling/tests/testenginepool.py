@@ -0,0 +1,137 @@
+import os
+
+import numpy as np
+
+from nose.tools import (assert_equal, assert_not_equal, assert_items_equal,
+                        raises)
+from test_helpers import true_func
+
+import openpathsampling as paths
+from openpathsampling.engine_pool import EnginePool
+from openpathsampling.toy_dynamics.toy_pes import Gaussian, OuterWalls
+from openpathsampling.toy_dynamics.toy_integrators import \
+    LeapfrogVerletIntegrator
+from openpathsampling.toy_dynamics.toy_engine import ToyEngine
+from openpathsampling.topology import ToyTopology
+from openpathsampling.snapshot import Snapshot
+
+
+def fail_func(traj, trusted=True):
+    raise ValueError("failing on purpose")
+
+
+def exit_func(traj, trusted=True):
+    # like a crash in native code: the worker ends without an exception
+    os._exit(3)
+
+
+class testEnginePool(object):
+    def setup(self):
+        self.default_engine = paths.EngineMover.engine
+        pes = OuterWalls([1.0, 1.0], [0.0, 0.0]) + \
+                Gaussian(2.0, [1.0, 1.0], [0.0, 0.0])
+        topology = ToyTopology(
+            n_spatial=2,
+            masses=np.array([1.0, 1.0]),
+            pes=pes
+        )
+        template = Snapshot(
+            coordinates=np.array([[0.0, 0.0]]),
+            velocities=np.array([[0.0, 0.0]]),
+            potential_energy=0.0,
+            kinetic_energy=0.0,
+            topology=topology
+        )
+        self.engine = ToyEngine(
+            options={'integ' : LeapfrogVerletIntegrator(dt=0.01),
+                     'n_frames_max' : 6,
+                     'nsteps_per_frame' : 5},
+            template=template
+        )
+        self.snapshots = []
+        for pos, vel in [([0.5, 0.1], [0.3, -0.2]),
+                         ([-0.2, 0.4], [0.1, 0.5]),
+                         ([0.1, -0.3], [-0.4, 0.2])]:
+            self.engine.positions = np.array(pos)
+            self.engine.velocities = np.array(vel)
+            self.snapshots.append(self.engine.current_snapshot)
+        self.pool = EnginePool(self.engine, n_workers=2)
+
+    def teardown(self):
+        paths.EngineMover.engine = self.default_engine
+
+    def test_options_from_engine(self):
+        assert_equal(self.pool.n_frames_max, 6)
+        assert_equal(self.pool.template, self.engine.template)
+
+    def test_set_as_default(self):
+        self.pool.set_as_default()
+        assert_equal(paths.EngineMover.engine, self.pool)
+
+    def test_generate_batch(self):
+        for direction in [+1, -1]:
+            running = [[true_func]] * len(self.snapshots)
+            pooled = self.pool.generate_batch(self.snapshots, running,
+                                              direction)
+            for snapshot, trajectory in zip(self.snapshots, pooled):
+                expected = self.engine.generate(snapshot, [true_func],
+                                                direction)
+                assert_equal(len(trajectory), len(expected))
+                # the initial snapshot is reused, not copied
+                if direction > 0:
+                    assert_equal(trajectory[0] is snapshot, True)
+                else:
+                    assert_equal(trajectory[-1] is snapshot, True)
+                for (pool_snap, snap) in zip(trajectory, expected):
+                    np.testing.assert_allclose(pool_snap.coordinates,
+                                               snap.coordinates)
+                    np.testing.assert_allclose(pool_snap.velocities,
+                                               snap.velocities)
+
+    def test_generate_many(self):
+        max_len = lambda n: (lambda traj, trusted=True: len(traj) < n)
+        results = dict(self.pool.generate_many(
+            self.snapshots, [max_len(2), max_len(4), true_func]
+        ))
+        assert_items_equal(results.keys(), [0, 1, 2])
+        assert_equal([len(results[idx]) for idx in range(3)], [2, 4, 6])
+
+    def test_n_frames_max(self):
+        trajectories = self.pool.generate_batch(self.snapshots,
+                                                n_frames_max=[2, None, 8])
+        # the option of the engine still applies
+        assert_equal([len(traj) for traj in trajectories], [2, 6, 6])
+
+    def test_timing(self):
+        self.engine.options['timing'] = True
+        for pool in [self.pool, EnginePool(self.engine, n_workers=1)]:
+            trajectories = pool.generate_batch(self.snapshots,
+                                               n_frames_max=[2, 3, 4])
+            assert_equal(len(pool.last_timings), 3)
+            for trajectory, timing in zip(trajectories, pool.last_timings):
+                assert_equal(timing.n_frames, len(trajectory))
+                assert_equal(timing.counts['dynamics'], len(trajectory) - 1)
+
+        self.engine.options['timing'] = False
+        self.pool.generate_batch(self.snapshots)
+        assert_equal(self.pool.last_timings, None)
+
+    def test_single_worker(self):
+        pool = EnginePool(self.engine, n_workers=1)
+        results = list(pool.generate_many(self.snapshots[:2]))
+        assert_equal([idx for (idx, traj) in results], [0, 1])
+
+    def test_worker_died(self):
+        try:
+            self.pool.generate_batch(self.snapshots,
+                                     [true_func, exit_func, true_func])
+        except RuntimeError as error:
+            assert_equal('exit code 3' in str(error), True)
+            assert_equal('trajectory 1' in str(error), True)
+        else:
+            raise AssertionError('RuntimeError not raised')
+
+    @raises(RuntimeError)
+    def test_worker_error(self):
+        self.pool.generate_batch(self.snapshots,
+                                 [true_func, fail_func, true_func])
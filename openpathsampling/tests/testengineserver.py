@@ -0,0 +1,107 @@
+import numpy as np
+
+from nose.tools import (assert_equal, assert_not_equal, assert_items_equal,
+                        raises)
+from test_helpers import true_func
+
+import openpathsampling as paths
+from openpathsampling.engine_server import RemoteEngine
+from openpathsampling.toy_dynamics.toy_pes import Gaussian, OuterWalls
+from openpathsampling.toy_dynamics.toy_integrators import \
+    LeapfrogVerletIntegrator
+from openpathsampling.toy_dynamics.toy_engine import ToyEngine
+from openpathsampling.topology import ToyTopology
+from openpathsampling.snapshot import Snapshot
+
+
+def fail_func(traj, trusted=True):
+    raise ValueError("failing on purpose")
+
+
+class testRemoteEngine(object):
+    def setup(self):
+        self.default_engine = paths.EngineMover.engine
+        pes = OuterWalls([1.0, 1.0], [0.0, 0.0]) + \
+                Gaussian(2.0, [1.0, 1.0], [0.0, 0.0])
+        topology = ToyTopology(
+            n_spatial=2,
+            masses=np.array([1.0, 1.0]),
+            pes=pes
+        )
+        template = Snapshot(
+            coordinates=np.array([[0.0, 0.0]]),
+            velocities=np.array([[0.0, 0.0]]),
+            potential_energy=0.0,
+            kinetic_energy=0.0,
+            topology=topology
+        )
+        self.engine = ToyEngine(
+            options={'integ' : LeapfrogVerletIntegrator(dt=0.01),
+                     'n_frames_max' : 8,
+                     'nsteps_per_frame' : 5},
+            template=template
+        )
+        self.engine.positions = np.array([0.5, 0.1])
+        self.engine.velocities = np.array([0.3, -0.2])
+        self.snapshot = self.engine.current_snapshot
+        self.remote = RemoteEngine(self.engine, lookahead=3)
+
+    def teardown(self):
+        self.remote.close()
+        paths.EngineMover.engine = self.default_engine
+
+    def test_options_from_engine(self):
+        assert_equal(self.remote.n_frames_max, 8)
+        assert_equal(self.remote.template, self.engine.template)
+        # a new engine is the default engine
+        assert_equal(paths.EngineMover.engine, self.remote)
+
+    def _assert_same(self, remote, local):
+        assert_equal(len(remote), len(local))
+        for (remote_snap, snap) in zip(remote, local):
+            np.testing.assert_allclose(remote_snap.coordinates,
+                                       snap.coordinates)
+            np.testing.assert_allclose(remote_snap.velocities,
+                                       snap.velocities)
+
+    def test_generate(self):
+        for direction in [+1, -1]:
+            remote = self.remote.generate(self.snapshot, [true_func],
+                                          direction)
+            local = self.engine.generate(self.snapshot, [true_func],
+                                         direction)
+            self._assert_same(remote, local)
+
+    def test_generate_stops_ahead_of_server(self):
+        max_len = lambda traj, trusted=True: len(traj) < 3
+        # the server runs ahead, but the extra frames are dropped
+        for _ in range(2):
+            remote = self.remote.generate(self.snapshot, [max_len])
+            local = self.engine.generate(self.snapshot, [max_len])
+            assert_equal(len(remote), 3)
+            self._assert_same(remote, local)
+
+    def test_generate_after_failed_condition(self):
+        try:
+            self.remote.generate(self.snapshot, [fail_func])
+        except ValueError:
+            pass
+        remote = self.remote.generate(self.snapshot, [true_func])
+        local = self.engine.generate(self.snapshot, [true_func])
+        self._assert_same(remote, local)
+
+    def test_defer(self):
+        done = []
+        self.remote.defer(lambda: done.append(1))
+        self.remote.defer(lambda: done.append(2))
+        self.remote.generate(self.snapshot, [true_func])
+        assert_equal(done, [1, 2])
+
+        self.remote.defer(lambda: done.append(3))
+        self.remote.run_deferred()
+        assert_equal(done, [1, 2, 3])
+
+    def test_defer_local_engine(self):
+        done = []
+        self.engine.defer(lambda: done.append(1))
+        assert_equal(done, [1])
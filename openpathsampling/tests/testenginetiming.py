@@ -0,0 +1,53 @@
+import numpy as np
+from nose.tools import assert_equal, assert_almost_equal
+
+import openpathsampling as paths
+from openpathsampling.engine_timing import GenerationTiming
+from openpathsampling.collectivevariable import CV_Function
+
+
+class testGenerationTiming(object):
+    def setup(self):
+        self.timing = GenerationTiming()
+        self.timing.add('total', 2.0)
+        self.timing.add('dynamics', 1.0, 5)
+        self.timing.add('dynamics', 0.5, 5)
+        self.timing.n_frames = 11
+
+    def test_add(self):
+        assert_almost_equal(self.timing.times['dynamics'], 1.5)
+        assert_equal(self.timing.counts['dynamics'], 10)
+        assert_equal(self.timing.counts['total'], 1)
+
+    def test_sum(self):
+        other = GenerationTiming({'dynamics': 0.5, 'cv': 0.1},
+                                 {'dynamics': 2, 'cv': 4}, 3)
+        both = self.timing + other
+        assert_almost_equal(both.times['dynamics'], 2.0)
+        assert_equal(both.counts['dynamics'], 12)
+        assert_equal(both.counts['cv'], 4)
+        assert_equal(both.n_frames, 14)
+        # the summands are not changed
+        assert_almost_equal(self.timing.times['dynamics'], 1.5)
+
+    def test_str(self):
+        report = str(self.timing)
+        assert_equal('dynamics' in report, True)
+        assert_equal('75.0%' in report, True)
+
+    def test_dict(self):
+        copy = GenerationTiming.from_dict(self.timing.to_dict())
+        assert_equal(copy.times, self.timing.times)
+        assert_equal(copy.counts, self.timing.counts)
+        assert_equal(copy.n_frames, 11)
+
+    def test_current(self):
+        GenerationTiming.add_current('cv', 1.0)
+        GenerationTiming.current = self.timing
+        try:
+            cv = CV_Function("timed_x", lambda snap: snap.coordinates[0][0])
+            cv(paths.Snapshot(coordinates=np.array([[1.0, 2.0]])))
+            GenerationTiming.add_current('cv', 1.0)
+        finally:
+            GenerationTiming.current = None
+        assert_equal(self.timing.counts['cv'], 2)
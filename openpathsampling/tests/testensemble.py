@@ -991,6 +991,8 @@ class testSequentialEnsembleCache(EnsembleCacheTest):
             self.outX,
             self.inX & self.length1 
         ])
+        # these tests are about the cache of the search without automaton
+        self.pseudo_minus._use_automaton = False
         self.traj = ttraj['lower_in_out_in_in_out_in']
 
     def test_all_in_as_seq_can_append(self):
@@ -1401,6 +1403,14 @@ class testPrefixTrajectoryEnsemble(EnsembleTest):
         assert_equal(ens.can_append(traj[2:3]), True)
         assert_equal(ens(traj[2:3]), True)
 
+    def test_view_without_copy(self):
+        traj = ttraj['upper_in_in_in']
+        start = traj[0:2]
+        ens = PrefixTrajectoryEnsemble(SequentialEnsemble([self.inX]), start)
+        partial = traj[2:3]
+        assert_equal(ens.can_append(partial), True)
+        assert_equal(ens._cached_trajectory.first is start, True)
+        assert_equal(ens._cached_trajectory.second is partial, True)
 
     def test_caching_in_fwdapp_seq(self):
         inX = AllInXEnsemble(vol1)
@@ -1636,6 +1646,164 @@ class testSingleEnsembleSequentialEnsemble(EnsembleTest):
             
 
 
+class testSequentialAutomaton(EnsembleTest):
+    def setUp(self):
+        inX = AllInXEnsemble(vol1)
+        outX = AllOutXEnsemble(vol1)
+        length1 = LengthEnsemble(1)
+        self.ensemble_fcns = [
+            lambda: SequentialEnsemble([inX & length1, outX,
+                                        inX & length1]),
+            lambda: SequentialEnsemble([
+                inX & length1, outX & PartOutXEnsemble(vol2),
+                inX & length1, AllInXEnsemble(vol2) | LengthEnsemble(0),
+                outX & PartOutXEnsemble(vol2), inX & length1
+            ]),
+            lambda: paths.TISEnsemble(vol1, vol3, vol2),
+            lambda: paths.MinusInterfaceEnsemble(vol1, vol2, n_l=3),
+            lambda: SequentialEnsemble([
+                OptionalEnsemble(inX),
+                outX & ExitsXEnsemble(vol2),
+                SingleFrameEnsemble(AllInXEnsemble(vol3))
+            ]),
+            lambda: SequentialEnsemble([
+                inX,
+                LengthEnsemble(slice(2, 5)) & NegatedEnsemble(inX),
+                PartInXEnsemble(vol3) & EntersXEnsemble(vol3)
+            ])
+        ]
+        # in vol2 only, in vol1 and vol2, in none, in vol3
+        values = [0.0, 0.3, 1.0, 2.2]
+        rng = random.Random(5)
+        self.trajs = []
+        for i in range(60):
+            n_frames = rng.randint(0, 9)
+            coords = [rng.choice(values) for j in range(n_frames)]
+            self.trajs.append(make_1d_traj(coordinates=coords,
+                                           velocities=[1.0]*n_frames))
+
+    def _searched(self, ensemble_fcn):
+        # a new ensemble without automaton, so that no cache is involved
+        ensemble = ensemble_fcn()
+        ensemble._use_automaton = False
+        return ensemble
+
+    def test_compile(self):
+        for ensemble_fcn in self.ensemble_fcns:
+            ensemble = ensemble_fcn()
+            assert_not_equal(ensemble._automaton(+1), None)
+            assert_not_equal(ensemble._automaton(-1), None)
+
+    def test_not_compilable(self):
+        inner = SequentialEnsemble([AllInXEnsemble(vol1),
+                                    AllOutXEnsemble(vol1)])
+        ensemble = SequentialEnsemble([inner, AllInXEnsemble(vol1)])
+        assert_equal(ensemble._automaton(+1), None)
+        assert_not_equal(inner._automaton(+1), None)
+        traj = ttraj['upper_in_out_in']
+        assert_equal(ensemble(traj), True)
+        assert_equal(ensemble.can_append(traj), True)
+
+    def test_call(self):
+        for ensemble_fcn in self.ensemble_fcns:
+            ensemble = ensemble_fcn()
+            for traj in self.trajs:
+                failmsg = "Failure in " + str([s.coordinates[0][0]
+                                               for s in traj]) + ": "
+                self._single_test(ensemble, traj,
+                                  self._searched(ensemble_fcn)(traj),
+                                  failmsg)
+
+    def test_can_append(self):
+        for ensemble_fcn in self.ensemble_fcns:
+            ensemble = ensemble_fcn()
+            for traj in self.trajs:
+                for i in range(1, len(traj)+1):
+                    failmsg = "Failure in " + str(
+                        [s.coordinates[0][0] for s in traj[0:i]]) + ": "
+                    self._single_test(
+                        ensemble.can_append, traj[0:i],
+                        self._searched(ensemble_fcn).can_append(traj[0:i]),
+                        failmsg
+                    )
+
+    def test_can_prepend(self):
+        for ensemble_fcn in self.ensemble_fcns:
+            ensemble = ensemble_fcn()
+            for traj in self.trajs:
+                n_frames = len(traj)
+                for i in range(n_frames-1, -1, -1):
+                    subtraj = traj[i:n_frames]
+                    failmsg = "Failure in " + str(
+                        [s.coordinates[0][0] for s in subtraj]) + ": "
+                    self._single_test(
+                        ensemble.can_prepend, subtraj,
+                        self._searched(ensemble_fcn).can_prepend(subtraj),
+                        failmsg
+                    )
+
+    def test_incremental(self):
+        ensemble = paths.TISEnsemble(vol1, vol3, vol2)
+        automaton = ensemble._automaton(+1)
+        traj = make_1d_traj(coordinates=[0.3] + [1.0]*50 + [0.3],
+                            velocities=[1.0]*52)
+        for i in range(1, len(traj)):
+            assert_equal(ensemble.can_append(traj[0:i]), True)
+        assert_equal(ensemble.can_append(traj), False)
+        assert_equal(ensemble(traj), True)
+        # the states do not depend on the length of the trajectory
+        assert_equal(automaton.n_states < 10, True)
+
+
+class testAdaptiveShortCircuit(EnsembleTest):
+    def setUp(self):
+        Ensemble.adaptive_shortcircuit = True
+        self.ensembles = [
+            join_ensembles([AllInXEnsemble(vol1), PartInXEnsemble(vol3),
+                            LengthEnsemble(3), AllOutXEnsemble(vol2)]),
+            IntersectionEnsemble(
+                IntersectionEnsemble(PartOutXEnsemble(vol1),
+                                     PartInXEnsemble(vol1)),
+                LengthEnsemble(slice(3, 6)) | AllInXEnsemble(vol2)
+            )
+        ]
+
+    def tearDown(self):
+        Ensemble.adaptive_shortcircuit = False
+
+    def test_flatten(self):
+        union = self.ensembles[0]
+        order = union._adaptive_order('__call__', False)
+        assert_equal(len(order.operands), 4)
+        assert_equal(order.decisive, True)
+        intersection = self.ensembles[1]
+        order = intersection._adaptive_order('can_append', None)
+        assert_equal(len(order.operands), 3)
+        assert_equal(order.decisive, False)
+
+    def test_same_results(self):
+        for ensemble in self.ensembles:
+            for order in ensemble._adaptive_order('__call__', False), \
+                    ensemble._adaptive_order('can_append', False), \
+                    ensemble._adaptive_order('can_prepend', False):
+                order.reorder_interval = 5
+            for test in sorted(ttraj.keys()):
+                traj = ttraj[test]
+                adaptive = (ensemble(traj), ensemble.can_append(traj),
+                            ensemble.can_prepend(traj))
+                Ensemble.adaptive_shortcircuit = False
+                expected = (ensemble(traj), ensemble.can_append(traj),
+                            ensemble.can_prepend(traj))
+                Ensemble.adaptive_shortcircuit = True
+                assert_equal(adaptive, expected)
+
+    def test_trusted_not_reordered(self):
+        ensemble = self.ensembles[0]
+        assert_equal(ensemble._adaptive_order('can_append', True), None)
+        Ensemble.adaptive_shortcircuit = False
+        assert_equal(ensemble._adaptive_order('__call__', False), None)
+
+
 class testEnsembleSplit(EnsembleTest):
     def setUp(self):
         self.inA = AllInXEnsemble(vol1)
@@ -1667,6 +1835,65 @@ class testEnsembleSplit(EnsembleTest):
         assert_equal(len(subtrajs_out_2[0]), 1)
         assert_equal(len(subtrajs_out_2[1]), 1)
 
+    def test_split_automaton(self):
+        ensemble_fcns = [
+            lambda: AllInXEnsemble(vol1),
+            lambda: AllOutXEnsemble(vol1),
+            lambda: PartInXEnsemble(vol3) & LengthEnsemble(slice(2, 6)),
+            lambda: OptionalEnsemble(
+                AllOutXEnsemble(vol2) - EntersXEnsemble(vol3)
+            ),
+            lambda: paths.TISEnsemble(vol1, vol3, vol2),
+            lambda: paths.MinusInterfaceEnsemble(vol1, vol2)
+        ]
+        values = [0.0, 0.3, 1.0, 2.2]
+        rng = random.Random(7)
+        trajs = []
+        for i in range(30):
+            n_frames = rng.randint(0, 20)
+            coords = [rng.choice(values) for j in range(n_frames)]
+            trajs.append(make_1d_traj(coordinates=coords,
+                                      velocities=[1.0]*n_frames))
+
+        for ensemble_fcn in ensemble_fcns:
+            ensemble = ensemble_fcn()
+            assert_not_equal(ensemble._automaton(+1), None)
+            for traj in trajs:
+                for (min_length, overlap) in [(1, 1), (1, 0), (3, 2)]:
+                    searched = ensemble_fcn()
+                    searched._use_automaton = False
+                    assert_equal(
+                        ensemble.find_valid_slices(traj,
+                                                   min_length=min_length,
+                                                   overlap=overlap),
+                        searched.find_valid_slices(traj,
+                                                   min_length=min_length,
+                                                   overlap=overlap)
+                    )
+            assert_equal(
+                [list(t) for t in ensemble.split(trajs[0])],
+                [list(t) for t in searched.split(trajs[0])]
+            )
+
+    def test_split_long(self):
+        ensemble = paths.TISEnsemble(vol1, vol3, vol2)
+        # 100 excursions from vol1 that do not cross the interface
+        traj = make_1d_traj(coordinates=([0.3] + [0.6]*20) * 100 + [0.3],
+                            velocities=[1.0]*2102)
+        assert_equal(ensemble.split(traj), [])
+        assert_equal(ensemble._automaton(+1).n_states < 20, True)
+
+        traj = make_1d_traj(coordinates=[0.3, 1.0, 2.2, 1.0, 0.3] * 100,
+                            velocities=[1.0]*500)
+        subtrajs = ensemble.split(traj)
+        assert_equal(len(subtrajs), 100)
+        assert_equal(set([len(t) for t in subtrajs]), set([3]))
+
+    def test_split_not_compilable(self):
+        ensemble = PrefixTrajectoryEnsemble(self.inA,
+                                            ttraj['upper_in_out_in'])
+        assert_equal(ensemble._automaton(+1), None)
+
 class testAbstract(object):
     @raises_with_message_like(TypeError, "Can't instantiate abstract class")
     def test_abstract_ensemble(self):
@@ -0,0 +1,98 @@
+import logging
+
+from nose.tools import assert_equal, raises
+from test_helpers import make_1d_traj
+
+import openpathsampling as paths
+
+
+class testEnsembleProfiler(object):
+    def setup(self):
+        op = paths.CV_Function("Id", lambda snap : snap.coordinates[0][0])
+        self.vol_a = paths.CVRangeVolume(op, -0.5, 0.1)
+        self.vol_b = paths.CVRangeVolume(op, 0.5, 1.0)
+        self.in_a = paths.AllInXEnsemble(self.vol_a)
+        self.out_a = paths.AllOutXEnsemble(self.vol_a)
+        self.hit_b = paths.PartInXEnsemble(self.vol_b)
+        self.traj = make_1d_traj(coordinates=[0.0, 0.2, 0.6, 0.2],
+                                 velocities=[1.0]*4)
+
+    def teardown(self):
+        paths.EnsembleProfiler.active = None
+
+    def test_counts(self):
+        ensemble = self.in_a | self.hit_b
+        with paths.EnsembleProfiler() as profiler:
+            assert_equal(ensemble(self.traj), True)
+            assert_equal(ensemble.can_append(self.traj[0:1], trusted=True),
+                         True)
+
+        union = profiler.profile(ensemble)
+        assert_equal(union.calls, {'__call__': 1, 'can_append': 1})
+        assert_equal((union.trusted, union.untrusted), (1, 1))
+        assert_equal(union.frames, 0)
+        in_a = profiler.profile(self.in_a)
+        assert_equal(in_a.n_calls, 3)
+        assert_equal(in_a.frames, 5)
+        assert_equal(profiler.profile(self.hit_b).calls, {'__call__': 1})
+        assert_equal(union.time >= union.self_time >= 0.0, True)
+
+    def test_counts_debug_logging(self):
+        # debug logging must not evaluate the short-circuited ensemble
+        logger = logging.getLogger('openpathsampling.ensemble')
+        level = logger.level
+        logger.setLevel(logging.DEBUG)
+        try:
+            ensemble = self.in_a | self.hit_b
+            with paths.EnsembleProfiler() as profiler:
+                ensemble.can_append(self.traj[0:1], trusted=True)
+        finally:
+            logger.setLevel(level)
+        assert_equal(profiler.profile(self.hit_b).n_calls, 0)
+
+    def test_stop_restores_methods(self):
+        call = paths.AllInXEnsemble.__dict__['__call__']
+        check = paths.ensemble.EnsembleCache.__dict__['check']
+        profiler = paths.EnsembleProfiler().start()
+        assert_equal(paths.AllInXEnsemble.__dict__['__call__'] is call, False)
+        profiler.stop()
+        assert_equal(paths.AllInXEnsemble.__dict__['__call__'] is call, True)
+        assert_equal(paths.ensemble.EnsembleCache.__dict__['check'] is check,
+                     True)
+        # nothing is recorded after stopping
+        self.in_a(self.traj)
+        assert_equal(profiler.profiles, {})
+
+    def test_resets(self):
+        ensemble = paths.SequentialEnsemble([self.in_a, self.out_a])
+        ensemble._use_automaton = False
+        with paths.EnsembleProfiler() as profiler:
+            for i in range(1, len(self.traj) + 1):
+                ensemble.can_append(self.traj[0:i])
+            ensemble.can_append(self.traj[1:])
+        profile = profiler.profile(ensemble)
+        assert_equal(profile.calls, {'can_append': 5})
+        assert_equal(profile.resets, 2)
+
+    def test_report(self):
+        ensemble = paths.SequentialEnsemble(
+            [self.in_a, self.out_a & paths.LengthEnsemble(3)]
+        )
+        other = paths.LengthEnsemble(2)
+        with paths.EnsembleProfiler() as profiler:
+            ensemble(self.traj)
+            other(self.traj)
+        lines = profiler.report().split('\n')
+        assert_equal(lines[0].split()[0], 'calls')
+        labels = [line[line.index('  ', 60):] for line in lines[1:]]
+        assert_equal(labels[0].strip().startswith('SequentialEnsemble'), True)
+        assert_equal(labels[1].startswith('    x[t] in'), True)
+        assert_equal(labels[2].strip().startswith('IntersectionEnsemble'),
+                     True)
+        assert_equal(len(lines), 7)
+        assert_equal(profiler.report(other).split('\n')[1].split()[0], '1')
+
+    @raises(RuntimeError)
+    def test_one_profiler(self):
+        with paths.EnsembleProfiler():
+            paths.EnsembleProfiler().start()
@@ -0,0 +1,69 @@
+import random
+
+from nose.tools import assert_equal, raises
+from test_helpers import make_1d_traj
+
+import openpathsampling as paths
+from openpathsampling.ensemble import SequentialEnsemble
+
+
+class testEnsembleSet(object):
+    def setup(self):
+        op = paths.CV_Function("Id", lambda snap : snap.coordinates[0][0])
+        self.stateA = paths.CVRangeVolume(op, -0.5, 0.1)
+        self.stateB = paths.CVRangeVolume(op, 2.0, 2.5)
+        self.interfaces = [paths.CVRangeVolume(op, -0.5, lmax)
+                           for lmax in [0.1, 0.3, 0.6, 1.0]]
+        # an interface that is not a single range
+        self.interfaces.append(paths.CVRangeVolume(op, -0.5, 0.6) |
+                               paths.CVRangeVolume(op, 1.2, 1.4))
+        self.ensembles = paths.EnsembleFactory.TISEnsembleSet(
+            self.stateA, self.stateB, self.interfaces, op
+        )
+        self.minus = paths.MinusInterfaceEnsemble(self.stateA,
+                                                  self.interfaces[0])
+        self.ensemble_set = paths.EnsembleSet(self.ensembles + [self.minus])
+
+    def test_equal_to_ensembles(self):
+        values = [-0.2, 0.05, 0.2, 0.5, 0.8, 1.3, 1.7, 2.2]
+        rng = random.Random(3)
+        n_accepted = 0
+        for i in range(200):
+            n_frames = rng.randint(0, 8)
+            traj = make_1d_traj(
+                coordinates=[rng.choice(values) for j in range(n_frames)],
+                velocities=[1.0]*n_frames
+            )
+            searched = [SequentialEnsemble.__call__(ens, traj)
+                        for ens in self.ensemble_set.ensembles]
+            assert_equal(self.ensemble_set(traj), searched)
+            n_accepted += sum(searched)
+        assert_equal(n_accepted > 0, True)
+
+    def test_call_uses_set(self):
+        traj = make_1d_traj(coordinates=[0.0, 0.5, 0.7, 0.0],
+                            velocities=[1.0]*4)
+        assert_equal(self.ensembles[0]._ensemble_set is not None, True)
+        assert_equal([ens(traj) for ens in self.ensembles],
+                     [True, True, True, False, True])
+
+    def test_cache(self):
+        traj = make_1d_traj(coordinates=[0.0, 0.5, 0.7],
+                            velocities=[1.0]*3)
+        assert_equal(self.ensemble_set(traj)[0], False)
+        assert_equal(len(self.ensemble_set._cache), 1)
+        # a changed trajectory is evaluated again
+        traj.append(make_1d_traj(coordinates=[0.0], velocities=[1.0])[0])
+        assert_equal(self.ensemble_set(traj)[0], True)
+        assert_equal(len(self.ensemble_set._cache), 1)
+
+    def test_transition(self):
+        transition = paths.TISTransition(self.stateA, self.stateB,
+                                         self.interfaces[:3])
+        ensemble_set = transition.ensembles[0]._ensemble_set
+        assert_equal(ensemble_set.ensembles, transition.ensembles)
+
+    @raises(ValueError)
+    def test_contains_other_ensemble(self):
+        traj = make_1d_traj(coordinates=[0.0], velocities=[1.0])
+        self.ensemble_set.contains(paths.LengthEnsemble(1), traj)
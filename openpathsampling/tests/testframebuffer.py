@@ -0,0 +1,117 @@
+import numpy as np
+
+from nose.tools import (assert_equal, assert_not_equal, assert_items_equal,
+                        assert_almost_equal, raises)
+
+from openpathsampling.frame_buffer import FrameBuffer
+
+
+class testFrameBuffer(object):
+    def setup(self):
+        self.n_calls = 0
+
+        def energies(coordinates, velocities):
+            self.n_calls += 1
+            return (coordinates.sum(axis=(1, 2)),
+                    0.5 * (velocities ** 2).sum(axis=(1, 2)))
+
+        self.buffer = FrameBuffer((2, 3), energies=energies, capacity=2)
+        for i in range(5):
+            self.buffer.append(np.ones((2, 3)) * i, np.ones((2, 3)) * -i)
+
+    def test_append_grows(self):
+        assert_equal(len(self.buffer), 5)
+        assert_equal(self.buffer.capacity, 8)
+        assert_equal(self.buffer.coordinates.shape, (5, 2, 3))
+        assert_items_equal(self.buffer.coordinates[:, 0, 0],
+                           [0, 1, 2, 3, 4])
+        assert_items_equal(self.buffer.velocities[:, 1, 2],
+                           [0, -1, -2, -3, -4])
+
+    def test_snapshot(self):
+        snap = self.buffer.snapshot(3)
+        np.testing.assert_allclose(snap.coordinates, np.ones((2, 3)) * 3)
+        np.testing.assert_allclose(snap.velocities, np.ones((2, 3)) * -3)
+        np.testing.assert_allclose(snap.reversed.velocities,
+                                   np.ones((2, 3)) * 3)
+        assert_almost_equal(snap.potential_energy, 18.0)
+        assert_almost_equal(snap.kinetic_energy, 27.0)
+        # configuration and momentum are only created once
+        assert_equal(snap.configuration is snap.reversed.configuration,
+                     True)
+        assert_equal(snap.configuration is
+                     self.buffer.snapshot(3).configuration, True)
+
+    def test_lazy_energies(self):
+        assert_equal(self.n_calls, 0)
+        snaps = [self.buffer.snapshot(i) for i in range(5)]
+        assert_equal(self.n_calls, 0)
+        assert_items_equal([s.potential_energy for s in snaps],
+                           [0, 6, 12, 18, 24])
+        # all frames are evaluated at once
+        assert_equal(self.n_calls, 1)
+        self.buffer.append(np.ones((2, 3)), np.ones((2, 3)))
+        assert_almost_equal(self.buffer.snapshot(-1).kinetic_energy, 3.0)
+        assert_equal(self.n_calls, 2)
+
+    def test_views_survive_growing(self):
+        snap = self.buffer.snapshot(4)
+        coordinates = snap.coordinates
+        for i in range(10):
+            self.buffer.append(np.zeros((2, 3)), np.zeros((2, 3)))
+        assert_equal(self.buffer.capacity, 16)
+        np.testing.assert_allclose(coordinates, np.ones((2, 3)) * 4)
+        np.testing.assert_allclose(self.buffer.snapshot(4).coordinates,
+                                   np.ones((2, 3)) * 4)
+
+    def test_no_energies(self):
+        buf = FrameBuffer((1, 2))
+        buf.append(np.zeros((1, 2)), np.zeros((1, 2)))
+        assert_equal(buf.snapshot(0).potential_energy, None)
+
+    @raises(IndexError)
+    def test_snapshot_out_of_range(self):
+        self.buffer.snapshot(5)
+
+    @raises(ValueError)
+    def test_nan(self):
+        self.buffer.append(np.ones((2, 3)) * np.nan, np.zeros((2, 3)))
+
+    def test_given_energies(self):
+        buf = FrameBuffer((1, 2))
+        buf.append(np.zeros((1, 2)), np.zeros((1, 2)), 1.5, 0.5)
+        buf.append(np.zeros((1, 2)), np.zeros((1, 2)), None, 0.25)
+        assert_almost_equal(buf.snapshot(0).potential_energy, 1.5)
+        assert_almost_equal(buf.snapshot(0).kinetic_energy, 0.5)
+        assert_equal(buf.snapshot(1).potential_energy, None)
+        assert_almost_equal(buf.snapshot(1).kinetic_energy, 0.25)
+
+
+class testFrameBufferSpillToDisk(object):
+    def setup(self):
+        self.buffer = FrameBuffer((2, 3), capacity=2, spill_to_disk=True)
+        for i in range(5):
+            self.buffer.append(np.ones((2, 3)) * i, np.ones((2, 3)) * -i)
+
+    def test_memmap(self):
+        assert_equal(isinstance(self.buffer._coordinates, np.memmap), True)
+        assert_equal(self.buffer.capacity, 8)
+        assert_items_equal(self.buffer.coordinates[:, 0, 0],
+                           [0, 1, 2, 3, 4])
+
+    def test_views_survive_growing(self):
+        snap = self.buffer.snapshot(4)
+        coordinates = snap.coordinates
+        for i in range(10):
+            self.buffer.append(np.zeros((2, 3)), np.zeros((2, 3)))
+        np.testing.assert_allclose(coordinates, np.ones((2, 3)) * 4)
+        np.testing.assert_allclose(self.buffer.snapshot(4).velocities,
+                                   np.ones((2, 3)) * -4)
+
+    def test_configurations_not_kept(self):
+        snap = self.buffer.snapshot(2)
+        configuration = snap.configuration
+        assert_equal(snap.configuration is configuration, True)
+        del configuration
+        assert_equal(len(self.buffer.configurations._cache), 0)
+        np.testing.assert_allclose(snap.coordinates, np.ones((2, 3)) * 2)
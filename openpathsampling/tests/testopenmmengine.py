@@ -3,7 +3,7 @@
 '''
 import time
 
-from nose.tools import (assert_equal, assert_items_equal)
+from nose.tools import (assert_equal, assert_items_equal, assert_raises)
 from nose.plugins.skip import SkipTest
 
 from test_helpers import (true_func, data_filename,
@@ -128,6 +128,91 @@ class testOpenMMEngine(object):
         traj = self.engine.generate(self.engine.current_snapshot, [true_func])
         assert_equal(len(traj), self.engine.n_frames_max)
 
+    def test_generate_next_frame_lazy_state(self):
+        self.engine.options['lazy_state'] = True
+        new_snap = self.engine.generate_next_frame()
+        state = self.engine.simulation.context.getState(getPositions=True,
+                                                        getVelocities=True)
+        assert_equal_array_array(
+            new_snap.coordinates / u.nanometers,
+            state.getPositions(asNumpy=True) / u.nanometers
+        )
+        # the frame is still the state of the context
+        assert_equal_array_array(
+            new_snap.velocities / (u.nanometers / u.picoseconds),
+            state.getVelocities(asNumpy=True) / (u.nanometers / u.picoseconds)
+        )
+        assert_equal(new_snap.potential_energy is None, False)
+
+        old_snap = new_snap.reversed
+        new_snap = self.engine.generate_next_frame()
+        assert_equal(new_snap.momentum is None, False)
+        # old_snap shares the momentum that was loaded before
+        assert_equal(old_snap.momentum is None, False)
+
+        skipped = self.engine.generate_next_frame()
+        self.engine.generate_next_frame()
+        assert_raises(RuntimeError, getattr, skipped, 'momentum')
+        # the failed access is not cached
+        assert_raises(RuntimeError, getattr, skipped.reversed, 'momentum')
+
+    def test_generate_lazy_state(self):
+        self.engine.options['lazy_state'] = True
+        traj = self.engine.generate(self.engine.current_snapshot, [true_func])
+        assert_equal(len(traj), self.engine.n_frames_max)
+        for snap in traj[1:-1]:
+            assert_raises(RuntimeError, getattr, snap, 'momentum')
+            assert_equal(snap.coordinates is None, False)
+        # the end frame is complete
+        assert_equal(traj[-1].velocities is None, False)
+        assert_equal(traj[-1].potential_energy is None, False)
+
+    def test_generate_lazy_state_backward(self):
+        self.engine.options['lazy_state'] = True
+        traj = self.engine.generate(self.engine.current_snapshot, [true_func],
+                                    direction=-1)
+        assert_equal(len(traj), self.engine.n_frames_max)
+        # the end frame of a backward trajectory is the first one
+        assert_equal(traj[0].velocities is None, False)
+        assert_equal(traj[0].potential_energy is None, False)
+        assert_raises(RuntimeError, getattr, traj[1], 'momentum')
+
+    def test_generate_lazy_state_check_stride(self):
+        self.engine.options['lazy_state'] = True
+        self.engine.options['check_stride'] = 3
+        # the strided check would cut this back to a frame without
+        # velocities
+        max_len = lambda traj, trusted=True: len(traj) < 2
+        assert_raises(ValueError, self.engine.generate,
+                      self.engine.current_snapshot, [max_len])
+
+        self.engine.options['lazy_state'] = False
+        traj = self.engine.generate(self.engine.current_snapshot, [max_len])
+        assert_equal(len(traj), 2)
+        assert_equal(traj[-1].velocities is None, False)
+
+    def test_lazy_state_current_snapshot(self):
+        self.engine.options['lazy_state'] = True
+        traj = self.engine.generate(self.engine.current_snapshot, [true_func])
+        end = traj[-1]
+        state = self.engine.simulation.context.getState(getPositions=True)
+        # a frame without velocities is rejected before the context changes
+        assert_raises(RuntimeError, setattr, self.engine, 'current_snapshot',
+                      traj[1])
+        assert_equal_array_array(
+            self.engine.simulation.context.getState(
+                getPositions=True).getPositions(asNumpy=True) / u.nanometers,
+            state.getPositions(asNumpy=True) / u.nanometers
+        )
+
+        self.engine.current_snapshot = end.reversed
+        velocities = self.engine.simulation.context.getState(
+            getVelocities=True).getVelocities(asNumpy=True)
+        assert_equal_array_array(
+            velocities / (u.nanometers / u.picoseconds),
+            end.reversed.velocities / (u.nanometers / u.picoseconds)
+        )
+
     def test_snapshot_timestep(self):
         assert_equal(self.engine.snapshot_timestep, 20 * u.femtoseconds)
 
@@ -124,6 +124,8 @@ class testShootingMover(object):
         stateA = CVRangeVolume(op, -100, 0.0)
         stateB = CVRangeVolume(op, 0.65, 100)
         self.tps = ef.A2BEnsemble(stateA, stateB)
+        self.stateA = stateA
+        self.stateB = stateB
         init_traj = make_1d_traj(
             coordinates=[-0.1, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7],
             velocities=[1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0]
@@ -156,6 +158,71 @@ class testForwardShootMover(testShootingMover):
 
         assert_equal(mover.is_ensemble_change_mover, False)
 
+    def test_prerejection_run(self):
+        mover = ForwardShootMover(
+            ensemble=self.tps,
+            selector=UniformSelector(),
+            prerejection=True
+        )
+        self.dyn.initialized = True
+        init_samp = self.init_samp[0]
+        traj = init_samp.trajectory
+        # shooting from 0.1 reaches stateB at 0.7: length 5
+        assert_equal(len(mover._run(traj, 1)), 5)
+        assert_equal(len(mover._run(traj, 1, max_length=5)), 5)
+        # one frame more than max_length is generated
+        short = mover._run(traj, 1, max_length=3)
+        assert_equal(len(short), 4)
+
+        trials = mover._build_trials(init_samp, 1, short, 0.9, 3)
+        assert_equal(trials[0].details.prerejected, True)
+        assert_equal(trials[0].details.max_length, 3)
+        accepted, details = mover._accept(trials)
+        assert_equal(accepted, False)
+        assert_equal(details.random_value, 0.9)
+
+    def test_prerejection_move(self):
+        mover = ForwardShootMover(
+            ensemble=self.tps,
+            selector=UniformSelector(),
+            prerejection=True
+        )
+        self.dyn.initialized = True
+        for i in range(10):
+            change = mover.move(self.init_samp)
+            trial_details = change.trials[0].details
+            # the acceptance uses the random number drawn before the shot
+            assert_equal(change.details.random_value,
+                         trial_details.random_value)
+            assert_equal(
+                trial_details.max_length,
+                mover.selector.max_length(self.init_samp[0].trajectory,
+                                          trial_details.random_value)
+            )
+            if trial_details.prerejected:
+                assert_equal(change.accepted, False)
+
+    def test_generation_timing(self):
+        mover = ForwardShootMover(
+            ensemble=self.tps,
+            selector=UniformSelector()
+        )
+        self.dyn.initialized = True
+        change = mover.move(self.init_samp)
+        assert_equal(hasattr(change.trials[0].details, 'generation_timing'),
+                     False)
+
+        self.dyn.options['timing'] = True
+        change = mover.move(self.init_samp)
+        timing = change.trials[0].details.generation_timing
+        assert_equal(timing, self.dyn.last_timing)
+        # the partial trajectory starts at the shooting point
+        assert_equal(timing.n_frames <= len(change.trials[0].trajectory),
+                     True)
+        assert_equal(timing.counts['dynamics'], timing.n_frames - 1)
+        assert_equal(timing.counts['continue_conditions'],
+                     timing.n_frames)
+
 class testBackwardShootMover(testShootingMover):
     def test_move(self):
         mover = BackwardShootMover(
@@ -177,6 +244,90 @@ class testBackwardShootMover(testShootingMover):
         )
         assert_equal(mover.is_ensemble_change_mover, False)
 
+class testConcurrentEngineMover(testShootingMover):
+    def setup(self):
+        super(testConcurrentEngineMover, self).setup()
+        self.tps2 = ef.A2BEnsemble(self.stateA, self.stateB)
+        init_traj = self.init_samp[0].trajectory
+        self.init_samp = SampleSet([
+            self.init_samp[0],
+            Sample(trajectory=init_traj, replica=1, ensemble=self.tps2)
+        ])
+        self.mover = ConcurrentEngineMover([
+            ForwardShootMover(ensemble=self.tps, selector=UniformSelector()),
+            BackwardShootMover(ensemble=self.tps2, selector=UniformSelector())
+        ])
+
+    def test_move(self):
+        self.dyn.initialized = True
+        change = self.mover.move(self.init_samp)
+        assert_equal(len(change.subchanges), 2)
+        assert_subchanges_set_accepted(change, [True, True])
+        newsamp = self.init_samp + change
+        assert_equal(len(newsamp), 2)
+        for samp in newsamp:
+            assert_equal(samp.ensemble(samp.trajectory), True)
+        assert_equal(newsamp[self.tps].trajectory,
+                     change.subchanges[0].trials[0].trajectory)
+        assert_equal(newsamp[self.tps2].trajectory,
+                     change.subchanges[1].trials[0].trajectory)
+
+    def test_prerejection_move(self):
+        mover = ConcurrentEngineMover([
+            ForwardShootMover(ensemble=self.tps, selector=UniformSelector(),
+                              prerejection=True),
+            BackwardShootMover(ensemble=self.tps2,
+                               selector=UniformSelector(),
+                               prerejection=True)
+        ])
+        self.dyn.initialized = True
+        for i in range(10):
+            change = mover.move(self.init_samp)
+            for subchange in change.subchanges:
+                trial = subchange.trials[0]
+                trial_details = trial.details
+                assert_equal(subchange.details.random_value,
+                             trial_details.random_value)
+                assert_equal(
+                    trial_details.max_length,
+                    UniformSelector().max_length(
+                        self.init_samp[0].trajectory,
+                        trial_details.random_value)
+                )
+                # the shot is stopped one frame after max_length
+                assert_equal(
+                    len(trial.trajectory) <= trial_details.max_length + 1,
+                    True)
+                if trial_details.prerejected:
+                    assert_equal(subchange.accepted, False)
+
+    def test_generation_timing(self):
+        self.dyn.initialized = True
+        change = self.mover.move(self.init_samp)
+        for subchange in change.subchanges:
+            assert_equal(
+                hasattr(subchange.trials[0].details, 'generation_timing'),
+                False)
+
+        self.dyn.options['timing'] = True
+        change = self.mover.move(self.init_samp)
+        timings = [subchange.trials[0].details.generation_timing
+                   for subchange in change.subchanges]
+        assert_equal(timings, self.dyn.last_timings)
+        for timing in timings:
+            assert_equal(timing.counts['dynamics'], timing.n_frames - 1)
+
+    @raises(ValueError)
+    def test_same_ensemble(self):
+        ConcurrentEngineMover([
+            ForwardShootMover(ensemble=self.tps, selector=UniformSelector()),
+            BackwardShootMover(ensemble=self.tps, selector=UniformSelector())
+        ])
+
+    @raises(TypeError)
+    def test_not_engine_mover(self):
+        ConcurrentEngineMover([PathReversalMover(ensemble=self.tps)])
+
 class testOneWayShootingMover(testShootingMover):
     def test_mover_initialization(self):
         mover = OneWayShootingMover(
@@ -190,6 +341,16 @@ class testOneWayShootingMover(testShootingMover):
         assert_equal(ForwardShootMover in moverclasses, True)
         assert_equal(BackwardShootMover in moverclasses, True)
 
+    def test_prerejection(self):
+        mover = OneWayShootingMover(
+            ensemble=self.tps,
+            selector=UniformSelector(),
+            prerejection=True
+        )
+        assert_equal(mover.prerejection, True)
+        for submover in mover.movers:
+            assert_equal(submover.prerejection, True)
+
 class testPathReversalMover(object):
     def setup(self):
         op = CV_Function("myid", f=lambda snap :
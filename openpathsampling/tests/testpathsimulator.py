@@ -2,11 +2,96 @@
 @author Jan-Hendrik Prinz
 """
 
+from nose.tools import assert_equal
 from test_helpers import raises_with_message_like
 
+import openpathsampling as paths
 import openpathsampling.pathsimulator as simulator
 
 class testAbstract(object):
     @raises_with_message_like(TypeError, "Can't instantiate abstract class")
     def test_abstract_volume(self):
         mover = simulator.PathSimulator()
+
+
+class DeferringEngine(paths.DynamicsEngine):
+    """Engine that keeps deferred tasks until `run_deferred`"""
+    def __init__(self):
+        super(DeferringEngine, self).__init__()
+        self.pending = []
+
+    def defer(self, task):
+        self.pending.append(task)
+
+    def run_deferred(self):
+        while self.pending:
+            self.pending.pop(0)()
+
+
+class StepMover(paths.PathMover):
+    """Mover without dynamics that fails in a given step"""
+    def __init__(self, engine, fail_step=None):
+        super(StepMover, self).__init__()
+        self.engine = engine
+        self.fail_step = fail_step
+        self.n_moves = 0
+        self.pending = []
+
+    def move(self, globalstate):
+        self.n_moves += 1
+        self.pending.append(len(self.engine.pending))
+        if self.n_moves == self.fail_step:
+            raise RuntimeError('move failed')
+        return paths.EmptyPathMoveChange()
+
+
+class StepScheme(object):
+    def __init__(self, mover):
+        self.mover = mover
+
+    def move_decision_tree(self):
+        return self.mover
+
+
+class RecordingPathSampling(paths.PathSampling):
+    def __init__(self, *args, **kwargs):
+        super(RecordingPathSampling, self).__init__(*args, **kwargs)
+        self.saved = []
+        self.n_syncs = 0
+
+    def _save_step(self, mcstep, cv_group):
+        self.saved.append(mcstep.mccycle)
+
+    def sync_storage(self):
+        self.n_syncs += 1
+
+
+class testPathSamplingDeferredSaves(object):
+    def setup(self):
+        self.engine = DeferringEngine()
+
+    def simulation(self, fail_step=None):
+        mover = StepMover(self.engine, fail_step)
+        return RecordingPathSampling(None, self.engine, StepScheme(mover),
+                                     paths.SampleSet([])), mover
+
+    def test_steps_without_dynamics(self):
+        sim, mover = self.simulation()
+        sim.save_frequency = 2
+        sim.run(5)
+        # the save of a step waits at most until the next step
+        assert_equal(mover.pending, [0, 1, 0, 1, 0])
+        assert_equal(sim.saved, [1, 2, 3, 4, 5])
+        assert_equal(sim.n_syncs, 3)
+
+    def test_failed_move(self):
+        sim, mover = self.simulation(fail_step=3)
+        try:
+            sim.run(5)
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError('move did not fail')
+        assert_equal(sim.saved, [1, 2])
+        assert_equal(self.engine.pending, [])
+        assert_equal(sim.n_syncs, 3)
@@ -66,3 +66,21 @@ class testFinalFrameSelector(SelectorTest):
         assert_items_equal([0.1, 0.2, 0.3, 0.4, 0.5],
                            [s.coordinates[0][0] for s in samples[0].trajectory]
                           )
+
+class testUniformSelector(SelectorTest):
+    def test_pick(self):
+        sel = UniformSelector()
+        for i in range(20):
+            sp = sel.pick(self.mytraj)
+            assert_equal(sp in [1, 2, 3], True)
+
+    def test_max_length(self):
+        sel = UniformSelector()
+        # sum_bias(mytraj) = 3; accepted if len(trial) - 2 <= 3 / rand
+        assert_equal(sel.max_length(self.mytraj, 1.0), 5)
+        assert_equal(sel.max_length(self.mytraj, 0.5), 8)
+        assert_equal(sel.max_length(self.mytraj, 0.4), 9)
+        assert_equal(sel.max_length(self.mytraj, 0.0), None)
+
+    def test_max_length_unknown(self):
+        assert_equal(FirstFrameSelector().max_length(self.mytraj, 0.5), None)
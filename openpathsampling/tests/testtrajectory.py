@@ -41,6 +41,11 @@ class testSummarizeTrajectoryVolumes(object):
             [("A", 1), ("I", 3), ("B", 2), ("X", 2), ("B", 1), ("X", 1)]
         )
 
+    @raises(RuntimeError)
+    def test_summarize_trajectory_volumes_not_disjoint(self):
+        voldict = {"A" : self.stateA, "AI" : self.stateA | self.interstitial}
+        self._make_traj("abix").summarize_by_volumes(voldict)
+
     def test_summarize_trajectory_volumes_str(self):
         voldict = {"A" : self.stateA, "B" : self.stateB, 
                    "I" : self.interstitial, "X" : self.outInterface}
@@ -78,3 +83,49 @@ class testSummarizeTrajectoryVolumes(object):
         )
 
 
+
+
+class testConcatenatedTrajectory(object):
+    def setup(self):
+        self.first = make_1d_traj(coordinates=[0.0, 1.0, 2.0],
+                                  velocities=[1.0]*3)
+        self.second = make_1d_traj(coordinates=[3.0, 4.0],
+                                   velocities=[1.0]*2)
+
+    def test_view(self):
+        view = ConcatenatedTrajectory(self.first, self.second)
+        assert_equal(len(view), 5)
+        assert_equal(view, self.first + self.second)
+        assert_equal(view.get_as_proxy(0), self.first[0])
+        assert_equal(view.get_as_proxy(-1), self.second[-1])
+        assert_equal(view[3], self.second[0])
+        assert_equal(view.index(self.second[1]), 4)
+        assert_equal(self.first[1] in view, True)
+
+    def test_slice(self):
+        view = ConcatenatedTrajectory(self.first, self.second)
+        subtraj = view[2:4]
+        assert_equal(type(subtraj), Trajectory)
+        assert_equal(subtraj, [self.first[2], self.second[0]])
+        assert_equal(view[-2:], self.second)
+
+    def test_reverse_first(self):
+        view = ConcatenatedTrajectory(self.first, self.second,
+                                      reverse_first=True)
+        assert_equal(view, self.first.reversed + self.second)
+        assert_equal(view[0], self.first[2].reversed)
+        assert_equal(view.index(self.first[0].reversed), 2)
+
+    def test_grow(self):
+        view = ConcatenatedTrajectory(self.first, Trajectory())
+        assert_equal(len(view), 3)
+        view.second = self.second
+        assert_equal(len(view), 5)
+        self.second.append(self.first[0])
+        assert_equal(len(view), 6)
+        assert_equal(view[-1], self.first[0])
+
+    @raises(IndexError)
+    def test_index_error(self):
+        view = ConcatenatedTrajectory(self.first, self.second)
+        view.get_as_proxy(5)
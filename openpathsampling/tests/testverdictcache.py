@@ -0,0 +1,114 @@
+import os
+import tempfile
+
+from nose.tools import assert_equal
+from test_helpers import make_1d_traj
+
+import openpathsampling as paths
+from openpathsampling.netcdfplus import NetCDFPlus, ObjectStore
+
+
+class VerdictStorage(NetCDFPlus):
+    """Minimal storage with the stores the verdicts refer to"""
+    def _register_storages(self):
+        super(VerdictStorage, self)._register_storages()
+        self.add('trajectories', ObjectStore(paths.Trajectory, json=False))
+        self.add('ensembles', ObjectStore(paths.Ensemble, nestable=True,
+                                          has_name=True))
+
+    def _initialize(self):
+        self._init_storages()
+
+
+class testVerdictCache(object):
+    def setup(self):
+        handle, self.filename = tempfile.mkstemp(suffix='.nc')
+        os.close(handle)
+        self.storage = VerdictStorage(self.filename, mode='w')
+        self.ensemble = paths.LengthEnsemble(3)
+        self.storage.ensembles.save(self.ensemble)
+        self.traj = make_1d_traj(coordinates=[0.0, 0.1, 0.2],
+                                 velocities=[1.0]*3)
+        # pretend the trajectory is stored
+        self.storage.trajectories.index[self.traj] = 0
+
+    def teardown(self):
+        paths.VerdictCache.active = None
+        self.storage.close()
+        os.remove(self.filename)
+
+    def test_cached(self):
+        cache = paths.VerdictCache(self.storage)
+        assert_equal(cache.key(self.ensemble, self.traj), (0, 0))
+        assert_equal(cache(self.ensemble, self.traj), True)
+        assert_equal(cache(self.ensemble, self.traj), True)
+        assert_equal((cache.hits, cache.misses), (1, 1))
+
+    def test_not_stored(self):
+        cache = paths.VerdictCache(self.storage)
+        traj = make_1d_traj(coordinates=[0.0, 0.1], velocities=[1.0]*2)
+        assert_equal(cache.key(self.ensemble, traj), None)
+        assert_equal(cache(self.ensemble, traj), False)
+        assert_equal((cache.hits, cache.misses), (0, 0))
+
+    def test_size_limit(self):
+        cache = paths.VerdictCache(self.storage, size_limit=1)
+        other = paths.LengthEnsemble(2)
+        self.storage.ensembles.save(other)
+        cache(self.ensemble, self.traj)
+        cache(other, self.traj)
+        cache(self.ensemble, self.traj)
+        assert_equal((cache.hits, cache.misses), (0, 3))
+
+    def test_persist(self):
+        cache = paths.VerdictCache(self.storage, persist=True)
+        assert_equal(cache(self.ensemble, self.traj), True)
+        cache.sync()
+        self.storage.close()
+
+        self.storage = VerdictStorage(self.filename, mode='a')
+        ensemble = self.storage.ensembles.load(0)
+        # a different trajectory at the same index gets the stored verdict
+        traj = make_1d_traj(coordinates=[0.0], velocities=[1.0])
+        self.storage.trajectories.index[traj] = 0
+        cache = paths.VerdictCache(self.storage, persist=True)
+        assert_equal(cache(ensemble, traj), True)
+        assert_equal((cache.hits, cache.misses), (1, 0))
+
+    def test_size_limit_pending(self):
+        cache = paths.VerdictCache(self.storage, size_limit=1, persist=True)
+        other = paths.LengthEnsemble(2)
+        self.storage.ensembles.save(other)
+        cache(self.ensemble, self.traj)
+        cache(other, self.traj)
+        # dropped from memory, but not saved yet
+        assert_equal(cache(self.ensemble, self.traj), True)
+        assert_equal((cache.hits, cache.misses), (1, 2))
+        cache.sync()
+        assert_equal(len(self.storage.dimensions['verdicts']), 2)
+
+    def test_load_size_limit(self):
+        cache = paths.VerdictCache(self.storage, persist=True)
+        other = paths.LengthEnsemble(2)
+        self.storage.ensembles.save(other)
+        cache(self.ensemble, self.traj)
+        cache(other, self.traj)
+        cache.sync()
+
+        # only the latest verdict is read
+        cache = paths.VerdictCache(self.storage, size_limit=1, persist=True)
+        assert_equal(cache(other, self.traj), False)
+        assert_equal((cache.hits, cache.misses), (1, 0))
+        assert_equal(cache(self.ensemble, self.traj), True)
+        assert_equal((cache.hits, cache.misses), (1, 1))
+
+    def test_active(self):
+        cache = paths.VerdictCache(self.storage).activate()
+        sample = paths.Sample(replica=0, trajectory=self.traj,
+                              ensemble=self.ensemble)
+        assert_equal(sample.valid, True)
+        assert_equal(paths.ensemble_verdict(self.ensemble, self.traj), True)
+        assert_equal((cache.hits, cache.misses), (1, 1))
+
+        cache.deactivate()
+        assert_equal(paths.VerdictCache.active, None)
@@ -7,6 +7,7 @@ from nose.plugins.skip import Skip, SkipTest
 from test_helpers import CallIdentity, raises_with_message_like
 
 import unittest
+import numpy as np
 
 import openpathsampling.volume as volume
 
@@ -332,6 +333,241 @@ class testCVRangeVolumePeriodic(object):
                      volume.CVRangeVolumePeriodic(op_id, -100, 75))
 
 
+class testCVIntervalSetVolume(object):
+    def setUp(self):
+        self.values = [-1.0, -0.8, -0.75, -0.5, -0.3, 0.0, 0.2, 0.25, 0.3,
+                       0.6, 0.75, 0.9, 1.2]
+        self.volE = volume.CVRangeVolume(op_id, 1.0, 1.5)
+        self.set = volume.join_volumes([volB, volC, self.volE])
+
+    def test_join(self):
+        assert_equal(type(self.set), volume.CVIntervalSetVolume)
+        assert_equal(self.set._intervals,
+                     [(-0.75, -0.25), (0.25, 0.75), (1.0, 1.5)])
+        assert_equal(str(self.set),
+                     "({x|Id(x) in [-0.75, -0.25]} or " +
+                     "{x|Id(x) in [0.25, 0.75]} or " +
+                     "{x|Id(x) in [1.0, 1.5]})")
+        for val in self.values:
+            assert_equal(self.set(val),
+                         volB(val) or volC(val) or self.volE(val))
+        assert_equal(list(self.set.evaluate_trajectory(self.values)),
+                     [self.set(val) for val in self.values])
+
+    def test_combinations(self):
+        assert_equal(self.set & volA,
+                     volume.CVIntervalSetVolume(op_id, [(-0.5, -0.25),
+                                                        (0.25, 0.5)]))
+        assert_equal(volA & self.set, self.set & volA)
+        assert_equal(self.set & volume.CVRangeVolume(op_id, 0.0, 0.5),
+                     volume.CVRangeVolume(op_id, 0.25, 0.5))
+        assert_equal(self.set | volD,
+                     volume.CVIntervalSetVolume(op_id, [(-0.75, 0.75),
+                                                        (1.0, 1.5)]))
+        assert_equal(volD - self.set, volume.CVRangeVolume(op_id, -0.25, 0.25))
+        assert_equal(self.set - self.set, volume.EmptyVolume())
+        assert_equal((self.set | volD) ^ self.set,
+                     volume.CVRangeVolume(op_id, -0.25, 0.25))
+        assert_equal(self.set | volume.CVRangeVolume(op_id, -100, 100),
+                     volume.CVRangeVolume(op_id, -100, 100))
+        # different collective variable
+        assert_equal(type(self.set & volA2), volume.IntersectionVolume)
+
+    def test_periodic(self):
+        pvol = volume.CVRangeVolumePeriodic(op_id, 150.0, -150.0, -180, 180)
+        pvol2 = volume.CVRangeVolumePeriodic(op_id, -50.0, 50.0, -180, 180)
+        pset = pvol | pvol2
+        assert_equal(type(pset), volume.CVIntervalSetVolumePeriodic)
+        for val in [-200.0, -160.0, -100.0, 0.0, 100.0, 170.0, 400.0]:
+            assert_equal(pset(val), pvol(val) or pvol2(val))
+        assert_equal(list(pset.evaluate_trajectory([-200.0, 0.0, 100.0])),
+                     [True, True, False])
+        # ranges through the periodic boundary are joined again
+        assert_equal(pset - pvol2, pvol)
+        assert_equal(type(pset & volA), volume.IntersectionVolume)
+
+    def test_factory(self):
+        vols = volume.VolumeFactory.CVRangeVolumeSet(
+            op_id, [0.0, [0.0, 0.5]], [0.1, [0.1, 0.6]]
+        )
+        assert_equal(vols[0], volume.CVRangeVolume(op_id, 0.0, 0.1))
+        assert_equal(vols[1],
+                     volume.CVIntervalSetVolume(op_id, [(0.0, 0.1),
+                                                        (0.5, 0.6)]))
+
+    def test_dict(self):
+        copy = volume.CVIntervalSetVolume.from_dict(self.set.to_dict())
+        assert_equal(copy, self.set)
+        assert_equal(copy._intervals, self.set._intervals)
+
+
+class testEvaluateTrajectory(object):
+    def setUp(self):
+        self.values = [-1.0, -0.6, -0.5, -0.3, 0.0, 0.3, 0.5, 0.6, 1.0]
+
+    def _check(self, vol, values=None):
+        if values is None:
+            values = self.values
+        result = vol.evaluate_trajectory(values)
+        assert_equal(result.dtype, np.bool_)
+        assert_equal(list(result), [vol(val) for val in values])
+
+    def test_cv_range(self):
+        self._check(volA)
+        self._check(volB)
+
+    def test_periodic(self):
+        self._check(volume.CVRangeVolumePeriodic(op_id, -100, 75),
+                    [-150.0, -100.0, 0.0, 75.0, 100.0])
+        self._check(volume.CVRangeVolumePeriodic(op_id, 75, -100),
+                    [-150.0, -100.0, 0.0, 75.0, 100.0])
+        self._check(volume.CVRangeVolumePeriodic(op_id, -150, 70, -180, 180),
+                    [-300.0, -160.0, 0.0, 69.0, 71.0, 200.0, 400.0])
+
+    def test_combinations(self):
+        for vol in [volA | volA2, volA & volA2, volA ^ volA2, volA - volA2,
+                    ~volA, volA | volume.FullVolume(),
+                    volume.EmptyVolume(), volume.FullVolume(),
+                    volume.UnionVolume(volA, volB),
+                    volume.IntersectionVolume(volA, volC),
+                    volume.SymmetricDifferenceVolume(volA, volB),
+                    volume.RelativeComplementVolume(volD, volA)]:
+            self._check(vol)
+
+    def test_empty_trajectory(self):
+        for vol in [volA, ~volA, volA & volA2, volume.FullVolume()]:
+            assert_equal(len(vol.evaluate_trajectory([])), 0)
+
+
+class CountingVolume(volume.Volume):
+    def __init__(self, vol):
+        super(CountingVolume, self).__init__()
+        self.vol = vol
+        self.n_calls = 0
+
+    def __call__(self, snapshot):
+        self.n_calls += 1
+        return self.vol(snapshot)
+
+
+class testAdaptiveShortCircuit(object):
+    def setUp(self):
+        volume.Volume.adaptive_shortcircuit = True
+        self.values = [-1.0, -0.6, -0.5, -0.3, 0.0, 0.3, 0.5, 0.6, 1.0]
+
+    def tearDown(self):
+        volume.Volume.adaptive_shortcircuit = False
+
+    def test_flatten(self):
+        not_c = ~volC
+        union = volume.join_volumes([volA, volA2, not_c])
+        assert_equal(union._adaptive_order().operands, [volA, volA2, not_c])
+        inner = volume.UnionVolume(volD, volC)
+        intersection = volume.IntersectionVolume(
+            volume.IntersectionVolume(volA, volB), inner
+        )
+        assert_equal(intersection._adaptive_order().operands,
+                     [volA, volB, inner])
+
+    def test_same_results(self):
+        for vol in [volume.join_volumes([volA, volA2, ~volC]),
+                    volume.IntersectionVolume(
+                        volume.IntersectionVolume(volA, volB),
+                        volume.UnionVolume(volD, volC)
+                    ),
+                    volume.UnionVolume(volA, volB) & ~volC]:
+            adaptive = [vol(val) for val in self.values]
+            volume.Volume.adaptive_shortcircuit = False
+            assert_equal(adaptive, [vol(val) for val in self.values])
+            volume.Volume.adaptive_shortcircuit = True
+
+    def test_reorder(self):
+        rare = CountingVolume(volC)
+        frequent = CountingVolume(volB)
+        union = rare | frequent
+        order = union._adaptive_order()
+        order.reorder_interval = 10
+        for i in range(10):
+            assert_equal(union(0.5), True)
+        assert_equal((rare.n_calls, frequent.n_calls), (10, 10))
+        assert_equal(order.order, [1, 0])
+        for i in range(10):
+            assert_equal(union(0.5), True)
+        assert_equal((rare.n_calls, frequent.n_calls), (10, 20))
+        # the result is still correct if only the rare volume is True
+        assert_equal(union(-0.5), True)
+        assert_equal(union(1.0), False)
+
+
+class Point(object):
+    def __init__(self, x):
+        self.x = np.asarray(x, dtype=float)
+
+
+class CountingCV(object):
+    """Returns the distances to the centers or the coordinates of points"""
+    def __init__(self, centers=None):
+        self.centers = centers
+        self.n_frames = []
+
+    def __call__(self, points):
+        self.n_frames.append(len(points))
+        if self.centers is None:
+            return [p.x for p in points]
+        return [np.sqrt(((self.centers - p.x)**2).sum(axis=1))
+                for p in points]
+
+
+class testVoronoiVolume(object):
+    def setUp(self):
+        self.centers = np.array([[0.0, 0.0], [1.0, 0.0], [0.0, 1.0]])
+        self.points = [Point(x) for x in [[0.1, 0.1], [0.9, 0.2], [0.2, 0.7],
+                                          [2.0, 2.0], [-1.0, 0.2]]]
+        self.cells = [0, 1, 2, 1, 0]
+
+    def test_shared_assignment(self):
+        cv = CountingCV(self.centers)
+        volumes = [volume.VoronoiVolume(cv, k) for k in range(3)]
+        assert_is(volumes[0].assignment, volumes[2].assignment)
+        for k, vol in enumerate(volumes):
+            assert_equal(list(vol.evaluate_trajectory(self.points)),
+                         [cell == k for cell in self.cells])
+        assert_equal([vol(self.points[1]) for vol in volumes],
+                     [False, True, False])
+        assert_equal(volumes[1].cell(self.points[2]), 2)
+        # everything was computed in the first call
+        assert_equal(cv.n_frames, [5])
+
+    def test_no_cell(self):
+        cv = CountingCV(self.centers)
+        vol = volume.VoronoiVolume(cv, 0)
+        far = Point([1e10, 0.0])
+        assert_equal(vol.cell(far), -1)
+
+    def test_centers(self):
+        cv = CountingCV()
+        vol = volume.VoronoiVolume(cv, 1, centers=self.centers)
+        assert_equal(list(vol.assignment.cells(self.points)), self.cells)
+        assert_equal(vol.assignment._tree, None)
+        assert_is(volume.VoronoiVolume(cv, 2, self.centers.copy()).assignment,
+                  vol.assignment)
+
+    def test_centers_tree(self):
+        if not volume.has_scipy:
+            raise SkipTest("scipy not available")
+        cv = CountingCV()
+        assignment = volume.VoronoiCellAssignment(cv, self.centers)
+        assert_equal(assignment._tree, None)
+        old_threshold = volume.VoronoiCellAssignment.tree_threshold
+        volume.VoronoiCellAssignment.tree_threshold = 2
+        try:
+            assignment = volume.VoronoiCellAssignment(cv, self.centers)
+        finally:
+            volume.VoronoiCellAssignment.tree_threshold = old_threshold
+        assert_not_equal(assignment._tree, None)
+        assert_equal(list(assignment.cells(self.points)), self.cells)
+
+
 class testVolumeFactory(object):
     def test_check_minmax(self):
         minmax1 = volume.VolumeFactory._check_minmax(0, [2, 2])
@@ -1,6 +1,14 @@
+import logging
+import time
+
 import numpy as np
 from openpathsampling.snapshot import Snapshot, Momentum, Configuration
+from openpathsampling.trajectory import Trajectory
 from openpathsampling.dynamics_engine import DynamicsEngine
+from openpathsampling.frame_buffer import FrameBuffer
+from openpathsampling.engine_timing import GenerationTiming
+
+logger = logging.getLogger(__name__)
 
 def convert_to_3Ndim(v):
     ndofs = len(v)
@@ -24,6 +32,15 @@ def count_atoms(ndofs):
     # first part gives whole atoms, second part says if a partial exists
     return (ndofs / 3) + min(1, ndofs % 3)
 
+
+class _ToySystem(object):
+    """Stands in for the engine when the PES is evaluated on stored frames"""
+    def __init__(self, positions, velocities, mass):
+        self.positions = positions
+        self.velocities = velocities
+        self.mass = mass
+
+
 class ToyEngine(DynamicsEngine):
     '''The trick is that we have various "simulation" classes (either
     generated directly as here, or subclassed for more complication
@@ -33,9 +50,16 @@ class ToyEngine(DynamicsEngine):
     default_options = {
                       'integ' : None,
                       'n_frames_max' : 5000,
-                      'nsteps_per_frame' : 10
+                      'nsteps_per_frame' : 10,
+                      'check_stride' : 1,
+                      'spill_to_disk' : False,
+                      'timing' : False,
+                      'log_freq' : 10
     }
 
+    # the frames are in self._frames already
+    _buffers_frames = True
+
     def __init__(self, options, template):
         if 'n_spatial' not in options:
             options['n_spatial'] = template.topology.n_spatial
@@ -74,19 +98,23 @@ class ToyEngine(DynamicsEngine):
     def snapshot_timestep(self):
         return self.nsteps_per_frame * self.integ.dt
 
+    def _build_snapshot(self, positions, velocities, potential_energy,
+                        kinetic_energy):
+        return Snapshot(coordinates=np.array([positions]),
+                        potential_energy=potential_energy,
+                        box_vectors=None,
+                        velocities=np.array([velocities]),
+                        kinetic_energy=kinetic_energy,
+                        topology=self.template.topology
+                       )
+
     @property
     def current_snapshot(self):
         snap_pos = self.positions
         snap_vel = self.velocities
         snap_pot = self.pes.V(self)
         snap_kin = self.pes.kinetic_energy(self)
-        return Snapshot(coordinates=np.array([snap_pos]),
-                        potential_energy=snap_pot,
-                        box_vectors=None,
-                        velocities=np.array([snap_vel]),
-                        kinetic_energy=snap_kin,
-                        topology=self.template.topology
-                       )
+        return self._build_snapshot(snap_pos, snap_vel, snap_pot, snap_kin)
 
     @current_snapshot.setter
     def current_snapshot(self, snap):
@@ -95,9 +123,219 @@ class ToyEngine(DynamicsEngine):
         self.positions = coords[0]
         self.velocities = vels[0]
 
+    def start(self, snapshot=None):
+        super(ToyEngine, self).start(snapshot)
+        # a new buffer for each trajectory; the snapshots of the previous
+        # one keep referencing the old buffer
+        self._frames = None
+
+    def _new_frame_buffer(self, n_dofs):
+        return FrameBuffer(
+            (1, n_dofs),
+            topology=self.template.topology,
+            energies=self._frame_energies,
+            spill_to_disk=self.options['spill_to_disk']
+        )
+
+    def _frame_energies(self, coordinates, velocities):
+        frames = _ToySystem(coordinates[:, 0], velocities[:, 0], self.mass)
+        return self.pes.V(frames), self.pes.kinetic_energy(frames)
+
+    def _buffer_frame(self, buffers, key, positions, velocities):
+        """
+        Append a frame to the FrameBuffer `buffers[key]`, which is created
+        on first use, and return the snapshot of the frame
+        """
+        start_time = time.time()
+        frames = buffers.get(key)
+        if frames is None:
+            frames = buffers[key] = self._new_frame_buffer(len(positions))
+        # the snapshot is only a view into the buffer; the energies are
+        # computed for all frames at once when first needed
+        idx = frames.append(positions, velocities)
+        snapshot = frames.snapshot(idx)
+        GenerationTiming.add_current('snapshots', time.time() - start_time)
+        return snapshot
+
     def generate_next_frame(self):
         self.integ.step(self, self.nsteps_per_frame)
-        return self.current_snapshot
+        return self._buffer_frame(self.__dict__, '_frames', self.positions,
+                                  self.velocities)
+
+    def generate_batch(self, snapshots, running=None, direction=+1,
+                       n_frames_max=None):
+        """
+        Generate trajectories for several walkers at once.
+
+        All walkers are integrated together: during the run `positions` and
+        `velocities` are (K, n_dof) arrays, so the integrator only does one
+        numpy call per step for all K walkers. Each walker keeps its own
+        continue conditions and is removed from the batch as soon as one of
+        them returns False or its trajectory has reached its
+        `n_frames_max`.
+
+        The frames of each walker go to a FrameBuffer of its own, as in
+        `generate`, so the energies are computed lazily and the options
+        `check_stride` and `spill_to_disk` apply to every walker. With the
+        option `timing` the GenerationTiming of each trajectory is available
+        in `last_timings` afterwards; the time of the common integrator
+        steps is split evenly between the walkers that take part in them.
+
+        See `DynamicsEngine.generate_batch` for the parameters.
+        """
+        if direction == 0:
+            raise RuntimeError('direction must be positive (FORWARD) or negative (BACKWARD).')
+
+        running = self._batch_running(snapshots, running)
+
+        # the length limit of each walker
+        option = self.options.get('n_frames_max', None)
+        limits = []
+        for max_frames in self._batch_n_frames_max(snapshots, n_frames_max):
+            if max_frames is None or (option is not None and
+                                      option < max_frames):
+                max_frames = option
+            limits.append(max_frames)
+
+        timings = None
+        if self.options.get('timing', False):
+            timings = [GenerationTiming() for _ in snapshots]
+
+        # keep the single walker state to restore it after the batch
+        single_state = (self.__dict__.get('positions'),
+                        self.__dict__.get('velocities'))
+        previous_timing = GenerationTiming.current
+        try:
+            trajectories = self._generate_batch(snapshots, running,
+                                                direction, limits, timings)
+        finally:
+            GenerationTiming.current = previous_timing
+            self.positions, self.velocities = single_state
+
+        self.last_timings = timings
+        logger.info("Finished batch of trajectories, lengths: %s",
+                    str([len(trajectory) for trajectory in trajectories]))
+        return trajectories
+
+    def _generate_batch(self, snapshots, running, direction, limits,
+                        timings):
+        """
+        The main loop of `generate_batch`; reports to `timings` if not None
+        """
+        check_stride = self.options.get('check_stride', 1)
+        if check_stride is None or check_stride < 1:
+            check_stride = 1
+
+        trajectories = [Trajectory([snapshot]) for snapshot in snapshots]
+
+        if direction > 0:
+            initial = snapshots
+        else:
+            # backward simulation needs reversed snapshots
+            initial = [snapshot.reversed for snapshot in snapshots]
+
+        # the wall time of each walker, including its share of the steps
+        totals = [0.0] * len(snapshots)
+
+        # maybe some walkers should stop before we even begin?
+        active = []
+        for walker, trajectory in enumerate(trajectories):
+            start_time = time.time()
+            GenerationTiming.current = self._walker_timing(timings, walker)
+            if self.stop_conditions(trajectory=trajectory,
+                                    continue_conditions=running[walker],
+                                    trusted=False) or \
+                    self._at_limit(trajectory, limits[walker]):
+                self.stop(trajectory)
+            else:
+                active.append(walker)
+            totals[walker] += time.time() - start_time
+
+        # the FrameBuffer of each walker
+        buffers = {}
+        # number of frames known to pass the continue conditions
+        n_checked = [1] * len(snapshots)
+
+        self.positions = np.array(
+            [np.copy(initial[walker].coordinates[0]) for walker in active],
+            dtype=float)
+        self.velocities = np.array(
+            [np.copy(initial[walker].velocities[0]) for walker in active],
+            dtype=float)
+
+        logger.info("Starting batch of %d trajectories", len(active))
+        frame = 0
+        while len(active) > 0:
+            start_time = time.time()
+            self.integ.step(self, self.nsteps_per_frame)
+            frame += 1
+            step_share = (time.time() - start_time) / len(active)
+
+            keep = np.ones(len(active), dtype=bool)
+            for row, walker in enumerate(active):
+                start_time = time.time()
+                GenerationTiming.current = self._walker_timing(timings,
+                                                               walker)
+                snapshot = self._buffer_frame(buffers, walker,
+                                              self.positions[row],
+                                              self.velocities[row])
+                GenerationTiming.add_current(
+                    'dynamics', step_share + time.time() - start_time)
+
+                phase_start = time.time()
+                trajectory = trajectories[walker]
+                if direction > 0:
+                    trajectory.append(snapshot)
+                else:
+                    trajectory.prepend(snapshot.reversed)
+                GenerationTiming.add_current('trajectory',
+                                             time.time() - phase_start)
+
+                # the last frame is always checked, like in `generate`
+                at_limit = self._at_limit(trajectory, limits[walker])
+                stop = False
+                if running[walker] and (frame % check_stride == 0 or
+                                        at_limit):
+                    if check_stride == 1:
+                        stop = self.stop_conditions(
+                            trajectory=trajectory,
+                            continue_conditions=running[walker]
+                        )
+                    else:
+                        stop, trajectory = self._stop_conditions_strided(
+                            trajectory, running[walker], n_checked[walker],
+                            direction
+                        )
+                        trajectories[walker] = trajectory
+                    n_checked[walker] = len(trajectory)
+
+                if stop or at_limit:
+                    keep[row] = False
+                    self.stop(trajectory)
+
+                totals[walker] += step_share + time.time() - start_time
+
+            if not keep.all():
+                active = [walker for walker, k in zip(active, keep) if k]
+                self.positions = self.positions[keep]
+                self.velocities = self.velocities[keep]
+
+        if timings is not None:
+            for walker, timing in enumerate(timings):
+                timing.add('total', totals[walker])
+                timing.n_frames = len(trajectories[walker])
+
+        return trajectories
+
+    @staticmethod
+    def _walker_timing(timings, walker):
+        if timings is None:
+            return None
+        return timings[walker]
+
+    @staticmethod
+    def _at_limit(trajectory, max_frames):
+        return max_frames is not None and len(trajectory) >= max_frames
 
 
     # momentum and configuration properties; these may be removed at some
@@ -10,8 +10,14 @@ class Toy_PES(StorableObject):
     # For now, we only support additive combinations; maybe someday that can
     # include multiplication, too
 
+    # All PES terms accept either a single walker (`sys.positions` of shape
+    # (n_dof,)) or a batch of walkers stacked as (K, n_dof). In the batched
+    # case `V` returns an array of shape (K,) and `dVdx` one of shape
+    # (K, n_dof).
+
     def __init__(self):
         super(Toy_PES, self).__init__()
+        self._evaluator = None
 
     def __add__(self, other):
         return Toy_PES_Add(self, other)
@@ -22,7 +28,118 @@ class Toy_PES(StorableObject):
     def kinetic_energy(self, sys):
         v = sys.velocities
         m = sys.mass
-        return 0.5*np.dot(m, np.multiply(v,v))
+        return 0.5*np.dot(np.multiply(v,v), m)
+
+    def V_and_dVdx(self, sys):
+        """
+        The potential energy and its gradient, computed in one pass.
+
+        The PES is flattened into its additive terms once, and terms of the
+        same type are evaluated together as stacked numpy arrays. The result
+        for the last positions (and masses) is cached, so asking for `V`
+        after `dVdx` (or for `dVdx` twice) at the same point is free.
+
+        Parameters
+        ----------
+        sys : object with `positions` and `mass`
+            usually the ToyEngine; positions can be a single walker of
+            shape (n_dof,) or a batch of shape (K, n_dof)
+
+        Returns
+        -------
+        (V, dVdx)
+            the potential energy and its gradient with respect to the
+            positions. The arrays are shared with the cache and read-only.
+
+        Notes
+        -----
+        The parameters of the terms must not be changed after the first
+        evaluation.
+        """
+        if self._evaluator is None:
+            self._evaluator = _PESEvaluator(self._terms())
+        return self._evaluator(sys)
+
+    def _terms(self, coefficient=1.0):
+        """
+        List of (coefficient, term) with the PES being the sum of
+        coefficient * term.V
+        """
+        return [(coefficient, self)]
+
+    @classmethod
+    def _fused(cls, terms, n_dof):
+        """
+        Function of `sys` returning (V, dVdx) of the sum of all `terms`,
+        which are (coefficient, term) pairs with terms of this class.
+
+        Classes that do not know how to evaluate several of their terms at
+        once are evaluated term by term.
+        """
+        def evaluate(sys):
+            V = sum(c * term.V(sys) for c, term in terms)
+            dVdx = sum(c * np.asarray(term.dVdx(sys)) for c, term in terms)
+            return V, dVdx
+
+        return evaluate
+
+
+class _PESEvaluator(object):
+    """
+    Evaluates the flattened terms of a PES and caches the last result
+    """
+    def __init__(self, terms):
+        self.terms = terms
+        self._n_dof = None
+        self._groups = []
+        self._positions = None
+        self._mass = None
+        self._result = None
+
+    def _compile(self, n_dof):
+        by_class = {}
+        order = []
+        for coefficient, term in self.terms:
+            cls = term.__class__
+            if cls not in by_class:
+                by_class[cls] = []
+                order.append(cls)
+            by_class[cls].append((coefficient, term))
+
+        self._groups = [cls._fused(by_class[cls], n_dof) for cls in order]
+        self._n_dof = n_dof
+
+    def __call__(self, sys):
+        positions = np.asarray(sys.positions)
+        mass = sys.mass
+        if (self._result is not None and
+                positions.shape == self._positions.shape and
+                np.array_equal(positions, self._positions) and
+                np.array_equal(mass, self._mass)):
+            return self._result
+
+        if positions.shape[-1] != self._n_dof:
+            self._compile(positions.shape[-1])
+
+        V = 0.0
+        dVdx = np.zeros(positions.shape)
+        for group in self._groups:
+            group_V, group_dVdx = group(sys)
+            V = V + group_V
+            dVdx += group_dVdx
+
+        dVdx.flags.writeable = False
+        # the integrators change the positions in place, so keep a copy
+        self._positions = positions.copy()
+        self._mass = np.copy(mass)
+        self._result = (V, dVdx)
+        return self._result
+
+
+def _per_dof(values, n_dof):
+    """Parameters of several terms as one array of shape (n_terms, n_dof)"""
+    return np.array([np.ones(n_dof) * value for value in values])
+
 
 class Toy_PES_Combination(Toy_PES):
     def __init__(self, pes1, pes2, fcn, dfdx_fcn):
@@ -32,13 +149,23 @@ class Toy_PES_Combination(Toy_PES):
         self._fcn = fcn
         self._dfdx_fcn = dfdx_fcn
 
+    # sums and differences are evaluated by the fused evaluator of the
+    # flattened PES; other combinations recurse into their parts
+    _fusable = False
+
     def V(self, sys):
+        if self._fusable:
+            return self.V_and_dVdx(sys)[0]
         return self._fcn(self.pes1.V(sys), self.pes2.V(sys))
 
     def dVdx(self, sys):
+        if self._fusable:
+            return self.V_and_dVdx(sys)[1]
         return self._dfdx_fcn(self.pes1.dVdx(sys), self.pes2.dVdx(sys))
 
 class Toy_PES_Sub(Toy_PES_Combination):
+    _fusable = True
+
     def __init__(self, pes1, pes2):
         super(Toy_PES_Sub, self).__init__(
             pes1,
@@ -47,7 +174,13 @@ class Toy_PES_Sub(Toy_PES_Combination):
             lambda a, b: a - b
             )
 
+    def _terms(self, coefficient=1.0):
+        return (self.pes1._terms(coefficient) +
+                self.pes2._terms(-coefficient))
+
 class Toy_PES_Add(Toy_PES_Combination):
+    _fusable = True
+
     def __init__(self, pes1, pes2):
         super(Toy_PES_Add, self).__init__(
             pes1,
@@ -56,6 +189,10 @@ class Toy_PES_Add(Toy_PES_Combination):
             lambda a, b: a + b
         )
 
+    def _terms(self, coefficient=1.0):
+        return (self.pes1._terms(coefficient) +
+                self.pes2._terms(coefficient))
+
 class HarmonicOscillator(Toy_PES):
     def __init__(self, A, omega, x0):
         super(HarmonicOscillator, self).__init__()
@@ -66,13 +203,28 @@ class HarmonicOscillator(Toy_PES):
     def V(self, sys):
         dx = sys.positions - self.x0
         k = self.omega*self.omega*sys.mass
-        return 0.5*np.dot(self.A * k, dx * dx)
+        return 0.5*np.dot(dx * dx, self.A * k)
 
     def dVdx(self, sys):
         dx = sys.positions - self.x0
         k = self.omega*self.omega*sys.mass
         return self.A*k*dx
 
+    @classmethod
+    def _fused(cls, terms, n_dof):
+        k = _per_dof([c * term.A * term.omega * term.omega
+                      for c, term in terms], n_dof)
+        x0 = _per_dof([term.x0 for c, term in terms], n_dof)
+
+        def evaluate(sys):
+            # axis -2 runs over the terms
+            dx = np.asarray(sys.positions)[..., np.newaxis, :] - x0
+            kdx = k * sys.mass * dx
+            return (0.5*np.sum(kdx * dx, axis=(-2, -1)),
+                    np.sum(kdx, axis=-2))
+
+        return evaluate
+
 class Gaussian(Toy_PES):
     ''' Returns the Gaussian given by A*exp(-\sum_i alpha[i]*(x[i]-x0[i])^2)
     '''
@@ -81,38 +233,59 @@ class Gaussian(Toy_PES):
         self.A = A
         self.alpha = np.array(alpha)
         self.x0 = np.array(x0)
-        self._local_dVdx = np.zeros(self.x0.size)
 
     def V(self, sys):
         dx = sys.positions - self.x0
-        return self.A*np.exp(-np.dot(self.alpha, np.multiply(dx, dx)))
+        return self.A*np.exp(-np.dot(np.multiply(dx, dx), self.alpha))
 
     def dVdx(self, sys):
         dx = sys.positions - self.x0
-        exp_part = self.A*np.exp(-np.dot(self.alpha, np.multiply(dx, dx)))
-        for i in range(len(dx)):
-            self._local_dVdx[i] = -2*self.alpha[i]*dx[i]*exp_part
-        return self._local_dVdx
+        exp_part = self.A*np.exp(-np.dot(np.multiply(dx, dx), self.alpha))
+        # one prefactor per walker, broadcast over the degrees of freedom
+        exp_part = np.asarray(exp_part)[..., np.newaxis]
+        return -2*self.alpha*dx*exp_part
+
+    @classmethod
+    def _fused(cls, terms, n_dof):
+        A = np.array([c * term.A for c, term in terms])
+        alpha = _per_dof([term.alpha for c, term in terms], n_dof)
+        x0 = _per_dof([term.x0 for c, term in terms], n_dof)
+
+        def evaluate(sys):
+            dx = np.asarray(sys.positions)[..., np.newaxis, :] - x0
+            exp_part = A*np.exp(-np.sum(alpha * dx * dx, axis=-1))
+            return (np.sum(exp_part, axis=-1),
+                    -2*np.sum(exp_part[..., np.newaxis] * alpha * dx,
+                              axis=-2))
+
+        return evaluate
 
 class OuterWalls(Toy_PES):
     def __init__(self, sigma, x0):
         super(OuterWalls, self).__init__()
         self.sigma = np.array(sigma)
         self.x0 = np.array(x0)
-        self._local_dVdx = np.zeros(self.x0.size)
 
     def V(self, sys):
         dx = sys.positions - self.x0
-        myV = 0.0
-        for i in range(len(dx)):
-            myV += self.sigma[i]*dx[i]**6
-        return myV
+        return np.dot(dx**6, self.sigma)
 
     def dVdx(self, sys):
         dx = sys.positions - self.x0
-        for i in range(len(dx)):
-            self._local_dVdx[i] = 6.0*self.sigma[i]*dx[i]**5
-        return self._local_dVdx
+        return 6.0*self.sigma*dx**5
+
+    @classmethod
+    def _fused(cls, terms, n_dof):
+        sigma = _per_dof([c * term.sigma for c, term in terms], n_dof)
+        x0 = _per_dof([term.x0 for c, term in terms], n_dof)
+
+        def evaluate(sys):
+            dx = np.asarray(sys.positions)[..., np.newaxis, :] - x0
+            sigma_dx5 = sigma * dx**5
+            return (np.sum(sigma_dx5 * dx, axis=(-2, -1)),
+                    6.0*np.sum(sigma_dx5, axis=-2))
+
+        return evaluate
 
 class LinearSlope(Toy_PES):
     def __init__(self, m, c):
@@ -123,8 +296,24 @@ class LinearSlope(Toy_PES):
         self.dim = len(self.m)
 
     def V(self, sys):
-        return np.dot(self.m, sys.positions) + self.c
+        return np.dot(sys.positions, self.m) + self.c
 
     def dVdx(self, sys):
         # this is independent of the position
+        if np.ndim(sys.positions) > 1:
+            return np.tile(self.m, (len(sys.positions), 1))
         return self._local_dVdx
+
+    @classmethod
+    def _fused(cls, terms, n_dof):
+        # a sum of slopes is a single slope
+        m = np.sum(_per_dof([c * np.asarray(term.m) for c, term in terms],
+                            n_dof), axis=0)
+        offset = sum(c * term.c for c, term in terms)
+
+        def evaluate(sys):
+            positions = np.asarray(sys.positions)
+            return (np.dot(positions, m) + offset,
+                    np.zeros(positions.shape) + m)
+
+        return evaluate
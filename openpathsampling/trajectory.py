@@ -405,32 +405,26 @@ class Trajectory(list, StorableObject):
         list of tuple
             format is (label, number_of_frames)
         """
-        last_vol = None
-        count = 0
-        segment_labels = []
-        # list.__iter__ for speed
-        for frame in list.__iter__(self):
-            in_state = []
-            for key in label_dict.keys():
-                vol = label_dict[key]
-                if vol(frame):
-                    in_state.append(key)
-            if len(in_state) > 1:
-                raise RuntimeError("Volumes given to summarize_by_volumes not disjoint")
-            if len(in_state) == 0:
-                current_vol = None
-            else:
-                current_vol = in_state[0]
-
-            if last_vol == current_vol:
-                count += 1
-            else:
-                if count > 0:
-                    segment_labels.append( (last_vol, count) )
-                last_vol = current_vol
-                count = 1
-        segment_labels.append( (last_vol, count) )
-        return segment_labels
+        keys = label_dict.keys()
+        if len(self) == 0 or len(keys) == 0:
+            return [(None, len(self))]
+
+        # one row per volume, evaluated for all frames at once
+        in_volume = np.array([label_dict[key].evaluate_trajectory(self)
+                              for key in keys])
+        if np.any(in_volume.sum(axis=0) > 1):
+            raise RuntimeError("Volumes given to summarize_by_volumes not disjoint")
+
+        # index of the volume of each frame; len(keys) for no volume
+        frame_labels = np.where(in_volume.any(axis=0),
+                                in_volume.argmax(axis=0), len(keys))
+        # frames where a new segment begins
+        starts = np.concatenate(
+            ([0], np.flatnonzero(np.diff(frame_labels)) + 1))
+        counts = np.diff(np.concatenate((starts, [len(self)])))
+        labels = keys + [None]
+        return [(labels[frame_labels[start]], int(count))
+                for start, count in zip(starts, counts)]
 
     def summarize_by_volumes_str(self, label_dict, delimiter="-"):
         """
@@ -770,3 +764,135 @@ class Trajectory(list, StorableObject):
         TODO: Should be removed
         """
         return self.topology.md
+
+
+class ConcatenatedTrajectory(object):
+    """
+    Read-only view of two trajectories, one after the other.
+
+    No frames are copied, so creating the view or letting one of its parts
+    grow is O(1) in the number of frames. With `reverse_first` the first
+    part is read backward with reversed snapshots, as in `first.reversed`.
+    Single frames are looked up in the parts; slicing the view creates a
+    Trajectory of the sliced frames only.
+
+    Attributes
+    ----------
+    first : Trajectory
+        the frames at the beginning
+    second : Trajectory
+        the frames at the end
+    reverse_first : bool
+        if True the view starts with `first.reversed`
+    """
+
+    def __init__(self, first, second, reverse_first=False):
+        self.first = first
+        self.second = second
+        self.reverse_first = reverse_first
+
+    def __len__(self):
+        return len(self.first) + len(self.second)
+
+    def __str__(self):
+        return 'ConcatenatedTrajectory[' + str(len(self)) + ']'
+
+    def __repr__(self):
+        return 'ConcatenatedTrajectory[' + str(len(self)) + ']'
+
+    def get_as_proxy(self, item):
+        """
+        Get an actual contained element, see `Trajectory.get_as_proxy`
+
+        Frames of a reversed first part are reversed snapshots, which
+        requires loading them.
+        """
+        n_first = len(self.first)
+        length = n_first + len(self.second)
+        if item < 0:
+            item += length
+        if not 0 <= item < length:
+            raise IndexError('trajectory index out of range')
+
+        if item >= n_first:
+            return self.second.get_as_proxy(item - n_first)
+        elif self.reverse_first:
+            return self.first.get_as_proxy(n_first - 1 - item).reversed
+        else:
+            return self.first.get_as_proxy(item)
+
+    def iter_proxies(self):
+        """
+        Returns an iterator over all actual elements
+        """
+        for item in xrange(len(self)):
+            yield self.get_as_proxy(item)
+
+    def as_proxies(self):
+        """
+        Returns all actual elements as a list
+        """
+        return list(self.iter_proxies())
+
+    def __getitem__(self, index):
+        if type(index) is slice:
+            return Trajectory([self.get_as_proxy(item) for item in
+                               xrange(*index.indices(len(self)))])
+        elif hasattr(index, '__iter__'):
+            return Trajectory([self.get_as_proxy(item) for item in index])
+
+        ret = self.get_as_proxy(index)
+        if hasattr(ret, '_idx'):
+            ret = ret.__subject__
+
+        return ret
+
+    def __iter__(self):
+        for item in xrange(len(self)):
+            yield self[item]
+
+    def __reversed__(self):
+        for item in xrange(len(self) - 1, -1, -1):
+            yield self[item].reversed
+
+    @property
+    def reversed(self):
+        """
+        Returns a reversed (shallow) copy as a Trajectory
+        """
+        return Trajectory([snap for snap in reversed(self)])
+
+    def __contains__(self, snapshot):
+        return any(frame == snapshot for frame in self.iter_proxies())
+
+    def index(self, snapshot):
+        n_first = len(self.first)
+        if self.reverse_first:
+            for item in xrange(n_first):
+                if self.get_as_proxy(item) == snapshot:
+                    return item
+        else:
+            try:
+                return self.first.index(snapshot)
+            except ValueError:
+                pass
+
+        return n_first + self.second.index(snapshot)
+
+    def __add__(self, other):
+        t = Trajectory(self.as_proxies())
+        t.extend(other)
+        return t
+
+    def __eq__(self, other):
+        try:
+            other = other.as_proxies()
+        except AttributeError:
+            pass
+        return self.as_proxies() == list(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return object.__hash__(self)
@@ -0,0 +1,222 @@
+"""
+Memoised results of testing stored trajectories against stored ensembles.
+"""
+
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+from openpathsampling.netcdfplus import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def ensemble_verdict(ensemble, trajectory):
+    """
+    `ensemble(trajectory)`, using the active VerdictCache if there is one
+
+    Parameters
+    ----------
+    ensemble : Ensemble
+        the ensemble to test
+    trajectory : Trajectory
+        the trajectory to test
+
+    Returns
+    -------
+    bool
+        whether `trajectory` is in `ensemble`
+    """
+    cache = VerdictCache.active
+    if cache is None:
+        return ensemble(trajectory)
+    return cache(ensemble, trajectory)
+
+
+class VerdictCache(object):
+    """
+    Remembers whether stored trajectories are in stored ensembles.
+
+    Stored ensembles and trajectories never change, so the verdict for a
+    pair of them can be kept, keyed by their indices in the storage. The
+    verdicts are held in an LRU cache and, if `persist` is set, written to
+    the storage file by `sync` and read again when the file is opened with
+    a new VerdictCache. Ensembles or trajectories that are not stored are
+    always tested.
+
+    Only `size_limit` verdicts are kept in memory, plus the new ones that
+    are not synced yet. A new VerdictCache reads the latest `size_limit`
+    verdicts of the file; older ones are computed again if needed (and
+    then saved once more).
+
+    Code that checks samples (`Sample.valid`, `SampleSet.sanity_check`,
+    replica exchange and ensemble hops) uses the cache that is `activate`d.
+
+    Attributes
+    ----------
+    storage : Storage
+        the storage that the indices refer to
+    persist : bool
+        if True, verdicts are saved in the storage
+    hits : int
+        the number of verdicts taken from the cache
+    misses : int
+        the number of verdicts that had to be computed
+    """
+
+    # the cache used by `ensemble_verdict`
+    active = None
+
+    def __init__(self, storage, size_limit=100000, persist=False):
+        """
+        Parameters
+        ----------
+        storage : Storage
+            the storage that the indices refer to
+        size_limit : int
+            the number of verdicts kept in memory
+        persist : bool
+            if True, verdicts are saved in the storage
+        """
+        self.storage = storage
+        self.persist = persist
+        self.hits = 0
+        self.misses = 0
+
+        self._verdicts = LRUCache(size_limit)
+        # (ensemble idx, trajectory idx) : verdict of the verdicts that are
+        # not saved yet
+        self._pending = OrderedDict()
+
+        if 'verdicts' in storage.dimensions:
+            self._load()
+
+    def activate(self):
+        """
+        Use this cache for all checks of samples
+
+        Returns
+        -------
+        VerdictCache
+            self
+        """
+        VerdictCache.active = self
+        return self
+
+    def deactivate(self):
+        """
+        Stop using this cache for the checks of samples
+        """
+        if VerdictCache.active is self:
+            VerdictCache.active = None
+
+    def key(self, ensemble, trajectory):
+        """
+        The (ensemble idx, trajectory idx) for the pair or None if either of
+        them is not stored
+        """
+        ensemble_idx = self.storage.ensembles.index.get(ensemble, None)
+        if ensemble_idx is None:
+            return None
+
+        store = self.storage.trajectories
+        if hasattr(trajectory, '_idx'):
+            # a proxy of a stored trajectory
+            if trajectory._store is not store:
+                return None
+            trajectory_idx = trajectory._idx
+        else:
+            trajectory_idx = store.index.get(trajectory, None)
+        if trajectory_idx is None:
+            return None
+
+        return int(ensemble_idx), int(trajectory_idx)
+
+    def __call__(self, ensemble, trajectory):
+        """
+        Whether `trajectory` is in `ensemble`
+
+        Parameters
+        ----------
+        ensemble : Ensemble
+            the ensemble to test
+        trajectory : Trajectory
+            the trajectory to test
+
+        Returns
+        -------
+        bool
+            the same as `ensemble(trajectory)`
+        """
+        key = self.key(ensemble, trajectory)
+        if key is None:
+            return ensemble(trajectory)
+
+        try:
+            verdict = self._verdicts[key]
+        except KeyError:
+            # it might have been dropped from memory before it was saved
+            verdict = self._pending.get(key, None)
+            if verdict is None:
+                self.misses += 1
+                verdict = bool(ensemble(trajectory))
+                if self.persist:
+                    self._pending[key] = verdict
+            else:
+                self.hits += 1
+            self._verdicts[key] = verdict
+        else:
+            self.hits += 1
+
+        return verdict
+
+    def _init_variables(self):
+        storage = self.storage
+        storage.create_dimension('verdicts', None)
+        for name in ['ensemble', 'trajectory']:
+            storage.create_variable('verdicts_' + name, 'index',
+                                    ('verdicts',),
+                                    description='the stored ' + name)
+        storage.create_variable('verdicts_verdict', 'bool', ('verdicts',),
+                                description='whether the trajectory is ' +
+                                            'in the ensemble')
+        storage.update_delegates()
+
+    def _load(self):
+        with self.storage.lock:
+            variables = self.storage.variables
+            n_stored = len(self.storage.dimensions['verdicts'])
+            # only the latest verdicts fit into the cache
+            rows = slice(max(0, n_stored - self._verdicts.size_limit),
+                         n_stored)
+            ensembles = variables['verdicts_ensemble'][rows]
+            trajectories = variables['verdicts_trajectory'][rows]
+            verdicts = variables['verdicts_verdict'][rows]
+        for ensemble_idx, trajectory_idx, verdict in zip(
+                ensembles.tolist(), trajectories.tolist(), verdicts.tolist()):
+            self._verdicts[(ensemble_idx, trajectory_idx)] = bool(verdict)
+
+    def sync(self):
+        """
+        Write the new verdicts to the storage (only if `persist` is set)
+        """
+        if not self._pending:
+            return
+
+        with self.storage.lock:
+            if 'verdicts' not in self.storage.dimensions:
+                self._init_variables()
+
+            variables = self.storage.variables
+            n_stored = len(self.storage.dimensions['verdicts'])
+            pending = np.array(
+                [key + (verdict,) for key, verdict in self._pending.items()],
+                dtype=np.int32)
+            new = slice(n_stored, n_stored + len(pending))
+            variables['verdicts_ensemble'][new] = pending[:, 0]
+            variables['verdicts_trajectory'][new] = pending[:, 1]
+            variables['verdicts_verdict'][new] = pending[:, 2]
+
+        logger.debug("Saved %d verdicts", len(self._pending))
+        self._pending.clear()
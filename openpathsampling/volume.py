@@ -6,7 +6,17 @@ Created on 03.09.2014
 
 import range_logic
 import abc
-from openpathsampling.netcdfplus import StorableNamedObject
+import bisect
+import weakref
+import numpy as np
+from openpathsampling.netcdfplus import StorableNamedObject, WeakLRUCache
+
+try:
+    from scipy.spatial import cKDTree
+    has_scipy = True
+except ImportError:
+    has_scipy = False
+from openpathsampling.adaptive_order import AdaptiveOrder, flatten_combination
 
 # TODO: Make Full and Empty be Singletons to avoid storing them several times!
 
@@ -32,6 +42,24 @@ def join_volumes(volume_list):
     return volume
 
 
+def _frames(trajectory):
+    # the frames as stored, to avoid loading proxies
+    try:
+        return trajectory.as_proxies()
+    except AttributeError:
+        return list(trajectory)
+
+
+def _cv_values(collectivevariable, trajectory):
+    # the values of a scalar collective variable for all frames, computed
+    # in one call of the collective variable
+    frames = _frames(trajectory)
+    if len(frames) == 0:
+        return np.zeros(0)
+    return np.asarray(collectivevariable(frames),
+                      dtype=float).reshape(len(frames))
+
+
 class Volume(StorableNamedObject):
     """
     A Volume describes a set of snapshots 
@@ -39,6 +67,10 @@ class Volume(StorableNamedObject):
 
     __metaclass__ = abc.ABCMeta
 
+    # evaluate unions and intersections in the order that is expected to be
+    # cheapest (see `AdaptiveOrder`)
+    adaptive_shortcircuit = False
+
     def __init__(self):
         super(Volume, self).__init__()
 
@@ -49,6 +81,26 @@ class Volume(StorableNamedObject):
         '''
         
         return False # pragma: no cover
+
+    def evaluate_trajectory(self, trajectory):
+        """
+        Whether each frame of a trajectory is in the volume.
+
+        Subclasses evaluate all frames at once where possible, e.g., with
+        a single (cached) call of the collective variable.
+
+        Parameters
+        ----------
+        trajectory : Trajectory or list of Snapshot
+            the frames to test
+
+        Returns
+        -------
+        numpy.ndarray of bool
+            `True` for the frames in the volume
+        """
+        return np.array([bool(self(frame)) for frame in _frames(trajectory)],
+                        dtype=bool)
                 
     def __str__(self):
         '''
@@ -117,8 +169,34 @@ class VolumeCombination(Volume):
         self.fnc = fnc
         self.sfnc = str_fnc
 
+    # the elementwise version of fnc for arrays of bool
+    _array_fnc = None
+
+    # the value of an operand that decides the result (True for unions,
+    # False for intersections), None if the combination can't be reordered
+    _decisive = None
+
     def __call__(self, snapshot):
+        if Volume.adaptive_shortcircuit and self._decisive is not None:
+            return self._adaptive_order().evaluate('__call__', snapshot)
         return self.fnc(self.volume1.__call__(snapshot), self.volume2.__call__(snapshot))
+
+    def _adaptive_order(self):
+        try:
+            return self._adaptive
+        except AttributeError:
+            self._adaptive = AdaptiveOrder(
+                flatten_combination(self, lambda v: (v.volume1, v.volume2)),
+                self._decisive
+            )
+            return self._adaptive
+
+    def evaluate_trajectory(self, trajectory):
+        if self._array_fnc is None:
+            return super(VolumeCombination, self).evaluate_trajectory(
+                trajectory)
+        return self._array_fnc(self.volume1.evaluate_trajectory(trajectory),
+                               self.volume2.evaluate_trajectory(trajectory))
     
     def __str__(self):
         return '(' + self.sfnc.format(str(self.volume1), str(self.volume2)) + ')'
@@ -129,24 +207,35 @@ class VolumeCombination(Volume):
 
 class UnionVolume(VolumeCombination):
     """ "Or" combination (union) of two volumes."""
+    _array_fnc = staticmethod(np.logical_or)
+    _decisive = True
+
     def __init__(self, volume1, volume2):
         super(UnionVolume, self).__init__(volume1, volume2, lambda a,b : a or b, str_fnc = '{0} or {1}')
 
 
 class IntersectionVolume(VolumeCombination):
     """ "And" combination (intersection) of two volumes."""
+    _array_fnc = staticmethod(np.logical_and)
+    _decisive = False
+
     def __init__(self, volume1, volume2):
         super(IntersectionVolume, self).__init__(volume1, volume2, lambda a,b : a and b, str_fnc = '{0} and {1}')
 
 
 class SymmetricDifferenceVolume(VolumeCombination):
     """ "Xor" combination of two volumes."""
+    _array_fnc = staticmethod(np.logical_xor)
+
     def __init__(self, volume1, volume2):
         super(SymmetricDifferenceVolume, self).__init__(volume1, volume2, lambda a,b : a ^ b, str_fnc = '{0} xor {1}')
 
 
 class RelativeComplementVolume(VolumeCombination):
     """ "Subtraction" combination (relative complement) of two volumes."""
+    _array_fnc = staticmethod(
+        lambda a, b: np.logical_and(a, np.logical_not(b)))
+
     def __init__(self, volume1, volume2):
         super(RelativeComplementVolume, self).__init__(volume1, volume2, lambda a,b : a and not b, str_fnc = '{0} and not {1}')
 
@@ -159,6 +248,9 @@ class NegatedVolume(Volume):
 
     def __call__(self, snapshot):
         return not self.volume(snapshot)
+
+    def evaluate_trajectory(self, trajectory):
+        return np.logical_not(self.volume.evaluate_trajectory(trajectory))
     
     def __str__(self):
         return '(not ' + str(self.volume) + ')'
@@ -172,6 +264,9 @@ class EmptyVolume(Volume):
     def __call__(self, snapshot):
         return False
 
+    def evaluate_trajectory(self, trajectory):
+        return np.zeros(len(trajectory), dtype=bool)
+
     def __and__(self, other):
         return self
 
@@ -199,6 +294,9 @@ class FullVolume(Volume):
     def __call__(self, snapshot):
         return True
 
+    def evaluate_trajectory(self, trajectory):
+        return np.ones(len(trajectory), dtype=bool)
+
     def __invert__(self):
         return EmptyVolume()
 
@@ -264,6 +362,12 @@ class CVRangeVolume(Volume):
         """
         return CVRangeVolume(self.collectivevariable, lmin, lmax)
 
+    def _copy_with_new_ranges(self, ranges):
+        """As `_copy_with_new_range`, but for several ranges, which make a
+        CVIntervalSetVolume.
+        """
+        return CVIntervalSetVolume(self.collectivevariable, ranges)
+
     @staticmethod
     def range_and(amin, amax, bmin, bmax):
         return range_logic.range_and(amin, amax, bmin, bmax)
@@ -282,8 +386,8 @@ class CVRangeVolume(Volume):
         ----------
         lrange : None or 1 or list of 2-tuples
             Key to the volume to be returned: None returns the EmptyVolume, 1
-            returns self, and a list of 2-tuples is __or__'d as (min,max) to
-            make a VolumeCombinations
+            returns self, and a list of 2-tuples gives the (min,max) of the
+            ranges of a CVIntervalSetVolume
 
         Returns
         -------
@@ -304,10 +408,7 @@ class CVRangeVolume(Volume):
         elif len(lrange) == 1:
             return self._copy_with_new_range(lrange[0][0], lrange[0][1])
         elif len(lrange) == 2:
-            return UnionVolume(
-                self._copy_with_new_range(lrange[0][0], lrange[0][1]),
-                self._copy_with_new_range(lrange[1][0], lrange[1][1])
-            )
+            return self._copy_with_new_ranges(lrange)
         else:
             raise ValueError(
                 "lrange value not understood: {0}".format(lrange)
@@ -319,6 +420,9 @@ class CVRangeVolume(Volume):
             lminmax = self.range_and(self.lambda_min, self.lambda_max,
                                 other.lambda_min, other.lambda_max)
             return self._lrange_to_Volume(lminmax)
+        elif isinstance(other, CVIntervalSetVolume):
+            return other._combination(self, other, 'and',
+                                      super(CVRangeVolume, self).__and__)
         else:
             return super(CVRangeVolume, self).__and__(other)
 
@@ -328,6 +432,9 @@ class CVRangeVolume(Volume):
             lminmax = self.range_or(self.lambda_min, self.lambda_max,
                                other.lambda_min, other.lambda_max)
             return self._lrange_to_Volume(lminmax)
+        elif isinstance(other, CVIntervalSetVolume):
+            return other._combination(self, other, 'or',
+                                      super(CVRangeVolume, self).__or__)
         else:
             return super(CVRangeVolume, self).__or__(other)
 
@@ -336,6 +443,9 @@ class CVRangeVolume(Volume):
                 self.collectivevariable == other.collectivevariable):
             # taking the shortcut here
             return ((self | other) - (self & other))
+        elif (isinstance(other, CVIntervalSetVolume) and
+                other._intervals_of(self) is not None):
+            return ((self | other) - (self & other))
         else:
             return super(CVRangeVolume, self).__xor__(other)
 
@@ -345,6 +455,9 @@ class CVRangeVolume(Volume):
             lminmax = self.range_sub(self.lambda_min, self.lambda_max,
                             other.lambda_min, other.lambda_max)
             return self._lrange_to_Volume(lminmax)
+        elif isinstance(other, CVIntervalSetVolume):
+            return other._combination(self, other, 'sub',
+                                      super(CVRangeVolume, self).__sub__)
         else:
             return super(CVRangeVolume, self).__sub__(other)
 
@@ -352,6 +465,17 @@ class CVRangeVolume(Volume):
         l = float(self.collectivevariable(snapshot))
         return l >= self.lambda_min and l <= self.lambda_max
 
+    def _cv_array(self, trajectory):
+        """
+        The values of the collective variable for all frames, computed in
+        one call of the collective variable
+        """
+        return _cv_values(self.collectivevariable, trajectory)
+
+    def evaluate_trajectory(self, trajectory):
+        l = self._cv_array(trajectory)
+        return np.logical_and(l >= self.lambda_min, l <= self.lambda_max)
+
     def __str__(self):
         return '{{x|{2}(x) in [{0}, {1}]}}'.format( self.lambda_min, self.lambda_max, self.collectivevariable.name)
 
@@ -403,6 +527,10 @@ class CVRangeVolumePeriodic(CVRangeVolume):
         return CVRangeVolumePeriodic(self.collectivevariable, lmin, lmax,
                                     self.period_min, self.period_max)
 
+    def _copy_with_new_ranges(self, ranges):
+        return CVIntervalSetVolumePeriodic(self.collectivevariable, ranges,
+                                           self.period_min, self.period_max)
+
     @staticmethod
     def range_and(amin, amax, bmin, bmax):
         return range_logic.periodic_range_and(amin, amax, bmin, bmax)
@@ -430,6 +558,15 @@ class CVRangeVolumePeriodic(CVRangeVolume):
         else:
             return l >= self.lambda_min and l <= self.lambda_max
 
+    def evaluate_trajectory(self, trajectory):
+        l = self._cv_array(trajectory)
+        if self.wrap:
+            l = self.do_wrap(l)
+        if self.lambda_min > self.lambda_max:
+            return np.logical_or(l >= self.lambda_min, l <= self.lambda_max)
+        else:
+            return np.logical_and(l >= self.lambda_min, l <= self.lambda_max)
+
     def __str__(self):
         if self.wrap:
             fcn = 'x|({0}(x) - {2}) % {1} + {2}'.format(
@@ -449,6 +586,404 @@ class CVRangeVolumePeriodic(CVRangeVolume):
                         self.collectivevariable.name)
 
 
+class CVIntervalSetVolume(Volume):
+    """
+    Volume defined by a set of ranges of one collective variable.
+
+    Contains all snapshots `snap` for which `collectivevariable(snap)` is in
+    one of the closed intervals `ranges`. This is what logical combinations
+    of CVRangeVolumes of the same collective variable give if the result is
+    not a single range. Combining it with further CVRangeVolumes or
+    CVIntervalSetVolumes of the same collective variable again gives a
+    CVIntervalSetVolume (or a simpler volume), so any such combination
+    needs one evaluation of the collective variable and a binary search in
+    the sorted intervals.
+
+    Attributes
+    ----------
+    collectivevariable : CollectiveVariable
+        the collectivevariable object
+    ranges : list of 2-tuples of float
+        the (lambda_min, lambda_max) of the ranges, as given
+    """
+
+    # the volume class of a single range
+    _range_class = CVRangeVolume
+
+    def __init__(self, collectivevariable, ranges):
+        '''
+        Parameters
+        ----------
+        collectivevariable : CollectiveVariable
+            the collectivevariable object
+        ranges : list of 2-tuples of float
+            the (lambda_min, lambda_max) of the ranges; they may overlap
+        '''
+        super(CVIntervalSetVolume, self).__init__()
+        self.collectivevariable = collectivevariable
+        self.ranges = [(float(lmin), float(lmax)) for lmin, lmax in ranges]
+        self._set_intervals()
+
+    def _set_intervals(self):
+        # the normal form: sorted, disjoint intervals of the (wrapped) values
+        intervals = []
+        for lmin, lmax in self.ranges:
+            intervals.extend(self._range_intervals(lmin, lmax))
+        self._intervals = range_logic.interval_set_normal_form(intervals)
+        self._mins = [lmin for lmin, lmax in self._intervals]
+        self._maxs = [lmax for lmin, lmax in self._intervals]
+        self._min_array = np.array(self._mins, dtype=float)
+        self._max_array = np.array(self._maxs, dtype=float)
+
+    @property
+    def default_name(self):
+        return ' or '.join(self._range_volume(lmin, lmax).default_name
+                           for lmin, lmax in self.ranges)
+
+    # functions that the periodic version overrides
+
+    def _domain(self):
+        """The (min, max) of the values of the collective variable"""
+        return (float('-inf'), float('inf'))
+
+    def _range_intervals(self, lmin, lmax):
+        """The intervals of the values that are in the range"""
+        return [(lmin, lmax)]
+
+    def _intervals_to_ranges(self, intervals):
+        return list(intervals)
+
+    def _wrap(self, value):
+        return value
+
+    def _range_volume(self, lmin, lmax):
+        return CVRangeVolume(self.collectivevariable, lmin, lmax)
+
+    def _copy_with_new_ranges(self, ranges):
+        return CVIntervalSetVolume(self.collectivevariable, ranges)
+
+    def _same_domain(self, other):
+        return self.collectivevariable == other.collectivevariable
+
+    # range logic
+
+    def _intervals_of(self, volume):
+        """
+        The normal form of a volume that can be combined with this one, or
+        None
+        """
+        if volume is self:
+            return self._intervals
+        if type(volume) is type(self) and self._same_domain(volume):
+            return volume._intervals
+        if type(volume) is self._range_class and self._same_domain(volume):
+            return range_logic.interval_set_normal_form(
+                self._range_intervals(volume.lambda_min, volume.lambda_max)
+            )
+        return None
+
+    def _from_intervals(self, intervals):
+        """The simplest volume for the normal form `intervals`"""
+        if len(intervals) == 0:
+            return EmptyVolume()
+        if intervals == [self._domain()]:
+            return FullVolume()
+        ranges = self._intervals_to_ranges(intervals)
+        if len(ranges) == 1:
+            return self._range_volume(ranges[0][0], ranges[0][1])
+        return self._copy_with_new_ranges(ranges)
+
+    def _combination(self, first, second, operation, fallback):
+        """
+        `first` `operation` `second`, where one of them is this volume.
+        Uses `fallback(second)` if they can't be combined.
+        """
+        a = self._intervals_of(first)
+        b = self._intervals_of(second)
+        if a is None or b is None:
+            return fallback(second)
+        if operation == 'and':
+            intervals = range_logic.interval_set_and(a, b)
+        elif operation == 'or':
+            intervals = range_logic.interval_set_or(a, b)
+        elif operation == 'sub':
+            domain_min, domain_max = self._domain()
+            intervals = range_logic.interval_set_sub(a, b, domain_min,
+                                                     domain_max)
+        else:
+            raise ValueError("Unknown operation " + operation)
+        return self._from_intervals(intervals)
+
+    def __and__(self, other):
+        if self is other:
+            return self
+        return self._combination(self, other, 'and',
+                                 super(CVIntervalSetVolume, self).__and__)
+
+    def __or__(self, other):
+        if self is other:
+            return self
+        return self._combination(self, other, 'or',
+                                 super(CVIntervalSetVolume, self).__or__)
+
+    def __sub__(self, other):
+        if self is other:
+            return EmptyVolume()
+        return self._combination(self, other, 'sub',
+                                 super(CVIntervalSetVolume, self).__sub__)
+
+    def __xor__(self, other):
+        if self is other or self._intervals_of(other) is None:
+            return super(CVIntervalSetVolume, self).__xor__(other)
+        return (self | other) - (self & other)
+
+    def __call__(self, snapshot):
+        l = self._wrap(float(self.collectivevariable(snapshot)))
+        i = bisect.bisect_right(self._mins, l) - 1
+        return i >= 0 and l <= self._maxs[i]
+
+    def _cv_array(self, trajectory):
+        return _cv_values(self.collectivevariable, trajectory)
+
+    def evaluate_trajectory(self, trajectory):
+        l = self._wrap(self._cv_array(trajectory))
+        if len(self._intervals) == 0:
+            return np.zeros(len(l), dtype=bool)
+        i = np.searchsorted(self._min_array, l, side='right') - 1
+        # nan is sorted to the end and fails the comparison
+        return np.logical_and(i >= 0,
+                              l <= self._max_array[np.maximum(i, 0)])
+
+    def __str__(self):
+        return '(' + ' or '.join(str(self._range_volume(lmin, lmax))
+                                 for lmin, lmax in self.ranges) + ')'
+
+
+class CVIntervalSetVolumePeriodic(CVIntervalSetVolume):
+    """
+    As `CVIntervalSetVolume`, but for a periodic collective variable. The
+    ranges are those of `CVRangeVolumePeriodic`s with the same periodic
+    domain.
+
+    Attributes
+    ----------
+    period_min : float (optional)
+        minimum of the periodic domain
+    period_max : float (optional)
+        maximum of the periodic domain
+    """
+
+    _range_class = CVRangeVolumePeriodic
+
+    def __init__(self, collectivevariable, ranges, period_min=None,
+                 period_max=None):
+        self.period_min = period_min
+        self.period_max = period_max
+        self._periodic = (period_min is not None) and (period_max is not None)
+        if self._periodic:
+            self._period_shift = period_min
+            self._period_len = period_max - period_min
+        super(CVIntervalSetVolumePeriodic, self).__init__(collectivevariable,
+                                                          ranges)
+
+    def _domain(self):
+        if self._periodic:
+            return (float(self.period_min), float(self.period_max))
+        return (float('-inf'), float('inf'))
+
+    def _range_intervals(self, lmin, lmax):
+        volume = self._range_volume(lmin, lmax)
+        lmin = volume.lambda_min
+        lmax = volume.lambda_max
+        if lmin <= lmax:
+            return [(lmin, lmax)]
+        domain_min, domain_max = self._domain()
+        return [(domain_min, lmax), (lmin, domain_max)]
+
+    def _from_intervals(self, intervals):
+        # a periodic range [a, a] would be ambiguous; like the range logic,
+        # drop single points
+        intervals = [(lmin, lmax) for lmin, lmax in intervals if lmin < lmax]
+        return super(CVIntervalSetVolumePeriodic, self)._from_intervals(
+            intervals
+        )
+
+    def _intervals_to_ranges(self, intervals):
+        domain_min, domain_max = self._domain()
+        if len(intervals) > 1 and intervals[0][0] == domain_min and \
+                intervals[-1][1] == domain_max:
+            # the first and last interval form a range through the boundary
+            return intervals[1:-1] + [(intervals[-1][0], intervals[0][1])]
+        return list(intervals)
+
+    def _wrap(self, value):
+        if self._periodic:
+            return (value - self._period_shift) % self._period_len + \
+                self._period_shift
+        return value
+
+    def _range_volume(self, lmin, lmax):
+        return CVRangeVolumePeriodic(self.collectivevariable, lmin, lmax,
+                                     self.period_min, self.period_max)
+
+    def _copy_with_new_ranges(self, ranges):
+        return CVIntervalSetVolumePeriodic(self.collectivevariable, ranges,
+                                           self.period_min, self.period_max)
+
+    def _same_domain(self, other):
+        return (self.collectivevariable == other.collectivevariable and
+                self.period_min == other.period_min and
+                self.period_max == other.period_max)
+
+
+class VoronoiCellAssignment(object):
+    """
+    Assigns snapshots to the cells of a Voronoi tessellation.
+
+    All VoronoiVolumes with the same collective variable (and centers) share
+    one assignment (see `shared`), so that a snapshot is assigned once, not
+    once per cell. Assignments are done for whole trajectories at once and
+    cached per snapshot.
+
+    The collective variable either returns the distances to all centers, or,
+    if `centers` are given, the coordinates of the snapshot, from which the
+    euclidean distances to the centers are computed. In the second case a
+    KD-tree (scipy.spatial.cKDTree) is used for `tree_threshold` or more
+    centers, if scipy is installed.
+
+    Attributes
+    ----------
+    collectivevariable : CollectiveVariable
+        returns the distances to the centers or the coordinates
+    centers : numpy.ndarray or None
+        the coordinates of the centers (one per row), or None if the
+        collective variable returns distances
+    """
+
+    # use a KD-tree for at least this many centers
+    tree_threshold = 32
+
+    # distances of this size or more are not in any cell
+    max_distance = 1000000000.0
+
+    # collective variable : {centers key : VoronoiCellAssignment}
+    _shared = weakref.WeakKeyDictionary()
+
+    def __init__(self, collectivevariable, centers=None, cache_size=10000):
+        self.collectivevariable = collectivevariable
+        if centers is not None:
+            centers = np.asarray(centers, dtype=float)
+            centers = centers.reshape(len(centers), -1)
+        self.centers = centers
+        self._tree = None
+        if centers is not None and has_scipy and \
+                len(centers) >= self.tree_threshold:
+            self._tree = cKDTree(centers)
+
+        # snapshot : cell
+        self._cells = WeakLRUCache(cache_size, weak_type='key')
+
+    @classmethod
+    def shared(cls, collectivevariable, centers=None):
+        """
+        The assignment used by all volumes of a collective variable
+
+        Parameters
+        ----------
+        collectivevariable : CollectiveVariable
+            returns the distances to the centers or the coordinates
+        centers : numpy.ndarray or None
+            the coordinates of the centers, if the collective variable
+            returns coordinates
+
+        Returns
+        -------
+        VoronoiCellAssignment
+        """
+        if centers is None:
+            key = None
+        else:
+            centers = np.asarray(centers, dtype=float)
+            key = (centers.shape, centers.tostring())
+        assignments = cls._shared.setdefault(collectivevariable, {})
+        try:
+            return assignments[key]
+        except KeyError:
+            assignment = cls(collectivevariable, centers)
+            assignments[key] = assignment
+            return assignment
+
+    def _assign(self, frames):
+        values = np.asarray(self.collectivevariable(frames), dtype=float)
+        values = values.reshape(len(frames), -1)
+        if self.centers is None:
+            distances = values
+        elif self._tree is not None:
+            distances, cells = self._tree.query(values)
+            cells = np.asarray(cells, dtype=int)
+            cells[distances >= self.max_distance] = -1
+            return cells
+        else:
+            distances = np.sqrt(((values[:, np.newaxis, :] -
+                                  self.centers[np.newaxis, :, :])**2
+                                 ).sum(axis=2))
+        cells = np.argmin(distances, axis=1)
+        # same as a search for the minimum starting at max_distance
+        cells[distances.min(axis=1) >= self.max_distance] = -1
+        return cells
+
+    def cells(self, trajectory):
+        """
+        The cells of all frames of a trajectory
+
+        Parameters
+        ----------
+        trajectory : Trajectory or list of Snapshot
+            the frames to assign
+
+        Returns
+        -------
+        numpy.ndarray of int
+            the index of the cell of each frame (-1 for none)
+        """
+        frames = _frames(trajectory)
+        result = np.zeros(len(frames), dtype=int)
+        missing = []
+        for i, frame in enumerate(frames):
+            try:
+                result[i] = self._cells[frame]
+            except (KeyError, TypeError):
+                missing.append(i)
+
+        if missing:
+            cells = self._assign([frames[i] for i in missing])
+            for i, cell in zip(missing, cells.tolist()):
+                result[i] = cell
+                try:
+                    self._cells[frames[i]] = cell
+                except TypeError:
+                    # not weakly referenceable
+                    pass
+
+        return result
+
+    def cell(self, snapshot):
+        """
+        The cell of a snapshot
+
+        Parameters
+        ----------
+        snapshot : Snapshot
+            the snapshot to assign
+
+        Returns
+        -------
+        int
+            the index of the cell (-1 for none)
+        """
+        return int(self.cells([snapshot])[0])
+
+
 class VoronoiVolume(Volume):
     '''
     Volume given by a Voronoi cell specified by a set of centers
@@ -459,6 +994,9 @@ class VoronoiVolume(Volume):
         must be an CV_Multi_RMSD collectivevariable that returns several RMSDs
     state : int
         the index of the center for the chosen voronoi cell
+    centers : numpy.ndarray or None
+        if given, the collectivevariable returns coordinates instead of
+        distances and these are the coordinates of the centers
 
     Attributes
     ----------
@@ -466,14 +1004,33 @@ class VoronoiVolume(Volume):
         the collectivevariable object
     state : int
         the index of the center for the chosen voronoi cell
-
+    centers : numpy.ndarray or None
+        the coordinates of the centers, if the collectivevariable returns
+        coordinates
+
+    Notes
+    -----
+    The cells are assigned by a VoronoiCellAssignment that is shared by all
+    volumes with the same collectivevariable and centers.
     '''
     
-    def __init__(self, collectivevariable, state):
+    def __init__(self, collectivevariable, state, centers=None):
         super(VoronoiVolume, self).__init__()
         self.collectivevariable = collectivevariable
         self.state = state
-        
+        self.centers = centers
+
+    @property
+    def assignment(self):
+        """The VoronoiCellAssignment of the volume"""
+        try:
+            return self._assignment
+        except AttributeError:
+            self._assignment = VoronoiCellAssignment.shared(
+                self.collectivevariable, self.centers
+            )
+            return self._assignment
+
     def cell(self, snapshot):
         '''
         Returns the index of the voronoicell snapshot is in
@@ -488,15 +1045,7 @@ class VoronoiVolume(Volume):
         int
             index of the voronoi cell
         '''
-        distances = self.collectivevariable(snapshot)
-        min_val = 1000000000.0
-        min_idx = -1 
-        for idx, d in enumerate(distances):
-            if d < min_val:
-                min_val = d
-                min_idx = idx
-        
-        return min_idx
+        return self.assignment.cell(snapshot)
 
     def __call__(self, snapshot, state = None):
         '''
@@ -515,14 +1064,17 @@ class VoronoiVolume(Volume):
             returns `True` is snapshot is on the specified voronoi cell
         
         '''
-        
-        # short but slower would be 
-        
         if state is None:
             state = self.state
         
         return self.cell(snapshot) == state
 
+    def evaluate_trajectory(self, trajectory, state=None):
+        if state is None:
+            state = self.state
+
+        return self.assignment.cells(trajectory) == state
+
 class VolumeFactory(object):
     @staticmethod
     def _check_minmax(minvals, maxvals):
@@ -542,22 +1094,47 @@ class VolumeFactory(object):
             raise ValueError("len(minvals) != len(maxvals)")
         return (minvals, maxvals)
 
+    @staticmethod
+    def _join_ranges(make_range, min_i, max_i):
+        # a list of minima and maxima gives the union of the ranges, which
+        # the range logic reduces to a CVIntervalSetVolume
+        if isinstance(min_i, (list, tuple)):
+            return join_volumes([make_range(lmin, lmax)
+                                 for lmin, lmax in zip(min_i, max_i)])
+        return make_range(min_i, max_i)
+
     @staticmethod
     def CVRangeVolumeSet(op, minvals, maxvals):
+        """
+        CVRangeVolumes of `op`, one for each pair of `minvals` and `maxvals`
+
+        If an element of `minvals` and `maxvals` is a list, the volume is
+        the union of the ranges given by these lists; ranges that don't
+        merge give a CVIntervalSetVolume.
+        """
         # TODO: clean up to only use min_i or max_i in name if necessary
         minvals, maxvals = VolumeFactory._check_minmax(minvals, maxvals)
         myset = []
         for (min_i, max_i) in zip(minvals, maxvals):
-            volume = CVRangeVolume(op, min_i, max_i)
+            volume = VolumeFactory._join_ranges(
+                lambda lmin, lmax: CVRangeVolume(op, lmin, lmax),
+                min_i, max_i
+            )
             myset.append(volume)
         return myset
 
     @staticmethod
     def CVRangeVolumePeriodicSet(op, minvals, maxvals,
                                 period_min=None, period_max=None):
+        """
+        As `CVRangeVolumeSet`, for CVRangeVolumePeriodics
+        """
         minvals, maxvals = VolumeFactory._check_minmax(minvals, maxvals)
         myset = []
         for i in range(len(maxvals)):
-            myset.append(CVRangeVolumePeriodic(op, minvals[i], maxvals[i],
-                                              period_min, period_max))
+            myset.append(VolumeFactory._join_ranges(
+                lambda lmin, lmax: CVRangeVolumePeriodic(
+                    op, lmin, lmax, period_min, period_max),
+                minvals[i], maxvals[i]
+            ))
         return myset